@@ -0,0 +1,231 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from BristolStockGym import Environment
+from Exchange import Exchange
+from Order import OType, Order
+from OrderBookHalf import OrderBookHalf
+from OrderBookLadder import OrderBookLadder
+from Trader import TType, Trader
+
+# Benchmark suite for the exchange and environment hot paths
+#   python Benchmark.py                                   run and print the results
+#   python Benchmark.py --save benchmark_baseline.json    run and store the results as a baseline
+#   python Benchmark.py --compare benchmark_baseline.json run and compare against a baseline
+# Every benchmark reports a throughput or latency, plus the peak memory allocated while it runs
+# (measured in a separate run with tracemalloc, so that tracing does not distort the timings)
+
+BOOK_ENGINES = { 'OrderBookHalf': OrderBookHalf, 'OrderBookLadder': OrderBookLadder }
+
+
+# Measure fn(): returns (seconds, peak bytes allocated)
+# The seconds are those of the untraced run: the time fn() returns, if it times only part of its work, or
+# else its whole duration; the traced run only gives the peak memory
+def measure(fn):
+    start = time.perf_counter()
+    elapsed = fn()
+    seconds = time.perf_counter() - start if elapsed == None else elapsed
+    tracemalloc.start()
+    fn()
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+# OrderBookHalf.add_order / del_order / get_best throughput on a book holding `depth` orders,
+# and the memory used per resting order
+def bench_book(engine, depth, n_ops, max_price = 1000):
+    book_class = BOOK_ENGINES[engine]
+    rng = random.Random(depth)
+    prices = [rng.randint(1, max_price) for _ in range(n_ops)]
+    tids = ['T%d' % rng.randrange(depth) for _ in range(n_ops)]
+
+    def filled_book():
+        book = book_class(OType.BID, 1, max_price)
+        for i in range(depth):
+            book.add_order(Order('T%d' % i, OType.BID, rng.randint(1, max_price), 1, 0, i))
+        return book
+
+    # Each add overwrites the order of an existing trader at a new price
+    def add_orders():
+        book = filled_book()
+        start = time.perf_counter()
+        for i in range(n_ops):
+            book.add_order(Order(tids[i], OType.BID, prices[i], 1, i, depth + i))
+        return time.perf_counter() - start
+
+    # Each delete is followed by an add, to keep the depth constant; only deletes are timed
+    def del_orders():
+        book = filled_book()
+        elapsed = 0
+        for i in range(n_ops):
+            order = book.orders[tids[i]]
+            start = time.perf_counter()
+            book.del_order(order)
+            elapsed += time.perf_counter() - start
+            book.add_order(Order(tids[i], OType.BID, prices[i], 1, i, depth + i))
+        return elapsed
+
+    def get_best():
+        book = filled_book()
+        start = time.perf_counter()
+        for i in range(n_ops):
+            book.get_best()
+        return time.perf_counter() - start
+
+    report = {}
+    for name, fn in (('add_order', add_orders), ('del_order', del_orders), ('get_best', get_best)):
+        seconds, peak = measure(fn)
+        report[name + '_ops_per_sec'] = n_ops / seconds
+        report[name + '_peak_kib'] = peak / 1024
+
+    # Memory held per resting order: the Order objects and the book's index of them
+    tracemalloc.start()
+    book = filled_book()
+    held, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    report['bytes_per_order'] = held / depth
+    return report
+
+
+# Exchange.process_order latency, with `depth` resting orders on each side
+def bench_process_order(engine, depth, n_orders, max_price = 1000):
+    rng = random.Random(depth)
+    mid = max_price // 2
+    orders = []
+    for i in range(n_orders):
+        otype = OType.BID if rng.random() < 0.5 else OType.ASK
+        offset = rng.randint(-depth // 2, depth // 2)
+        orders.append((otype, mid + offset if otype == OType.BID else mid + offset + 1))
+
+    def run():
+        exchange = Exchange(1, max_price, BOOK_ENGINES[engine])
+        for i in range(depth):
+            exchange.add_order(Order('B%d' % i, OType.BID, mid - 1 - i % (mid - 1), 1, 0))
+            exchange.add_order(Order('A%d' % i, OType.ASK, mid + 1 + i % (mid - 1), 1, 0))
+        for i in range(n_orders):
+            otype, price = orders[i]
+            exchange.process_order(Order('X%d' % (i % depth), otype, price, 1, i), i)
+
+    seconds, peak = measure(run)
+    return { 'process_order_us': seconds / n_orders * 1e6, 'peak_kib': peak / 1024 }
+
+
+# Environment with n_traders ZIP traders, half buying and half selling
+class BenchmarkEnvironment(Environment):
+
+    def __init__(self, n_traders, **kwargs):
+        super().__init__(**kwargs)
+        self.n_traders = n_traders
+
+    def _populate_traders(self):
+        traders = {}
+        player = Trader(TType.PLAYER, 'PLAYER', self.minprice, self.maxprice, self.exchange_rules)
+        player.assign_order(self._generate_order(player.tid, OType.BID, 0))
+        traders[player.tid] = player
+        for i in range(self.n_traders):
+            trader = self._create_zip('ZIP' + str(i))
+            trader.assign_order(self._generate_order(trader.tid, OType.BID if i < self.n_traders // 2 else OType.ASK, 0))
+            traders[trader.tid] = trader
+        return traders
+
+    def _create_zip(self, tid):
+        if self.zip_population != None:
+            from ZIPPopulation import PooledZIP
+            return PooledZIP(TType.ZIP, tid, self.minprice, self.maxprice, self.zip_population, self.exchange_rules)
+        from ZIP import ZIP
+        return ZIP(TType.ZIP, tid, self.minprice, self.maxprice, self.exchange_rules)
+
+
+# Environment.step throughput
+def bench_env_step(n_traders, max_price, n_steps, engine = 'OrderBookHalf', vectorized_zip = False):
+
+    def run():
+        random.seed(0)
+        environment = BenchmarkEnvironment(n_traders, max_time = n_steps, max_price = max_price, replenish_orders = True,
+                                           book_class = BOOK_ENGINES[engine], vectorized_zip = vectorized_zip)
+        environment.reset()
+        done = False
+        while not done:
+            _observation, _reward, done, _info = environment.step(None)
+
+    seconds, peak = measure(run)
+    return { 'steps_per_sec': n_steps / seconds, 'peak_kib': peak / 1024 }
+
+
+def run_benchmarks(quick = False):
+    scale = 0.2 if quick else 1
+    n_ops = int(20000 * scale)
+    results = {}
+    for engine in BOOK_ENGINES:
+        for depth in (10, 100, 1000):
+            results['book/%s/depth=%d' % (engine, depth)] = bench_book(engine, depth, n_ops)
+            results['process_order/%s/depth=%d' % (engine, depth)] = bench_process_order(engine, depth, n_ops)
+    n_steps = int(200 * scale)
+    for n_traders in (20, 200, 1000):
+        for max_price in (100, 1000):
+            results['env_step/traders=%d/max_price=%d' % (n_traders, max_price)] = bench_env_step(n_traders, max_price, n_steps)
+    for n_traders in (200, 1000):
+        results['env_step/traders=%d/max_price=1000/vectorized_zip' % n_traders] = \
+            bench_env_step(n_traders, 1000, n_steps, vectorized_zip = True)
+    return results
+
+
+# Throughput metrics are better when higher, latency and memory ones when lower
+def higher_is_better(metric):
+    return metric.endswith('per_sec')
+
+
+# Compare results against a baseline; returns the list of regressions beyond tolerance (a ratio)
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, metrics in results.items():
+        if name not in baseline['results']:
+            print('%-60s (not in baseline)' % name)
+            continue
+        for metric, value in metrics.items():
+            base = baseline['results'][name].get(metric)
+            if not base:
+                continue
+            ratio = value / base
+            worse = ratio < 1 - tolerance if higher_is_better(metric) else ratio > 1 + tolerance
+            print('%-60s %-24s %12.1f %12.1f %6.2fx%s' % (name, metric, base, value, ratio, '  REGRESSION' if worse else ''))
+            if worse:
+                regressions.append((name, metric, base, value))
+    return regressions
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = 'Benchmark the exchange and environment hot paths')
+    parser.add_argument('--quick', action = 'store_true', help = 'smaller runs, for a fast check')
+    parser.add_argument('--save', metavar = 'FILE', help = 'store the results as a baseline JSON file')
+    parser.add_argument('--compare', metavar = 'FILE', help = 'compare the results against a baseline JSON file')
+    parser.add_argument('--tolerance', type = float, default = 0.25, help = 'relative change reported as a regression')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.quick)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('quick') != args.quick:
+            print('Note: the baseline was %s with --quick, the numbers are not directly comparable'
+                  % ('run' if baseline.get('quick') else 'not run'))
+        regressions = compare(results, baseline, args.tolerance)
+        print('%d regression(s)' % len(regressions))
+    else:
+        for name, metrics in results.items():
+            print(name, ' '.join('%s=%.1f' % item for item in metrics.items()))
+
+    if args.save:
+        with open(args.save, 'w') as baseline_file:
+            json.dump({ 'python': sys.version.split()[0], 'platform': platform.platform(), 'quick': args.quick,
+                        'results': results }, baseline_file, indent = 2, sort_keys = True)
+
+    if args.compare and regressions:
+        sys.exit(1)
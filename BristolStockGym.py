@@ -1,5 +1,8 @@
+import copy
+import math
 import random
 from Exchange import Exchange
+from OrderBookHalf import OrderBookHalf
 from Order import OType, Order
 
 # Import Trader strategies:
@@ -11,195 +14,606 @@ from ZIP import ZIP
 
 class Environment:
 
-    def __init__(self, max_time = 180, min_price = 1, max_price = 1000, replenish_orders = False):
+    # book_class selects the order book engine: OrderBookHalf, or OrderBookLadder for integer price ranges
+    # tape_window is the number of tape records the exchange keeps in memory
+    # tape_writer, if given, is a TapeWriter the tape of every session is streamed to
+    # vectorized_zip stores the ZIP traders in a ZIPPopulation and updates them all at once (needs NumPy)
+    # batch_quotes draws the quotes of the ZIC, ZIU and Giveaway traders in one QuoteBatch per strategy (needs NumPy)
+    # metrics, if given, is a StepMetrics recording where step() spends its time
+    # observation_encoder, if given, is an ObservationEncoder: observations are then its fixed-shape NumPy buffer,
+    # rewritten at every step, instead of a dictionary
+    # scheduler chooses the traders called at each step:
+    #   'all'      every trader is updated and acts, in a random order
+    #   'active'   only the traders holding an order are updated and act, so idle traders cost nothing
+    #   'arrival'  like 'active', but each active trader wakes up to act with probability arrival_rate at each step,
+    #              as in the original Bristol Stock Exchange; the players act at every step while they hold an order
+    # clearing is 'continuous' (each order is matched as it arrives) or 'call' (the orders of a step are collected
+    # and the exchange clears them together at one uniform price, see Exchange.process_orders)
+    # schedule, if given, is a MarketSchedule (needs NumPy): it sets the number of buyers and sellers (the player
+    # takes one of the slots of its side, ZIP traders or the population the others) and the limit prices of their orders
+    # market_metrics, if given, is a MarketMetrics scoring the market (Smith's alpha, efficiency, ...) as it runs
+    # tape_spill = False drops the tape records older than tape_window instead of spilling them to disk
+    # population, if given, replaces the default 10 ZIP buyers and 10 ZIP sellers: it is a list of groups of traders,
+    # each a dictionary { 'strategy': TType, 'side': OType, 'count': number of traders, 'params': { name: value } }
+    # ('params' is optional, each value is set on every trader of the group, e.g. { 'ca': 0.1 } for ZIP).
+    # Traders are named after their strategy and numbered across groups (ZIC0, ZIC1, ...). With a population, the
+    # traders are shuffled by a NumPy generator over an index array, for markets of hundreds of thousands of traders
+    # (needs NumPy). With a schedule as well, the groups must fill all its slots but the players' ones
+    # book_recorder, if given, is a BookRecorder recording the public LOB of every step, to replay the sessions
+    # (see ReplayEnvironment); reset() and restore() start a new recorded session
+    # players is the number of player traders: 'PLAYER', then 'PLAYER1', 'PLAYER2', ... With more than one, step()
+    # takes a dictionary of the players' orders { tid: order or None } (see MarketServer), and its observation
+    # and reward are those of 'PLAYER'
+    def __init__(self, max_time = 180, min_price = 1, max_price = 1000, replenish_orders = False, book_class = OrderBookHalf,
+                 tape_window = 65536, tape_writer = None, vectorized_zip = False, batch_quotes = False, metrics = None,
+                 observation_encoder = None, scheduler = 'all', arrival_rate = 0.1, clearing = 'continuous', schedule = None,
+                 market_metrics = None, tape_spill = True, population = None, players = 1,
+                 book_recorder = None):
+        if scheduler not in ('all', 'active', 'arrival'):
+            raise RuntimeError('Error when creating environment: unknown scheduler %s' % scheduler)
+        if scheduler == 'arrival' and not 0 < arrival_rate <= 1:
+            raise RuntimeError('Error when creating environment: arrival_rate must be in (0, 1]')
+        if clearing not in ('continuous', 'call'):
+            raise RuntimeError('Error when creating environment: unknown clearing %s' % clearing)
+        if players < 1:
+            raise RuntimeError('Error when creating environment: at least one player is needed')
+        if population != None:
+            self._check_population(population, schedule, players)
         self.maxtime = max_time
         self.minprice = min_price
         self.maxprice = max_price
+        # Rules of the market, one dictionary shared by all the traders, which never modify it
+        self.exchange_rules = { 'minprice': min_price, 'maxprice': max_price }
         self.replenish_orders = replenish_orders
+        self.book_class = book_class
+        self.tape_window = tape_window
+        self.tape_spill = tape_spill
+        self.tape_writer = tape_writer
+        self.book_recorder = book_recorder
+        self.vectorized_zip = vectorized_zip
+        self.zip_population = None
+        self.batch_quotes = batch_quotes
+        self.quote_batches = {}
+        self.metrics = metrics
+        self.observation_encoder = observation_encoder
+        self.scheduler = scheduler
+        self.arrival_rate = arrival_rate
+        self.clearing = clearing
+        self.schedule = schedule
+        self.market_metrics = market_metrics
+        self.population = population
+        self.players = players
+        self.player_keys = ['PLAYER'] + ['PLAYER%d' % i for i in range(1, players)]
+        # Trader ids in population order, and the generator shuffling them when a population is given
+        self.trader_keys = []
+        self.shuffle_rng = None
+        # Index of each trader among the buyers or the sellers of the schedule
+        self.schedule_slots = {}
+        # Active traders (holding an order), as a list with the position of each of them for O(1) removal
+        self.active_keys = []
+        self.active_index = {}
         self.init = False
 
+    # A population must name trading strategies and sides, with a non-negative count for each group
+    def _check_population(self, population, schedule, players):
+        counts = { OType.BID: 0, OType.ASK: 0 }
+        for group in population:
+            if not isinstance(group.get('strategy'), TType) or group['strategy'] == TType.PLAYER:
+                raise RuntimeError('Error when creating environment: unknown population strategy %s' % group.get('strategy'))
+            if group.get('side') not in (OType.BID, OType.ASK):
+                raise RuntimeError('Error when creating environment: unknown population side %s' % group.get('side'))
+            if group.get('count', -1) < 0:
+                raise RuntimeError('Error when creating environment: population groups need a non-negative count')
+            counts[group['side']] += group['count']
+        if schedule != None and (counts[OType.BID] + counts[OType.ASK] != schedule.n_buyers + schedule.n_sellers - players
+                                 or counts[OType.BID] > schedule.n_buyers or counts[OType.ASK] > schedule.n_sellers):
+            raise RuntimeError('Error when creating environment: the population does not fill the schedule')
+
     def _get_observation(self):
+        if self.observation_encoder != None:
+            return self.observation_encoder.encode(self.exchange, self.traders['PLAYER'], self.time)
         observation = {
             'lob': self.exchange.get_public_lob(self.time),
             'trader': self.traders['PLAYER']
         }
         return observation
 
-    # TODO: improve order creation and assigning
-    def _generate_order(self, trader_id, order_type, time):
+    # With a schedule, the limit price is looked up in it; otherwise it is drawn around 50
+    def _generate_order(self, trader_id, order_type, time, qty = 1):
+        if self.schedule != None:
+            slot = self.schedule_slots.get(trader_id)
+            if slot == None:
+                raise RuntimeError('Error when generating order: trader %s has no place in the schedule' % trader_id)
+            price = self.schedule.limit(order_type == OType.BID, slot, time)
+            return Order(trader_id, order_type, price, qty, time)
         offset = random.randint(-10, 10)
         price = 50 + offset
-        new_order = Order(trader_id, order_type, price, 1, time)
+        new_order = Order(trader_id, order_type, price, qty, time)
         return new_order
 
+    # Theoretical (equilibrium price, equilibrium quantity, highest total surplus) of the current period of the
+    # schedule, see MarketSchedule.equilibrium; None without a schedule
+    def equilibrium(self):
+        if self.schedule == None:
+            return None
+        return self.schedule.equilibrium(self.time)
+
     def reset(self):
-        self.exchange = Exchange(self.minprice, self.maxprice)
+        if self.init and self.tape_writer in self.exchange.tape.writers:
+            self.exchange.tape.remove_writer(self.tape_writer)
+        self.exchange = Exchange(self.minprice, self.maxprice, self.book_class, self.tape_window, self.tape_spill)
+        if self.tape_writer != None:
+            self.exchange.stream_tape(self.tape_writer)
         self.time = 1
         self.done = False
+        self.zip_population = None
+        if self.vectorized_zip:
+            from ZIPPopulation import ZIPPopulation
+            self.zip_population = ZIPPopulation(self.minprice, self.maxprice)
+        market_metrics = self.market_metrics
+        if market_metrics != None:
+            market_metrics.reset()
+            if self.schedule != None:
+                market_metrics.set_equilibrium(self.schedule.equilibrium(0)[0])
         self.traders = self._populate_traders()
+        self.trader_keys = list(self.traders.keys())
+        self.shuffle_rng = None
+        if self.population != None:
+            import numpy as np
+            self.shuffle_rng = np.random.default_rng(random.getrandbits(64))
+        if market_metrics != None:
+            for trader in self.traders.values():
+                if trader.order != None:
+                    market_metrics.assign(trader, trader.order)
+        self.active_keys = []
+        self.active_index = {}
+        for tid, trader in self.traders.items():
+            if trader.order != None:
+                self._activate(tid)
+        # Traders updated one by one: all of them, except the ZIP traders if their population updates them
+        self.object_update_keys = [tid for tid, trader in self.traders.items()
+                                   if self.zip_population == None or trader.ttype != TType.ZIP]
+        self.quote_batches = {}
+        if self.batch_quotes:
+            from QuoteBatch import QuoteBatch
+            for trader in self.traders.values():
+                if trader.ttype in QuoteBatch.STRATEGIES:
+                    if trader.ttype not in self.quote_batches:
+                        self.quote_batches[trader.ttype] = QuoteBatch(trader.ttype, self.minprice, self.maxprice)
+                    self.quote_batches[trader.ttype].add(trader)
         self.init = True
+        if self.book_recorder != None:
+            self.book_recorder.start(self.exchange, self.time)
         return self._get_observation()
 
+    # Independent copy of the environment in its current state, e.g. to roll out a branch of the market
+    # The books, the traders and their populations are copied, with the state of the populations' generators;
+    # the tape shares its history with this environment, so a fork costs in proportion to the live book and
+    # the population, not to the length of the session. The fork has no tape writer, book recorder nor metrics
+    # (of either kind), and its own observation buffer. Both environments draw from the global random module:
+    # see snapshot()/restore() to replay a branch with the same draws
+    def fork(self):
+        if not self.init:
+            raise RuntimeError('Error: fork() function in environment called before reset()')
+        environment = copy.copy(self)
+        environment.tape_writer = None
+        environment.book_recorder = None
+        environment.metrics = None
+        environment.market_metrics = None
+        if self.observation_encoder != None:
+            encoder = self.observation_encoder
+            environment.observation_encoder = type(encoder)(encoder.depth, encoder.trades)
+        environment._load_state(self)
+        return environment
+
+    # Snapshot of the state of the environment, including the state of the random module and of the market metrics
+    # restore() can go back to it any number of times
+    def snapshot(self):
+        snapshot = { 'environment': self.fork(), 'random_state': random.getstate() }
+        if self.market_metrics != None:
+            snapshot['market_metrics'] = self.market_metrics.state()
+        return snapshot
+
+    # Go back to a snapshot: the market state is copied from it and the random module state is restored,
+    # so that stepping again with the same actions replays the same session
+    # The records added since the snapshot are not removed from the tape writer, if any, and the restored
+    # tape is no longer streamed to it
+    def restore(self, snapshot):
+        if self.init and self.tape_writer in self.exchange.tape.writers:
+            self.exchange.tape.remove_writer(self.tape_writer)
+        self._load_state(snapshot['environment'])
+        random.setstate(snapshot['random_state'])
+        if self.market_metrics != None and 'market_metrics' in snapshot:
+            self.market_metrics.load_state(snapshot['market_metrics'])
+        if self.book_recorder != None:
+            self.book_recorder.start(self.exchange, self.time)
+
+    # Copy the market state of another environment into this one
+    def _load_state(self, source):
+        self.exchange = source.exchange.fork()
+        self.traders = { tid: trader.fork() for tid, trader in source.traders.items() }
+        self.zip_population = None
+        if source.zip_population != None:
+            self.zip_population = source.zip_population.fork(self.traders)
+        self.quote_batches = { ttype: quote_batch.fork(self.traders) for ttype, quote_batch in source.quote_batches.items() }
+        self.object_update_keys = list(source.object_update_keys)
+        self.trader_keys = source.trader_keys
+        self.shuffle_rng = copy.deepcopy(source.shuffle_rng)
+        self.active_keys = list(source.active_keys)
+        self.active_index = dict(source.active_index)
+        self.time = source.time
+        self.done = source.done
+        self.init = source.init
+
     def step(self, player_action):
         if not self.init:
             raise RuntimeError('Error: step() function in environment called before reset()')
 
+        # Instrumentation, only when the environment has been given a StepMetrics
+        metrics = self.metrics
+        if metrics != None:
+            clock = metrics.clock
+            metrics.begin_step(self.time, len(self.exchange.tape))
+            phase_start = clock()
+
         balance = 0
 
-        ## Shuffle traders in a random order
-        trader_keys =  list(self.traders.keys())
-        random.shuffle(trader_keys)
+        # Equilibrium of the current period of the schedule, for the market metrics
+        market_metrics = self.market_metrics
+        if market_metrics != None and self.schedule != None:
+            market_metrics.set_equilibrium(self.schedule.equilibrium(self.time)[0])
 
-        ## Update the traders with the latest public lob
-        for trader_key in trader_keys:
-            self.traders[trader_key].update(self.exchange.get_public_lob(self.time))
+        ## Shuffle the traders called at this step in a random order
+        if self.scheduler == 'all':
+            trader_keys = self._shuffle(self.trader_keys)
+            if self.zip_population != None:
+                update_keys = self.object_update_keys
+            else:
+                update_keys = trader_keys
+        else:
+            trader_keys = self._shuffle(self._wake_traders())
+            if self.zip_population != None:
+                update_keys = [tid for tid in self.active_keys if self.traders[tid].ttype != TType.ZIP]
+            else:
+                update_keys = self.active_keys
+        # Traders who completed their order at this step
+        finished = []
+
+        if metrics != None:
+            now = clock()
+            metrics.add_phase('shuffle', now - phase_start)
+            phase_start = now
+
+        ## Update the traders with the latest public lob, one snapshot shared by all of them
+        public_lob = self.exchange.get_public_lob(self.time)
+        if metrics != None:
+            self._timed_update(public_lob, update_keys, metrics)
+        else:
+            if self.zip_population != None:
+                self.zip_population.update(public_lob)
+            for trader_key in update_keys:
+                self.traders[trader_key].update(public_lob)
+
+        if metrics != None:
+            now = clock()
+            metrics.add_phase('update', now - phase_start)
+            phase_start = now
 
         ## Process trader actions
 
+        # Batched traders draw their quotes all at once
+        for quote_batch in self.quote_batches.values():
+            quote_batch.quote(self.time)
+
+        if metrics != None:
+            metrics.add_phase('action', clock() - phase_start)
+
         # In their random order, traders take an action
+        # With call clearing their orders are collected and cleared together once they have all acted
+        batch = [] if self.clearing == 'call' else None
+        player_actions = player_action if self.players > 1 else None
         for trader_key in trader_keys:
             trader = self.traders[trader_key]
-            order = trader.action(player_action, self.time)
-            output = None
-            if order != None: # If an order is placed, process it
-                output = self.exchange.process_order(order, self.time)
-            if output != None: # If a trade occurred due to the order being placed, notify the parties involved
-                trader1 = self.traders[output['party1']]
-                trader2 = self.traders[output['party2']]
-                trader1.notify_transaction(output)
-                trader2.notify_transaction(output)
-                if output['party1'] == 'PLAYER' or output['party2'] == 'PLAYER': # If the player trader was involved in the trade, this step's reward becomes the balance of the trade
-                    player = self.traders['PLAYER']
-                    balance = player.balance
+            if metrics != None:
+                action_start = clock()
+            if trader.quote_batch != None:
+                order = trader.quote_batch.order(trader.batch_index, self.time)
+            elif player_actions != None and trader.ttype == TType.PLAYER:
+                order = trader.action(player_actions.get(trader_key), self.time)
+            else:
+                order = trader.action(player_action, self.time)
+            fills = None
+            if metrics != None:
+                match_start = clock()
+                metrics.add_phase('action', match_start - action_start)
+                metrics.add_action(trader.ttype, match_start - action_start)
+            if order != None and batch != None:
+                batch.append(order)
+            elif order != None: # If an order is placed, process it
+                fills = self.exchange.process_order(order, self.time)
+                if metrics != None:
+                    notify_start = clock()
+                    metrics.add_match(notify_start - match_start, len(fills))
+            if fills: # If trades occurred due to the order being placed, notify the parties involved in each fill
+                if self._settle(fills, finished): # If the player trader was involved in the trade, this step's reward becomes the balance of the trade
+                    balance = self.traders['PLAYER'].balance
+                if metrics != None:
+                    metrics.add_phase('notify', clock() - notify_start)
+
+        # Call auction of the orders collected from the traders
+        if batch:
+            if metrics != None:
+                match_start = clock()
+            fills = self.exchange.process_orders(batch, self.time, 'call')
+            if metrics != None:
+                notify_start = clock()
+                metrics.add_match(notify_start - match_start, len(fills), len(batch))
+            if self._settle(fills, finished):
+                balance = self.traders['PLAYER'].balance
+            if metrics != None:
+                metrics.add_phase('notify', clock() - notify_start)
+
+        if metrics != None:
+            phase_start = clock()
 
         # Assign new orders to the traders who completed the previous ones if the exchange(experiment) rules say so
         # Here we could try preserving which trader bids and which
         # trader asks (chosen), or we could give them random orders (thus upsetting the balance)
+        # Without the 'all' scheduler, only the traders who finished at this step can need a new order
         if self.replenish_orders == True:
-            for trader_key in trader_keys:
+            for trader_key in (trader_keys if self.scheduler == 'all' else finished):
                 trader = self.traders[trader_key]
                 if trader.order == None:
                     new_order = self._generate_order(trader.tid, trader.otype, self.time)
                     trader.assign_order(new_order)
+                    if market_metrics != None:
+                        market_metrics.assign(trader, new_order)
+                    if self.scheduler != 'all':
+                        self._activate(trader_key)
+
+        if metrics != None:
+            now = clock()
+            metrics.add_phase('replenish', now - phase_start)
+            phase_start = now
 
         # Increment timestep
         if self.time >= self.maxtime:
             self.done = True
+            if self.tape_writer != None:
+                self.exchange.tape.flush()
         self.time += 1
+        if self.book_recorder != None:
+            self.book_recorder.record(self.exchange, self.time)
 
         observation = self._get_observation()
         reward = balance
         done = self.done
         info = ""
         if self.done: # Return the balance of each trader
-            info = "BALANCES: \n"
-            trader_keys =  list(self.traders.keys())
-            for trader_key in trader_keys:
-                trader = self.traders[trader_key]
-                balance = trader.balance
-                string = trader_key + ":" + str(trader.balance) + "\n"
-                info = info + string
+            info = "BALANCES: \n" + "".join([trader_key + ":" + str(trader.balance) + "\n"
+                                              for trader_key, trader in self.traders.items()])
+
+        if metrics != None:
+            metrics.add_phase('observation', clock() - phase_start)
+            metrics.end_step(len(self.exchange.tape))
 
         return observation, reward, done, info
 
+    # Update phase of step(), timing every trader (or population) by strategy
+    def _timed_update(self, public_lob, trader_keys, metrics):
+        clock = metrics.clock
+        if self.zip_population != None:
+            start = clock()
+            self.zip_population.update(public_lob)
+            metrics.add_update(TType.ZIP, clock() - start)
+        for trader_key in trader_keys:
+            trader = self.traders[trader_key]
+            start = clock()
+            trader.update(public_lob)
+            metrics.add_update(trader.ttype, clock() - start)
+
+    # Notify the parties of each fill, and retire the traders whose order is complete from the active set
+    # The traders retired are added to finished; returns True if the player took part in a fill
+    def _settle(self, fills, finished):
+        player_traded = False
+        market_metrics = self.market_metrics
+        for output in fills:
+            trader1 = self.traders[output['party1']]
+            trader2 = self.traders[output['party2']]
+            if market_metrics != None:
+                market_metrics.trade(output, trader1, trader2)
+            trader1.notify_transaction(output)
+            trader2.notify_transaction(output)
+            if self.scheduler != 'all':
+                for finished_trader in (trader1, trader2):
+                    if finished_trader.order == None and finished_trader.tid in self.active_index:
+                        self._deactivate(finished_trader.tid)
+                        finished.append(finished_trader.tid)
+            if output['party1'] == 'PLAYER' or output['party2'] == 'PLAYER':
+                player_traded = True
+        return player_traded
+
+    def _activate(self, tid):
+        if tid not in self.active_index:
+            self.active_index[tid] = len(self.active_keys)
+            self.active_keys.append(tid)
+
+    def _deactivate(self, tid):
+        i = self.active_index.pop(tid, None)
+        if i == None:
+            return
+        # Move the last active trader into the freed position
+        last = self.active_keys.pop()
+        if last != tid:
+            self.active_keys[i] = last
+            self.active_index[last] = i
+
+    # Copy of a list of trader ids in a random order
+    # With a population the permutation is drawn as an index array by the NumPy generator, much faster than
+    # random.shuffle on large populations
+    def _shuffle(self, keys):
+        if self.shuffle_rng == None:
+            keys = list(keys)
+            random.shuffle(keys)
+            return keys
+        return list(map(keys.__getitem__, self.shuffle_rng.permutation(len(keys)).tolist()))
+
+    # Active traders acting at this step, in no particular order
+    # With the 'arrival' scheduler each of them wakes up with probability arrival_rate: the gaps between
+    # woken traders are drawn from a geometric distribution, so only the woken traders are visited
+    def _wake_traders(self):
+        if self.scheduler == 'active' or self.arrival_rate >= 1:
+            return list(self.active_keys)
+        keys = self.active_keys
+        log_miss = math.log(1.0 - self.arrival_rate)
+        woken = []
+        i = int(math.log(1.0 - random.random()) / log_miss)
+        while i < len(keys):
+            woken.append(keys[i])
+            i += 1 + int(math.log(1.0 - random.random()) / log_miss)
+        for tid in self.player_keys:
+            if tid in self.active_index and tid not in woken:
+                woken.append(tid)
+        return woken
+
     def _populate_traders(self):
 
         # Create and return a trader of the specified type
         def create_trader(trader_type, trader_id, min_price, max_price):
+            rules = self.exchange_rules
+            if trader_type == TType.ZIP and self.zip_population != None:
+                from ZIPPopulation import PooledZIP
+                return PooledZIP(trader_type, trader_id, min_price, max_price, self.zip_population, rules)
             if trader_type == TType.GVWY:
-                trader = Giveaway(trader_type, trader_id, min_price, max_price)
+                trader = Giveaway(trader_type, trader_id, min_price, max_price, rules)
             elif trader_type == TType.ZIU:
-                trader = ZIU(trader_type, trader_id, min_price, max_price)
+                trader = ZIU(trader_type, trader_id, min_price, max_price, rules)
             elif trader_type == TType.ZIC:
-                trader = ZIC(trader_type, trader_id, min_price, max_price)
+                trader = ZIC(trader_type, trader_id, min_price, max_price, rules)
             elif trader_type == TType.ZIP:
-                trader = ZIP(trader_type, trader_id, min_price, max_price)
+                trader = ZIP(trader_type, trader_id, min_price, max_price, rules)
             else:
-                trader = Trader(trader_type, trader_id, min_price, max_price)
+                trader = Trader(trader_type, trader_id, min_price, max_price, rules)
             return trader
 
-        # Generates a trader and assigns an order to it
-        def generate_trader(self, trader_id, trader_type, order_type, min_price, max_price):
-            #trader = Trader(trader_type, trader_id, min_price, max_price) # TODO: Here for reference. Remove.
+        # Generates a trader, sets its parameters and assigns an order to it
+        def generate_trader(self, trader_id, trader_type, order_type, min_price, max_price, params = None):
             trader = create_trader(trader_type, trader_id, min_price, max_price)
+            if params != None:
+                for name, value in params.items():
+                    if not hasattr(trader, name):
+                        raise RuntimeError('Error when creating trader: %s traders have no parameter %s' % (trader_type.name, name))
+                    setattr(trader, name, value)
             new_order = self._generate_order(trader.tid, order_type, 0)
             trader.assign_order(new_order)
             return trader
 
         traders = {}
 
-        tid = 'PLAYER'
-        initial_otype = OType.BID if random.randint(0,1) == 0 else OType.ASK
-        traders[tid] = generate_trader(self, tid, TType.PLAYER, initial_otype, self.minprice, self.maxprice)
-
-        # TODO: For now, modify here to change NPC traders. Make it customizable in the future.
-        for i in range(0, 10):
-            tid = 'ZIP' + str(i)
-            traders[tid] = generate_trader(self, tid, TType.ZIP, OType.BID, self.minprice, self.maxprice)
-        for i in range(10, 20): # TODO: Add check and test in exchange so that two traders cannot have same tid
-            tid = 'ZIP' + str(i)
-            traders[tid] = generate_trader(self, tid, TType.ZIP, OType.ASK, self.minprice, self.maxprice)
+        # Each player is a buyer or a seller at random
+        player_otypes = [OType.BID if random.randint(0,1) == 0 else OType.ASK for tid in self.player_keys]
+        population = self.population
+        if self.schedule != None:
+            n_slots = { OType.BID: self.schedule.n_buyers, OType.ASK: self.schedule.n_sellers }
+            if population != None:
+                # The players take the slots the population leaves free
+                free = n_slots[OType.BID] - sum(group['count'] for group in population if group['side'] == OType.BID)
+                player_otypes = [OType.BID if i < free else OType.ASK for i in range(len(player_otypes))]
+            # Each trader takes the next slot of its side, the players the first ones
+            next_slot = { OType.BID: 0, OType.ASK: 0 }
+            self.schedule_slots = {}
+            for tid, otype in zip(self.player_keys, player_otypes):
+                if next_slot[otype] >= n_slots[otype]:
+                    raise RuntimeError('Error when creating traders: more players than places in the schedule')
+                self.schedule_slots[tid] = next_slot[otype]
+                next_slot[otype] += 1
+        for tid, otype in zip(self.player_keys, player_otypes):
+            traders[tid] = generate_trader(self, tid, TType.PLAYER, otype, self.minprice, self.maxprice)
+
+        # Without a population, ZIP traders: 10 buyers and 10 sellers, or as many as the schedule has places for
+        if population == None:
+            if self.schedule != None:
+                counts = [n_slots[otype] - next_slot[otype] for otype in (OType.BID, OType.ASK)]
+            else:
+                counts = [10, 10]
+            population = [{ 'strategy': TType.ZIP, 'side': OType.BID, 'count': counts[0] },
+                          { 'strategy': TType.ZIP, 'side': OType.ASK, 'count': counts[1] }]
+
+        numbers = {}
+        for group in population:
+            trader_type = group['strategy']
+            otype = group['side']
+            params = group.get('params')
+            for i in range(group['count']):
+                number = numbers.get(trader_type, 0)
+                numbers[trader_type] = number + 1
+                tid = trader_type.name + str(number)
+                if self.schedule != None:
+                    self.schedule_slots[tid] = next_slot[otype]
+                    next_slot[otype] += 1
+                traders[tid] = generate_trader(self, tid, trader_type, otype, self.minprice, self.maxprice, params)
 
         return traders
 
-if __name__ == "__main__":
+# Example player strategies, taking an observation and returning the player order (or None)
 
-    environment = Environment(min_price = 1, max_price = 100, replenish_orders = True)
-    i = 0
-    totalreward = 0
-    done = False
-    observation = environment.reset()
+# ZIU STRATEGY
+def ziu_strategy(observation):
 
-    # ZIU STRATEGY
-    def ziu_strategy(observation):
+    # If the player has already traded, idle
+    if observation['trader'].order == None:
+        return None
 
-        # If the player has already traded, idle
-        if observation['trader'].order == None:
-            return None
+    # Obtain details from observation
+    time = observation['lob']['time']
+    tid = observation['trader'].tid
+    order_type = observation['trader'].order.otype
+    min_price = observation['trader'].exchange_rules['minprice']
+    max_price = observation['trader'].exchange_rules['maxprice']
 
-        # Obtain details from observation
-        time = observation['lob']['time']
-        tid = observation['trader'].tid
-        order_type = observation['trader'].order.otype
-        min_price = observation['trader'].exchange_rules['minprice']
-        max_price = observation['trader'].exchange_rules['maxprice']
+    # Choose price
+    price = random.randint(min_price,max_price)
 
-        # Choose price
-        price = random.randint(min_price,max_price)
 
+    # Form and return order
+    order = Order(tid, order_type, price, 1, time)
+    return order
 
-        # Form and return order
-        order = Order(tid, order_type, price, 1, time)
-        return order
-    #
+# ZIC STRATEGY
+def zic_strategy(observation):
 
-    # ZIC STRATEGY
-    def zic_strategy(observation):
+    # If the player has already traded, idle
+    if observation['trader'].order == None:
+        return None
 
-        # If the player has already traded, idle
-        if observation['trader'].order == None:
-            return None
+    # Obtain details from observation
+    time = observation['lob']['time']
+    tid = observation['trader'].tid
+    order_price = observation['trader'].order.price
+    order_type = observation['trader'].order.otype
+    min_price = observation['trader'].exchange_rules['minprice']
+    max_price = observation['trader'].exchange_rules['maxprice']
 
-        # Obtain details from observation
-        time = observation['lob']['time']
-        tid = observation['trader'].tid
-        order_price = observation['trader'].order.price
-        order_type = observation['trader'].order.otype
-        min_price = observation['trader'].exchange_rules['minprice']
-        max_price = observation['trader'].exchange_rules['maxprice']
-
-        # Choose price
-        if order_type == OType.BID:
-            price = random.randint(min_price,order_price)
-        elif order_type == OType.ASK:
-            price = random.randint(order_price, max_price)
-        else:
-            raise RuntimeError('Observation contains malformed order.')
+    # Choose price
+    if order_type == OType.BID:
+        price = random.randint(min_price,order_price)
+    elif order_type == OType.ASK:
+        price = random.randint(order_price, max_price)
+    else:
+        raise RuntimeError('Observation contains malformed order.')
+
+    # Form and return order
+    order = Order(tid, order_type, price, 1, time)
+    return order
+
+
+if __name__ == "__main__":
 
-        # Form and return order
-        order = Order(tid, order_type, price, 1, time)
-        return order
-    #
+    environment = Environment(min_price = 1, max_price = 100, replenish_orders = True)
+    i = 0
+    totalreward = 0
+    done = False
+    observation = environment.reset()
 
     while not done:
         action = zic_strategy(observation)
@@ -0,0 +1,132 @@
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from BristolStockGym import Environment, zic_strategy
+from Tape import TRADE, CANCEL
+
+# Runs Monte Carlo market experiments: many independent sessions of an Environment, spread over a
+# pool of worker processes. Each worker builds its own Environment from env_kwargs, only the seed
+# goes to the worker and only a small summary of the session comes back.
+
+
+# Independent, reproducible seeds for n episodes, derived from a base seed
+def episode_seeds(n_episodes, seed = 0):
+    rng = random.Random(seed)
+    return [rng.getrandbits(64) for _ in range(n_episodes)]
+
+
+# Run one session in the current process and summarise it
+# strategy is the player strategy: a module-level function from observation to order (see zic_strategy)
+def run_episode(seed, env_kwargs = None, strategy = zic_strategy):
+    random.seed(seed)
+    environment = Environment(**(env_kwargs or {}))
+    observation = environment.reset()
+    total_reward = 0
+    done = False
+    while not done:
+        observation, reward, done, info = environment.step(strategy(observation))
+        total_reward += reward
+
+    # Tape statistics, read from the tape columns rather than from its records
+    tape = environment.exchange.tape
+    trades = 0
+    cancels = 0
+    price_sum = 0
+    min_price = None
+    max_price = None
+    for i in range(tape.first_retained(), len(tape)):
+        row = tape.row(i)
+        if row[0] == TRADE:
+            price = row[2]
+            trades += 1
+            price_sum += price
+            min_price = price if min_price == None else min(min_price, price)
+            max_price = price if max_price == None else max(max_price, price)
+        elif row[0] == CANCEL:
+            cancels += 1
+
+    return {
+        'seed': seed,
+        'reward': total_reward,
+        'balances': { tid: trader.balance for tid, trader in environment.traders.items() },
+        'trades': trades,
+        'cancels': cancels,
+        'mean_price': price_sum / trades if trades > 0 else None,
+        'min_price': min_price,
+        'max_price': max_price
+    }
+
+
+# Aggregates episode summaries as they arrive
+class EpisodeStats:
+
+    def __init__(self):
+        self.episodes = 0
+        self.reward_sum = 0
+        self.balance_sums = {}
+        self.trades = 0
+        self.cancels = 0
+        self.price_sum = 0
+        self.min_price = None
+        self.max_price = None
+
+    def add(self, summary):
+        self.episodes += 1
+        self.reward_sum += summary['reward']
+        for tid, balance in summary['balances'].items():
+            self.balance_sums[tid] = self.balance_sums.get(tid, 0) + balance
+        self.trades += summary['trades']
+        self.cancels += summary['cancels']
+        if summary['trades'] > 0:
+            self.price_sum += summary['mean_price'] * summary['trades']
+            if self.min_price == None or summary['min_price'] < self.min_price:
+                self.min_price = summary['min_price']
+            if self.max_price == None or summary['max_price'] > self.max_price:
+                self.max_price = summary['max_price']
+
+    def result(self):
+        n = max(self.episodes, 1)
+        return {
+            'episodes': self.episodes,
+            'mean_reward': self.reward_sum / n,
+            'mean_balances': { tid: total / n for tid, total in self.balance_sums.items() },
+            'mean_trades': self.trades / n,
+            'mean_cancels': self.cancels / n,
+            'mean_price': self.price_sum / self.trades if self.trades > 0 else None,
+            'min_price': self.min_price,
+            'max_price': self.max_price
+        }
+
+
+# Run n_episodes sessions over a pool of `workers` processes (all cores by default)
+# on_episode, if given, is called in the parent process with each summary as soon as it arrives
+# Returns the aggregated statistics (EpisodeStats.result())
+def run_episodes(n_episodes, seed = 0, workers = None, env_kwargs = None, strategy = zic_strategy, on_episode = None):
+    stats = EpisodeStats()
+    seeds = episode_seeds(n_episodes, seed)
+    if workers == 1:
+        for episode_seed in seeds:
+            summary = run_episode(episode_seed, env_kwargs, strategy)
+            stats.add(summary)
+            if on_episode != None:
+                on_episode(summary)
+        return stats.result()
+
+    with ProcessPoolExecutor(max_workers = workers or os.cpu_count()) as executor:
+        futures = [executor.submit(run_episode, episode_seed, env_kwargs, strategy) for episode_seed in seeds]
+        for future in as_completed(futures):
+            summary = future.result()
+            stats.add(summary)
+            if on_episode != None:
+                on_episode(summary)
+    return stats.result()
+
+
+if __name__ == "__main__":
+
+    # The BristolStockGym experiment: ZIC player against 20 ZIP traders, over many sessions
+    result = run_episodes(1000, seed = 0, env_kwargs = { 'min_price': 1, 'max_price': 100, 'replenish_orders': True })
+    print("Episodes:", result['episodes'])
+    print("Mean player balance:", result['mean_reward'])
+    print("Mean trades per session:", result['mean_trades'])
+    print("Mean balances:", result['mean_balances'])
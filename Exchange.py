@@ -1,14 +1,39 @@
+import copy
 from Order import OType, Order
 from OrderBookHalf import OrderBookHalf
+from Tape import Tape
+from TapeWriter import CSVTapeWriter
+
+# Levels of one side of a public LOB ([price, qty] pairs) that changed since the levels held in book ({ price: qty }),
+# as [price, qty] pairs, qty 0 for a level that is gone; book is updated to the new levels
+def book_delta(book, levels):
+    delta = []
+    current = {}
+    for price, qty in levels:
+        current[price] = qty
+        if book.get(price) != qty:
+            delta.append([price, qty])
+    for price in book:
+        if price not in current:
+            delta.append([price, 0])
+    book.clear()
+    book.update(current)
+    return delta
 
 # Orderbook for a single instrument: list of bids and list of asks
 class OrderBook:
 
-    def __init__(self, min_price = 1, max_price = 1000):
-            self.bids = OrderBookHalf(OType.BID, min_price, max_price)
-            self.asks = OrderBookHalf(OType.ASK, min_price, max_price)
-            self.tape = []
+    # book_class is the engine used for each side of the book: OrderBookHalf or OrderBookLadder
+    # tape_window is the number of tape records kept in memory, older ones are spilled to disk (or dropped,
+    # if tape_spill is False)
+    def __init__(self, min_price = 1, max_price = 1000, book_class = OrderBookHalf, tape_window = 65536, tape_spill = True):
+            self.bids = book_class(OType.BID, min_price, max_price)
+            self.asks = book_class(OType.ASK, min_price, max_price)
+            self.tape = Tape(tape_window, spill = tape_spill)
             self.quote_id = 0  #unique ID code for each quote accepted onto the book
+            self.quotes = {}  # orders resting on the book, indexed by quote i.d.
+            self.version = 0  # incremented whenever the books or the tape change
+            self.public_lob = None  # last published LOB snapshot
 
     def generate_quote_id(self):
         qid = self.quote_id
@@ -17,80 +42,213 @@ class OrderBook:
 
 class Exchange(OrderBook):
 
+    # Copy of the exchange, e.g. for a forked environment: the books are copied, the tape shares its history
+    def fork(self):
+        exchange = copy.copy(self)
+        exchange.bids = self.bids.fork()
+        exchange.asks = self.asks.fork()
+        exchange.tape = self.tape.fork()
+        exchange.quotes = {}
+        for book in (exchange.bids, exchange.asks):
+            for order in book.orders.values():
+                exchange.quotes[order.qid] = order
+        exchange.public_lob = None
+        return exchange
+
+    # Side of the book an order goes to
+    def _book(self, otype):
+        if otype == OType.BID:
+            return self.bids
+        elif otype == OType.ASK:
+            return self.asks
+        raise RuntimeError('Error when routing order in exchange: malformed order')
+
     # add a quote/order to the exchange; return unique i.d.
-    def add_order(self, order):
+    # A trader's new quote replaces its resting one on the same side, which leaves the quote index and is
+    # recorded on the tape as cancelled at time (by default the time of the new order)
+    # Every order entering the exchange (process_order, process_orders, cancel_replace) goes through here
+    def add_order(self, order, time = None):
 
+        if order.qty < 1:
+            raise RuntimeError('Error when adding order to exchange: quantity %s is not positive' % order.qty)
+        book = self._book(order.otype)
+        resting = book.orders.get(order.tid)
+        if resting != None:
+            self.quotes.pop(resting.qid, None)
+            self.tape.append_cancel(order.time if time == None else time, resting.tid, resting.price, resting.qty, resting.qid)
         order.qid = self.generate_quote_id()
-        if order.otype == OType.BID:
-            self.bids.add_order(order)
-        elif order.otype == OType.ASK:
-            self.asks.add_order(order)
-        else:
-            raise RuntimeError('Error when adding order to exchange: malformed order')
+        self.version += 1
+        book.add_order(order)
+        self.quotes[order.qid] = order
 
         return order.qid
 
-    # delete a trader's quote/order from the exchange
+    # delete a trader's quote/order from the exchange, and record the cancellation on the tape
+    # The record describes the order resting on the book; returns it, or None if the trader had no order there
     def del_order(self, order, time):
+        resting = self._book(order.otype).orders.get(order.tid)
+        if resting == None:
+            return None
+        return self.cancel(resting.qid, time)
 
-        #Delete order
-        if order.otype == OType.BID:
-            self.bids.del_order(order)
-        elif order.otype == OType.ASK:
-            self.asks.del_order(order)
-        else:
-            raise RuntimeError('Error when deleting order from exchange: malformed order')
+    # Cancel the resting order with quote i.d. qid, updating only its price level
+    # Returns the cancel record added to the tape, or None if no order with that i.d. is resting
+    def cancel(self, qid, time):
+        order = self.quotes.pop(qid, None)
+        if order == None:
+            return None
+        self._book(order.otype).del_order(order)
+        self.version += 1
+        return self.tape.append_cancel(time, order.tid, order.price, order.qty, order.qid)
 
-        # Add cancellation to tape
-        # TODO: This is not working. Fix it.
-        cancel_record = { 'type': 'Cancel', 'time': time, 'order': order }
-        self.tape.append(cancel_record)
+    # Cancel the resting order qid and send a new one from the same trader, on the same side, at a new price
+    # (and quantity, by default what is left of the old order). The new order loses the queue position
+    # of the old one. Returns its fills (see process_order), or None if no order with that i.d. is resting
+    # The new price and quantity are checked before anything is cancelled: the price must be within the range
+    # of the book, the quantity at least 1
+    def cancel_replace(self, qid, price, time, qty = None):
+        order = self.quotes.get(qid)
+        if order == None:
+            return None
+        book = self._book(order.otype)
+        if price < book.minprice or price > book.maxprice:
+            raise RuntimeError('Error when replacing order %d: price %s outside of [%d, %d]' % (qid, price, book.minprice, book.maxprice))
+        if qty == None:
+            qty = order.qty
+        elif qty < 1:
+            raise RuntimeError('Error when replacing order %d: quantity %s is not positive' % (qid, qty))
+        self.cancel(qid, time)
+        new_order = Order(order.tid, order.otype, price, qty, time, symbol = order.symbol)
+        return self.process_order(new_order, time)
 
     # receive an order and either add it to the relevant LOB (ie treat as limit order)
-    # or if it crosses the best counterparty offer, execute it (treat as a market order)
+    # or, while it crosses the best counterparty offer, execute it (treat as a market order):
+    # the order sweeps the counterparty levels best-first, and each level in time priority,
+    # one fill per resting order, until it is filled or no longer crosses; the remainder rests on the book
+    # Returns the list of trade records of the fills, so that the traders are notified (empty if none)
     def process_order(self, order, time):
         # Add order to LOB
-        self.add_order(order)
-
-        best_bid, best_bid_tid = self.bids.get_best()
-        best_ask, best_ask_tid = self.asks.get_best()
-
-        # Check if the order crosses the best counterparty offer
-        price = None
-        party_tid = None
-        counterparty_tid = None
-        if order.otype == OType.BID and len(self.asks.lob) > 0 and best_bid >= best_ask: # If bid lifts the best ask
-            price = best_ask
-            party_tid = self.bids.delete_best()
-            counterparty_tid = self.asks.delete_best()
-        elif order.otype == OType.ASK and len(self.bids.lob) > 0 and best_ask <= best_bid: # If ask hits the best bid
-            price = best_bid
-            party_tid = self.asks.delete_best()
-            counterparty_tid = self.bids.delete_best()
-
-        # If there has been a transaction, add it to the tape and return it so that
-        # the traders are notified
-
-        if (price != None) and (party_tid != None) and (counterparty_tid != None):
-            transaction_record = { 'type': 'Trade',
-                                   'time': time,
-                                   'price': price,
-                                   'party1':counterparty_tid,
-                                   'party2':party_tid,
-                                   'qty': order.qty # Should always be 1 until update!
-                                  }
-            self.tape.append(transaction_record)
-            return transaction_record
+        self.add_order(order, time)
+
+        if order.otype == OType.BID:
+            book = self.bids
+            counterparty_book = self.asks
+        else:
+            book = self.asks
+            counterparty_book = self.bids
+        quotes = self.quotes
+
+        fills = []
+        while order.tid in book.orders:
+            best_price, counterparty_tid = counterparty_book.get_best()
+            if best_price == None:
+                break
+            # The order has been clipped to the price range by the book
+            if order.otype == OType.BID and order.price < best_price:
+                break
+            if order.otype == OType.ASK and order.price > best_price:
+                break
+            counterparty_order = counterparty_book.orders[counterparty_tid]
+            qty = min(order.qty, counterparty_order.qty)
+            # Filled orders leave the quote index
+            if book.reduce_order(order.tid, qty) == 0:
+                del quotes[order.qid]
+            if counterparty_book.reduce_order(counterparty_tid, qty) == 0:
+                del quotes[counterparty_order.qid]
+            fills.append(self.tape.append_trade(time, best_price, qty, counterparty_tid, order.tid))
+
+        if len(fills) > 0:
+            self.version += 1
+        return fills
+
+    # Process all the orders of a timestep at once; returns the trade records of every fill
+    #   mode 'continuous': each order is matched as it arrives, in the order of the batch, as by process_order
+    #   mode 'call': the orders are all added to the book, then the book is cleared by a call auction (see clear)
+    def process_orders(self, batch, time, mode = 'continuous'):
+        if mode == 'continuous':
+            fills = []
+            process_order = self.process_order
+            for order in batch:
+                order_fills = process_order(order, time)
+                if order_fills:
+                    fills.extend(order_fills)
+            return fills
+        elif mode == 'call':
+            add_order = self.add_order
+            for order in batch:
+                add_order(order, time)
+            return self.clear(time)
+        raise RuntimeError('Error when processing orders: unknown mode %s' % mode)
+
+    # Uniform price clearing the crossing part of the book, and the volume traded at that price,
+    # in one pass over the levels of each side, best-first
+    # The price is halfway between the last bid and ask levels that trade (rounded down); None if the book does not cross
+    def clearing_price(self):
+        bids = self.bids.lob_anon
+        asks = self.asks.lob_anon
+        volume = 0
+        marginal_bid = None
+        marginal_ask = None
+        i = 0
+        j = 0
+        bid_left = bids[0][1] if len(bids) > 0 else 0
+        ask_left = asks[0][1] if len(asks) > 0 else 0
+        while i < len(bids) and j < len(asks) and bids[i][0] >= asks[j][0]:
+            marginal_bid = bids[i][0]
+            marginal_ask = asks[j][0]
+            qty = min(bid_left, ask_left)
+            volume += qty
+            bid_left -= qty
+            ask_left -= qty
+            if bid_left == 0:
+                i += 1
+                if i < len(bids):
+                    bid_left = bids[i][1]
+            if ask_left == 0:
+                j += 1
+                if j < len(asks):
+                    ask_left = asks[j][1]
+        if volume == 0:
+            return None, 0
+        return (marginal_bid + marginal_ask) // 2, volume
+
+    # Call auction: execute the crossing orders at the uniform clearing price, pairing bids and asks in price-time priority
+    # In the trade records, party1 is the buyer and party2 the seller
+    def clear(self, time):
+        price, volume = self.clearing_price()
+        quotes = self.quotes
+        fills = []
+        while volume > 0:
+            _bid_price, bid_tid = self.bids.get_best()
+            _ask_price, ask_tid = self.asks.get_best()
+            bid = self.bids.orders[bid_tid]
+            ask = self.asks.orders[ask_tid]
+            qty = min(bid.qty, ask.qty, volume)
+            if self.bids.reduce_order(bid_tid, qty) == 0:
+                del quotes[bid.qid]
+            if self.asks.reduce_order(ask_tid, qty) == 0:
+                del quotes[ask.qid]
+            fills.append(self.tape.append_trade(time, price, qty, bid_tid, ask_tid))
+            volume -= qty
+        if len(fills) > 0:
+            self.version += 1
+        return fills
 
 
     # this returns the LOB data "published" by the exchange,
     # i.e., what is accessible to the traders
+    # The snapshot is read-only and shared: it is only rebuilt when the exchange version or the time changes
     def get_public_lob(self, time):
+        public_data = self.public_lob
+        if public_data != None and public_data['version'] == self.version and public_data['time'] == time:
+            return public_data
         public_data = {}
         public_data['time'] = time
-        public_data['bids'] = self.bids.lob_anon
-        public_data['asks'] = self.asks.lob_anon
-        public_data['tape'] = self.tape
+        public_data['version'] = self.version
+        public_data['bids'] = tuple([tuple(level) for level in self.bids.lob_anon])
+        public_data['asks'] = tuple([tuple(level) for level in self.asks.lob_anon])
+        public_data['tape'] = self.tape.view()
+        self.public_lob = public_data
         return public_data
 
     # This prints the public LOB data
@@ -98,22 +256,126 @@ class Exchange(OrderBook):
         public_data = self.get_public_lob(time)
         print('***')
         print('publish_lob: t=%d' % time)
-        print('BID_lob=%s' % public_data['bids'])
-        print('ASK_lob=%s' % public_data['asks'])
+        print('BID_lob=%s' % (public_data['bids'],))
+        print('ASK_lob=%s' % (public_data['asks'],))
         print('TAPE =', public_data['tape'])
         print('***')
         print()
 
-    # TODO: Revise this function
+    # Write the tape, trades and cancellations, to a CSV file (see CSVTapeWriter) in chunks
+    # fmode is the file mode ('w' or 'a'); with tmode == 'wipe' the tape is cleared afterwards
     def tape_dump(self, fname, fmode, tmode):
-        dumpfile = open(fname, fmode)
-        for tapeitem in self.tape:
-            if tapeitem['type'] == 'Trade' :
-                dumpfile.write('%s, %s\n' % (tapeitem['time'], tapeitem['price']))
-        dumpfile.close()
+        writer = CSVTapeWriter(fname, fmode, background = False)
+        try:
+            self.tape.dump(writer)
+        finally:
+            writer.close()
         if tmode == 'wipe':
-            self.tape = []
+            self.tape.clear()
+            self.version += 1
+
+    # Stream the tape to a TapeWriter (CSVTapeWriter or BinaryTapeWriter) as records are added
+    def stream_tape(self, writer):
+        self.tape.add_writer(writer)
+
+
+
+# Exchange hosting several instruments, each with its own Exchange (order book and tape)
+# Orders are routed to the exchange of their symbol. The public snapshots of the instruments are published
+# by publish(), which only rebuilds and returns those of the instruments that changed since the previous call.
+class MultiExchange:
+
+    # symbols: the instruments listed from the start; more can be listed with add_symbol()
+    def __init__(self, symbols = (), min_price = 1, max_price = 1000, book_class = OrderBookHalf, tape_window = 65536):
+        self.min_price = min_price
+        self.max_price = max_price
+        self.book_class = book_class
+        self.tape_window = tape_window
+        self.exchanges = {}
+        # last published snapshot of each instrument
+        self.public_lobs = {}
+        # instruments changed since the last publication
+        self.changed = set()
+        for symbol in symbols:
+            self.add_symbol(symbol)
+
+    # List an instrument, with its own price range if given
+    def add_symbol(self, symbol, min_price = None, max_price = None):
+        if symbol in self.exchanges:
+            raise RuntimeError('Error when adding symbol to exchange: %s is already listed' % symbol)
+        self.exchanges[symbol] = Exchange(self.min_price if min_price == None else min_price,
+                                          self.max_price if max_price == None else max_price,
+                                          self.book_class, self.tape_window)
+        self.changed.add(symbol)
+        return self.exchanges[symbol]
+
+    # Exchange an order is routed to
+    def route(self, order):
+        exchange = self.exchanges.get(order.symbol)
+        if exchange == None:
+            raise RuntimeError('Error when routing order: unknown symbol %s' % order.symbol)
+        return exchange
+
+    def add_order(self, order, time = None):
+        qid = self.route(order).add_order(order, time)
+        self.changed.add(order.symbol)
+        return qid
+
+    def del_order(self, order, time):
+        self.route(order).del_order(order, time)
+        self.changed.add(order.symbol)
+
+    # Process an order on the exchange of its symbol; returns its fills, see Exchange.process_order
+    def process_order(self, order, time):
+        fills = self.route(order).process_order(order, time)
+        self.changed.add(order.symbol)
+        return fills
+
+    # Process the orders of a timestep, on the exchanges of their symbols, see Exchange.process_orders
+    # In 'call' mode every instrument with orders in the batch is cleared by its own auction
+    def process_orders(self, batch, time, mode = 'continuous'):
+        if mode == 'continuous':
+            fills = []
+            for order in batch:
+                fills.extend(self.process_order(order, time))
+            return fills
+        elif mode == 'call':
+            symbols = []
+            for order in batch:
+                self.add_order(order, time)
+                if order.symbol not in symbols:
+                    symbols.append(order.symbol)
+            fills = []
+            for symbol in symbols:
+                fills.extend(self.exchanges[symbol].clear(time))
+            return fills
+        raise RuntimeError('Error when processing orders: unknown mode %s' % mode)
+
+    # Cancel by quote i.d. on the exchange of an instrument, see Exchange.cancel
+    def cancel(self, symbol, qid, time):
+        record = self.exchanges[symbol].cancel(qid, time)
+        self.changed.add(symbol)
+        return record
+
+    def cancel_replace(self, symbol, qid, price, time, qty = None):
+        fills = self.exchanges[symbol].cancel_replace(qid, price, time, qty)
+        self.changed.add(symbol)
+        return fills
+
+    # Publish the snapshots of the instruments changed since the last call
+    # Returns them by symbol; the latest snapshot of every instrument stays available in self.public_lobs
+    def publish(self, time):
+        updates = {}
+        for symbol in self.changed:
+            public_data = self.exchanges[symbol].get_public_lob(time)
+            self.public_lobs[symbol] = public_data
+            updates[symbol] = public_data
+        self.changed = set()
+        return updates
 
+    # The public LOB data of one instrument, see Exchange.get_public_lob
+    def get_public_lob(self, symbol, time):
+        return self.exchanges[symbol].get_public_lob(time)
 
 
 # TODO: replace this with unit tests
@@ -1,14 +1,15 @@
 import random
-from Order import OType, Order
+from Order import OType
 from Trader import Trader
 
 class Giveaway(Trader):
 
+    __slots__ = ()
+
     def action(self, player_action, time):
         # If the trader has no pending trade orders, do nothing
         if self.order == None:
             return None
         # Return an order with the given sale price
         price = self.order.price
-        order = Order(self.tid, self.order.otype, price, self.order.qty, time)
-        return order
+        return self.make_quote(price, time)
@@ -0,0 +1,137 @@
+import copy
+import math
+from Order import OType
+
+# MarketMetrics scores the market as it runs, for an Environment created with market_metrics = MarketMetrics()
+# Every statistic is kept as running sums, updated with O(1) work per order assigned and per trade,
+# so the numbers can be read at any step without the tape or the final balances:
+#   smiths_alpha           100 * RMS deviation of trade prices from the equilibrium price, over the equilibrium price
+#   allocative_efficiency  surplus extracted by the traders over the surplus of the orders assigned to them,
+#                          each valued at the equilibrium price (the surplus a competitive equilibrium would yield)
+#   profit_dispersion      RMS deviation of the traders' profits from their equilibrium profits
+#   surplus_by_strategy    profit of all the traders of each strategy
+# The equilibrium price comes from the environment's MarketSchedule, or is given here for markets without one;
+# without an equilibrium price only the volumes, prices and profits are measured.
+
+class MarketMetrics:
+
+    def __init__(self, equilibrium_price = None):
+        self.default_equilibrium_price = equilibrium_price
+        self.reset()
+
+    # Forget every measurement
+    def reset(self):
+        self.equilibrium_price = self.default_equilibrium_price
+        self.trades = 0
+        self.volume = 0
+        self.price_sum = 0
+        # Sums over units traded of (price - equilibrium price)^2 and of the equilibrium price
+        self.deviation_sq_sum = 0.0
+        self.equilibrium_price_sum = 0.0
+        self.equilibrium_volume = 0
+        # Profit and equilibrium profit of each trader, and the sum of the squared differences
+        self.profits = {}
+        self.equilibrium_profits = {}
+        self.strategies = {}
+        self.dispersion_sq_sum = 0.0
+        self.surplus = 0
+        self.equilibrium_surplus = 0.0
+        self.surplus_by_strategy = {}
+
+    # Copy of every measurement (plain numbers and dictionaries), to go back to with load_state,
+    # see Environment.snapshot()/restore()
+    def state(self):
+        return copy.deepcopy(self.__dict__)
+
+    def load_state(self, state):
+        self.__dict__.update(copy.deepcopy(state))
+
+    # Equilibrium price of the current period (None if unknown), see MarketSchedule.equilibrium
+    def set_equilibrium(self, price):
+        self.equilibrium_price = price
+
+    def _add_trader(self, trader):
+        self.profits[trader.tid] = 0
+        self.equilibrium_profits[trader.tid] = 0.0
+        self.strategies[trader.tid] = trader.ttype.value
+        self.surplus_by_strategy.setdefault(trader.ttype.value, 0)
+
+    # Move a trader's profit or equilibrium profit, keeping the sum of squared differences up to date
+    def _move(self, tid, profit_change, equilibrium_change):
+        old = self.profits[tid] - self.equilibrium_profits[tid]
+        self.profits[tid] += profit_change
+        self.equilibrium_profits[tid] += equilibrium_change
+        new = self.profits[tid] - self.equilibrium_profits[tid]
+        self.dispersion_sq_sum += new * new - old * old
+
+    # A trader has been given an order: it adds the order's profit at the equilibrium price to the reference
+    def assign(self, trader, order):
+        if trader.tid not in self.profits:
+            self._add_trader(trader)
+        p0 = self.equilibrium_price
+        if p0 == None:
+            return
+        if order.otype == OType.BID:
+            profit = max(order.price - p0, 0) * order.qty
+        else:
+            profit = max(p0 - order.price, 0) * order.qty
+        self.equilibrium_surplus += profit
+        self._move(trader.tid, 0, profit)
+
+    # A trade between two traders, called before they are notified (their orders still hold their limit prices)
+    def trade(self, record, trader1, trader2):
+        price = record['price']
+        qty = record['qty']
+        self.trades += 1
+        self.volume += qty
+        self.price_sum += price * qty
+        p0 = self.equilibrium_price
+        if p0 != None:
+            self.deviation_sq_sum += (price - p0) ** 2 * qty
+            self.equilibrium_price_sum += p0 * qty
+            self.equilibrium_volume += qty
+        for trader in (trader1, trader2):
+            order = trader.order
+            if order == None:
+                continue
+            if trader.tid not in self.profits:
+                self._add_trader(trader)
+            # Units traded beyond the order carry no profit, as in Trader.notify_transaction
+            filled = min(qty, order.qty)
+            if order.otype == OType.BID:
+                profit = (order.price - price) * filled
+            else:
+                profit = (price - order.price) * filled
+            self.surplus += profit
+            self.surplus_by_strategy[self.strategies[trader.tid]] += profit
+            self._move(trader.tid, profit, 0)
+
+    def smiths_alpha(self):
+        if self.equilibrium_volume == 0:
+            return None
+        p0 = self.equilibrium_price_sum / self.equilibrium_volume
+        return 100 * math.sqrt(self.deviation_sq_sum / self.equilibrium_volume) / p0
+
+    def allocative_efficiency(self):
+        if self.equilibrium_surplus == 0:
+            return None
+        return self.surplus / self.equilibrium_surplus
+
+    def profit_dispersion(self):
+        if len(self.profits) == 0:
+            return None
+        return math.sqrt(max(self.dispersion_sq_sum, 0.0) / len(self.profits))
+
+    # Every statistic, as measured so far
+    def report(self):
+        return {
+            'trades': self.trades,
+            'volume': self.volume,
+            'mean_price': self.price_sum / self.volume if self.volume > 0 else None,
+            'smiths_alpha': self.smiths_alpha(),
+            'allocative_efficiency': self.allocative_efficiency(),
+            'profit_dispersion': self.profit_dispersion(),
+            'surplus': self.surplus,
+            'equilibrium_surplus': self.equilibrium_surplus,
+            'surplus_by_strategy': dict(self.surplus_by_strategy)
+        }
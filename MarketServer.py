@@ -0,0 +1,266 @@
+import asyncio
+import json
+from BristolStockGym import Environment
+from Exchange import book_delta
+from Order import OType, Order
+
+# Runs one market for several external agents, each connected over a local socket (a Unix socket if path is
+# given, TCP on host:port otherwise). Every agent is one of the environment's players ('PLAYER', 'PLAYER1', ...),
+# so the agents compete in the same market, against each other and the environment's traders.
+# Messages are JSON objects, one per line. At every tick the server sends each agent a 'tick' message:
+#   time     the timestep the agent acts at
+#   bids     price levels of the bid book that changed since the last tick, as [price, qty] (qty 0: level gone)
+#   asks     the same for the ask book (the first tick carries the whole book)
+#   tape     records added to the tape since the last tick
+#   trader   the agent's order ({ 'otype', 'price', 'qty' } or None) and balance
+#   reward   as the reward of Environment.step: the agent's balance if it traded since the last tick, 0 otherwise
+#   done     True on the last message of the session
+# and waits, at most tick_timeout seconds, for every agent to answer { 'time': t, 'order': None or
+# { 'otype': 'BID' or 'ASK', 'price': p, 'qty': q } } (otype defaults to the side of the agent's order, qty to 1).
+# The actions received in time are applied together, in one step of the environment; an agent that answers
+# late, or not at all, places no order at that tick, and its late answer is dropped.
+
+class MarketServer:
+
+    def __init__(self, n_agents, tick_timeout = 0.1, path = None, host = '127.0.0.1', port = 0, **env_kwargs):
+        if n_agents < 1:
+            raise RuntimeError('Error when creating MarketServer: at least one agent is needed')
+        self.tick_timeout = tick_timeout
+        self.path = path
+        self.host = host
+        self.port = port
+        self.environment = Environment(players = n_agents, **env_kwargs)
+        self.server = None
+        # Connection of each agent by trader id, and the trader ids not taken yet
+        self.writers = {}
+        self.free_tids = list(self.environment.player_keys)
+        self.all_connected = asyncio.Event()
+        # Actions received for the current tick, and the event set once every connected agent has answered
+        self.time = None
+        self.actions = {}
+        self.all_answered = asyncio.Event()
+        # Ticks each agent missed the deadline of
+        self.missed = { tid: 0 for tid in self.environment.player_keys }
+
+    # Start listening; returns the address agents connect to (the socket path, or (host, port))
+    async def start(self):
+        if self.path != None:
+            self.server = await asyncio.start_unix_server(self._handle, path = self.path)
+            return self.path
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return (self.host, self.port)
+
+    async def _handle(self, reader, writer):
+        if len(self.free_tids) == 0:
+            writer.write(b'{"type": "error", "message": "market full"}\n')
+            await writer.drain()
+            writer.close()
+            return
+        tid = self.free_tids.pop(0)
+        self.writers[tid] = writer
+        if len(self.free_tids) == 0:
+            self.all_connected.set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self._receive(tid, line)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            None
+        finally:
+            # A disconnected agent no longer holds up the ticks
+            self.writers.pop(tid, None)
+            self._check_answered()
+            writer.close()
+
+    # Record an agent's action for the current tick; anything else (late, repeated or malformed) is dropped
+    def _receive(self, tid, line):
+        try:
+            message = json.loads(line)
+            if message.get('time') != self.time or tid in self.actions:
+                return
+            self.actions[tid] = self._order(tid, message.get('order'))
+        except (ValueError, TypeError, KeyError, AttributeError):
+            self._send(tid, { 'type': 'error', 'message': 'malformed action at time %s' % self.time })
+            return
+        self._check_answered()
+
+    # Player order of an action, validated against the exchange rules
+    def _order(self, tid, action):
+        if action == None:
+            return None
+        trader = self.environment.traders[tid]
+        if 'otype' in action:
+            otype = OType[action['otype']]
+        elif trader.order != None:
+            otype = trader.order.otype
+        else:
+            raise ValueError('no side')
+        price = action['price']
+        qty = action.get('qty', 1)
+        if type(price) != int or type(qty) != int or qty < 1:
+            raise ValueError('bad price or quantity')
+        if price < self.environment.minprice or price > self.environment.maxprice:
+            raise ValueError('price out of range')
+        return Order(tid, otype, price, qty, self.time)
+
+    def _check_answered(self):
+        if all(tid in self.actions for tid in self.writers):
+            self.all_answered.set()
+
+    def _send(self, tid, message):
+        writer = self.writers.get(tid)
+        if writer != None:
+            writer.write(json.dumps(message).encode() + b'\n')
+
+    # Run a session once every agent has connected; returns the final balance of every trader
+    async def run(self):
+        if self.server == None:
+            await self.start()
+        await self.all_connected.wait()
+        environment = self.environment
+        environment.reset()
+        books = ({}, {})
+        tape_length = 0
+        done = False
+        while True:
+            # Snapshot delta since the last tick, serialised once and shared by all the agents
+            lob = environment.exchange.get_public_lob(environment.time)
+            delta = { 'type': 'tick', 'time': environment.time, 'done': done }
+            for side, levels, book in (('bids', lob['bids'], books[0]), ('asks', lob['asks'], books[1])):
+                delta[side] = book_delta(book, levels)
+            tape = environment.exchange.tape
+            delta['tape'] = tape[max(tape_length, tape.first_retained()):]
+            tape_length = len(tape)
+            common = json.dumps(delta)[:-1]
+            # Agents that traded since the last tick
+            traded = set()
+            for record in delta['tape']:
+                if record['type'] == 'Trade':
+                    traded.add(record['party1'])
+                    traded.add(record['party2'])
+
+            self.time = environment.time
+            self.actions = {}
+            self.all_answered.clear()
+            for tid, writer in list(self.writers.items()):
+                trader = environment.traders[tid]
+                order = trader.order
+                state = { 'tid': tid, 'balance': trader.balance, 'order': None if order == None else
+                          { 'otype': order.otype.name, 'price': order.price, 'qty': order.qty } }
+                reward = trader.balance if tid in traded else 0
+                writer.write(('%s, "trader": %s, "reward": %s}\n' % (common, json.dumps(state), reward)).encode())
+            await asyncio.gather(*[writer.drain() for writer in list(self.writers.values())], return_exceptions = True)
+            if done:
+                break
+
+            # Gather the actions until every agent has answered or the deadline has passed
+            self._check_answered()
+            try:
+                await asyncio.wait_for(self.all_answered.wait(), self.tick_timeout)
+            except asyncio.TimeoutError:
+                for tid in self.writers:
+                    if tid not in self.actions:
+                        self.missed[tid] += 1
+            actions = self.actions
+            self.time = None
+            if environment.players > 1:
+                observation, reward, done, info = environment.step(actions)
+            else:
+                observation, reward, done, info = environment.step(actions.get('PLAYER'))
+
+        return { tid: trader.balance for tid, trader in environment.traders.items() }
+
+    async def close(self):
+        for writer in list(self.writers.values()):
+            writer.close()
+        if self.server != None:
+            self.server.close()
+            await self.server.wait_closed()
+
+
+# An agent's end of the connection: it keeps the public book up to date from the deltas it receives
+class MarketClient:
+
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self.bids = {}
+        self.asks = {}
+        self.tid = None
+
+    async def connect(self, path = None, host = '127.0.0.1', port = None):
+        if path != None:
+            self.reader, self.writer = await asyncio.open_unix_connection(path)
+        else:
+            self.reader, self.writer = await asyncio.open_connection(host, port)
+
+    # Next message from the server, None once the connection is closed
+    async def receive(self):
+        line = await self.reader.readline()
+        if not line:
+            return None
+        message = json.loads(line)
+        if message.get('type') == 'tick':
+            self.tid = message['trader']['tid']
+            for book, levels in ((self.bids, message['bids']), (self.asks, message['asks'])):
+                for price, qty in levels:
+                    if qty == 0:
+                        book.pop(price, None)
+                    else:
+                        book[price] = qty
+        return message
+
+    def best_bid(self):
+        return max(self.bids) if self.bids else None
+
+    def best_ask(self):
+        return min(self.asks) if self.asks else None
+
+    # Answer a tick: an order at price (None for no order), on the side of the agent's order unless otype is given
+    async def act(self, time, price = None, qty = 1, otype = None):
+        order = None
+        if price != None:
+            order = { 'price': price, 'qty': qty }
+            if otype != None:
+                order['otype'] = otype.name
+        self.writer.write(json.dumps({ 'time': time, 'order': order }).encode() + b'\n')
+        await self.writer.drain()
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+# Example: three ZIC-like agents in the same market
+if __name__ == "__main__":
+    import random
+
+    async def agent(address):
+        client = MarketClient()
+        await client.connect(host = address[0], port = address[1])
+        while True:
+            message = await client.receive()
+            if message == None or message['done']:
+                break
+            order = message['trader']['order']
+            if order == None:
+                await client.act(message['time'])
+            elif order['otype'] == 'BID':
+                await client.act(message['time'], random.randint(1, order['price']))
+            else:
+                await client.act(message['time'], random.randint(order['price'], 100))
+        await client.close()
+        return client.tid, message['trader']['balance']
+
+    async def main():
+        server = MarketServer(3, tick_timeout = 0.05, max_time = 100, min_price = 1, max_price = 100, replenish_orders = True)
+        address = await server.start()
+        results = await asyncio.gather(server.run(), *[agent(address) for i in range(3)])
+        await server.close()
+        print('agent balances:', results[1:])
+        print('missed deadlines:', server.missed)
+
+    asyncio.run(main())
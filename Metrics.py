@@ -0,0 +1,107 @@
+import json
+import time
+from collections import deque
+
+# StepMetrics collects where Environment.step spends its time, for an Environment created with metrics = StepMetrics()
+# Phases of a step:
+#   shuffle      shuffling the traders
+#   update       traders (or their populations) reacting to the public LOB
+#   action       traders choosing their orders, including batched quoting
+#   match        Exchange.process_order, or process_orders for a call auction
+#   notify       notifying the parties of each trade
+#   replenish    assigning new orders
+#   observation  building the observation and the end-of-session info
+# It also counts orders, trades and cancellations, in total and for each of the last `history` steps.
+# Without metrics the environment skips all of this, so it can be left in place for production runs.
+
+class StepMetrics:
+
+    PHASES = ('shuffle', 'update', 'action', 'match', 'notify', 'replenish', 'observation')
+
+    def __init__(self, history = 1000):
+        self.clock = time.perf_counter
+        self.history_length = history
+        self.reset()
+
+    # Forget every measurement
+    def reset(self):
+        self.steps = 0
+        self.phase_time = { phase: 0.0 for phase in self.PHASES }
+        # Time spent in update()/action() by each strategy, indexed by TType value
+        self.update_time = {}
+        self.action_time = {}
+        self.match_calls = 0
+        self.match_time_max = 0.0
+        self.orders = 0
+        self.trades = 0
+        self.cancels = 0
+        self.history = deque(maxlen = self.history_length)
+        self._step = None
+
+    def begin_step(self, time_step, tape_length):
+        self._step = { 'time': time_step, 'orders': 0, 'trades': 0, 'tape_start': tape_length,
+                       'phase_time': { phase: 0.0 for phase in self.PHASES } }
+
+    # Add elapsed seconds to a phase of the current step
+    def add_phase(self, phase, seconds):
+        self._step['phase_time'][phase] += seconds
+
+    def add_update(self, trader_type, seconds):
+        self.update_time[trader_type.value] = self.update_time.get(trader_type.value, 0.0) + seconds
+
+    def add_action(self, trader_type, seconds):
+        self.action_time[trader_type.value] = self.action_time.get(trader_type.value, 0.0) + seconds
+
+    # One call to Exchange.process_order (or process_orders, with the number of orders in the batch),
+    # and the number of trades it produced
+    def add_match(self, seconds, trades, orders = 1):
+        self.match_calls += 1
+        if seconds > self.match_time_max:
+            self.match_time_max = seconds
+        self._step['phase_time']['match'] += seconds
+        self._step['orders'] += orders
+        self._step['trades'] += trades
+
+    def end_step(self, tape_length):
+        step = self._step
+        self._step = None
+        # Records added to the tape that are not trades are cancellations
+        step['cancels'] = tape_length - step.pop('tape_start') - step['trades']
+        self.steps += 1
+        for phase, seconds in step['phase_time'].items():
+            self.phase_time[phase] += seconds
+        self.orders += step['orders']
+        self.trades += step['trades']
+        self.cancels += step['cancels']
+        self.history.append(step)
+
+    # Summary of everything measured so far
+    def report(self):
+        steps = max(self.steps, 1)
+        total = sum(self.phase_time.values())
+        return {
+            'steps': self.steps,
+            'total_time': total,
+            'step_time_mean': total / steps,
+            'phase_time': dict(self.phase_time),
+            'phase_share': { phase: seconds / total if total > 0 else 0.0 for phase, seconds in self.phase_time.items() },
+            'update_time_by_strategy': dict(self.update_time),
+            'action_time_by_strategy': dict(self.action_time),
+            'match_calls': self.match_calls,
+            'match_time_mean': self.phase_time['match'] / max(self.match_calls, 1),
+            'match_time_max': self.match_time_max,
+            'orders': self.orders,
+            'trades': self.trades,
+            'cancels': self.cancels,
+            'orders_per_step': self.orders / steps,
+            'trades_per_step': self.trades / steps,
+            'cancels_per_step': self.cancels / steps
+        }
+
+    # Write the report, and the per-step history if asked, to a JSON file
+    def export(self, fname, include_history = False):
+        report = self.report()
+        if include_history:
+            report['history'] = list(self.history)
+        with open(fname, 'w') as report_file:
+            json.dump(report, report_file, indent = 2)
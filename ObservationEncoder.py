@@ -0,0 +1,72 @@
+import numpy as np
+from Order import OType
+from Tape import RECENT_TRADES
+
+# ObservationEncoder writes the player's observation into a preallocated, fixed-shape NumPy buffer:
+#   [time, side (1 bid, -1 ask, 0 no order), limit price, order qty, balance,
+#    top `depth` bid prices, their quantities, top `depth` ask prices, their quantities,
+#    last `trades` trade prices, most recent first]
+# Missing values (shallow book, few trades, no order) are 0. The same buffer is rewritten at every step,
+# and the named fields (bid_prices, ask_qtys, ...) are views into it, so encoding allocates nothing
+# and the size of an observation does not depend on the length of the session.
+
+class ObservationEncoder:
+
+    HEADER = ('time', 'side', 'limit', 'qty', 'balance')
+
+    # out, if given, is the float64 array to write into (e.g. a row of a batch of observations)
+    def __init__(self, depth = 5, trades = 10, out = None):
+        if trades > RECENT_TRADES:
+            raise RuntimeError('Error when creating ObservationEncoder: at most %d trades can be encoded' % RECENT_TRADES)
+        self.depth = depth
+        self.trades = trades
+        self.size = len(self.HEADER) + 4 * depth + trades
+        if out is None:
+            out = np.zeros(self.size, dtype = np.float64)
+        elif out.shape != (self.size,) or out.dtype != np.float64:
+            raise RuntimeError('Error when creating ObservationEncoder: output buffer must be float64 of shape (%d,)' % self.size)
+        self.buffer = out
+        start = len(self.HEADER)
+        self.header = out[:start]
+        self.bid_prices = out[start:start + depth]
+        self.bid_qtys = out[start + depth:start + 2 * depth]
+        self.ask_prices = out[start + 2 * depth:start + 3 * depth]
+        self.ask_qtys = out[start + 3 * depth:start + 4 * depth]
+        self.trade_prices = out[start + 4 * depth:]
+
+    # Write the top of one side of the book into the price and quantity views
+    def _encode_side(self, lob_anon, prices, qtys):
+        n = min(len(lob_anon), self.depth)
+        for i in range(n):
+            prices[i] = lob_anon[i][0]
+            qtys[i] = lob_anon[i][1]
+        prices[n:] = 0
+        qtys[n:] = 0
+
+    # Encode the observation straight from the exchange, the player trader and the time; returns the buffer
+    def encode(self, exchange, trader, time):
+        header = self.header
+        header[0] = time
+        order = trader.order
+        if order == None:
+            header[1:4] = 0
+        else:
+            header[1] = 1 if order.otype == OType.BID else -1
+            header[2] = order.price
+            header[3] = order.qty
+        header[4] = trader.balance
+        self._encode_side(exchange.bids.lob_anon, self.bid_prices, self.bid_qtys)
+        self._encode_side(exchange.asks.lob_anon, self.ask_prices, self.ask_qtys)
+
+        # Most recent trade prices, at the positions of the last trades remembered by the tape
+        tape = exchange.tape
+        first = tape.first_retained()
+        found = 0
+        trade_prices = self.trade_prices
+        for i in reversed(tape.recent_trades):
+            if found == self.trades or i < first:
+                break
+            trade_prices[found] = tape.row(i)[2]
+            found += 1
+        trade_prices[found:] = 0
+        return self.buffer
@@ -1,21 +1,31 @@
-from enum import Enum
+from enum import IntEnum
 
 # An order can either be a BID or an ASK
-class OType(Enum):
-    BID = 'BID'
-    ASK = 'ASK'
+# Sides are integer codes, so that they compare as ints and can index or fill NumPy arrays directly
+class OType(IntEnum):
+    BID = 0
+    ASK = 1
 
-# an Order/quote has a trader id, a type (buy/sell) price, quantity, timestamp, and unique i.d.
+# an Order/quote has a trader id, a type (buy/sell) price, quantity, timestamp, and unique i.d.,
+# and the symbol of its instrument when traded on a MultiExchange
+# Orders are slotted: they carry no per-instance __dict__
 class Order:
 
-        def __init__(self, tid, otype, price, qty, time, qid = 0):
+        __slots__ = ('tid', 'otype', 'price', 'qty', 'time', 'qid', 'symbol')
+
+        def __init__(self, tid, otype, price, qty, time, qid = 0, symbol = None):
                 self.tid = tid      # trader i.d.
                 self.otype = otype  # order type
                 self.price = price  # price
                 self.qty = qty      # quantity
                 self.time = time    # timestamp
                 self.qid = qid      # quote i.d. (unique to each quote)
+                self.symbol = symbol  # instrument, None on a single-instrument Exchange
+
+        def copy(self):
+                return Order(self.tid, self.otype, self.price, self.qty, self.time, self.qid, self.symbol)
 
         def __str__(self):
-                return '[%s %s P=%03d Q=%s T=%5.2f QID:%d]' % \
-                       (self.tid, self.otype, self.price, self.qty, self.time, self.qid)
+                symbol = '' if self.symbol == None else ' %s' % self.symbol
+                return '[%s%s %s P=%03d Q=%s T=%5.2f QID:%d]' % \
+                       (self.tid, symbol, OType(self.otype).name, self.price, self.qty, self.time, self.qid)
@@ -1,3 +1,5 @@
+import bisect
+import copy
 from Order import OType, Order
 
 # OrderBookHalf is one side of the book: a list of bids or a list of asks, each sorted best-first
@@ -13,6 +15,13 @@ class OrderBookHalf:
         self.lob = {}
         # anonymized LOB, lists, with only price/qty info
         self.lob_anon = []
+        # prices with resting orders, sorted ascending
+        self.prices = []
+        # (price, sequence number) of each resting order, indexed by Trader ID
+        self.locations = {}
+        # sequence numbers of the orders queued at each price, in the same order as self.lob[price][1]
+        self.level_seqs = {}
+        self.seq = 0
         # LOB rules
         self.minprice = minprice
         self.maxprice = maxprice
@@ -33,52 +42,115 @@ class OrderBookHalf:
         # Validate order
         order = validate_order_price(self, order)
 
-        # Add order to self.orders, keeping track of order numbers
-        initial_n_orders = len(self.orders)
-        self.orders[order.tid] = order
-        new_n_orders = len(self.orders)
+        # An overwrite keeps the place in the queue of the order it replaces, a new order goes last
+        location = self.locations.get(order.tid)
+        if location == None:
+            seq = self.seq
+            self.seq += 1
+            result = 'Addition'
+        else:
+            seq = location[1]
+            self._remove_entry(order.tid, location)
+            result = 'Overwrite'
 
-        # Rebuild LOB
-        self.build_lob()
+        # Add order to self.orders and to its price level
+        self.orders[order.tid] = order
+        self._insert_entry(order, seq)
 
         # As a return, indicate if it has been an addition or an overwrite
-        if initial_n_orders != new_n_orders:
-            return('Addition')
+        return result
+
+
+    # Position in lob_anon (sorted best-first) of the level at position i in self.prices (sorted ascending)
+    def _anon_index(self, i):
+        if self.booktype == OType.BID:
+            return len(self.prices) - 1 - i
+        return i
+
+
+    # Insert an order in its price level, behind the orders with a lower sequence number
+    def _insert_entry(self, order, seq):
+        price = order.price
+        entry = (order.time, order.qty, order.tid, order.qid)
+        level = self.lob.get(price)
+        if level == None:
+            # create a new price level
+            self.lob[price] = [order.qty, [entry]]
+            self.level_seqs[price] = [seq]
+            i = bisect.bisect_left(self.prices, price)
+            self.prices.insert(i, price)
+            self.lob_anon.insert(self._anon_index(i), [price, order.qty])
+        else:
+            # update existing price level
+            seqs = self.level_seqs[price]
+            j = bisect.bisect(seqs, seq)
+            seqs.insert(j, seq)
+            level[1].insert(j, entry)
+            level[0] += order.qty
+            i = bisect.bisect_left(self.prices, price)
+            self.lob_anon[self._anon_index(i)][1] = level[0]
+        self.locations[order.tid] = (price, seq)
+
+
+    # Remove the entry of a trader from its price level, dropping the level if it becomes empty
+    def _remove_entry(self, tid, location):
+        price, seq = location
+        level = self.lob[price]
+        seqs = self.level_seqs[price]
+        j = bisect.bisect_left(seqs, seq)
+        del seqs[j]
+        entry = level[1].pop(j)
+        level[0] -= entry[1]
+        i = bisect.bisect_left(self.prices, price)
+        if len(seqs) == 0:
+            del self.lob_anon[self._anon_index(i)]
+            del self.prices[i]
+            del self.lob[price]
+            del self.level_seqs[price]
         else:
-            return('Overwrite')
+            self.lob_anon[self._anon_index(i)][1] = level[0]
+        del self.locations[tid]
 
 
     # Anonymize a lob, strip out order details, format as a sorted list
     def anonymize_lob(self):
         self.lob_anon = []
         if self.booktype == OType.BID:
-            for price in sorted(self.lob, reverse = True):
+            for price in reversed(self.prices):
                     qty = self.lob[price][0]
                     self.lob_anon.append([price, qty])
         elif self.booktype == OType.ASK:
-            for price in sorted(self.lob):
+            for price in self.prices:
                     qty = self.lob[price][0]
                     self.lob_anon.append([price, qty])
         else:
             raise RuntimeError('Error when anonymizing LOB: wrong booktype')
 
 
-    # Take a list of orders and build a limit-order-book (LOB) from it
+    # Rebuild the limit-order-book (LOB) and its price index from scratch out of the list of orders
+    # Orders and price levels are otherwise maintained incrementally by add_order/del_order
     def build_lob(self):
-        # Sets the LOB as a dictionary (i.e., unsorted)
         self.lob = {}
+        self.prices = []
+        self.locations = {}
+        self.level_seqs = {}
+        self.seq = 0
         for tid in self.orders:
-            order = self.orders.get(tid)
+            order = self.orders[tid]
             price = order.price
+            entry = (order.time, order.qty, order.tid, order.qid)
             if price in self.lob:
                 # update existing entry
-                qty = self.lob[price][0]
-                orderlist = self.lob[price][1]
-                orderlist.append([order.time, order.qty, order.tid, order.qid])
-                self.lob[price] = [qty + order.qty, orderlist]
+                self.lob[price][0] += order.qty
+                self.lob[price][1].append(entry)
+                self.level_seqs[price].append(self.seq)
             else:
                 # create a new dictionary entry
-                self.lob[price] = [order.qty, [[order.time, order.qty, order.tid, order.qid]]]
+                self.lob[price] = [order.qty, [entry]]
+                self.level_seqs[price] = [self.seq]
+            self.locations[tid] = (price, self.seq)
+            self.seq += 1
+        self.prices = sorted(self.lob)
 
         # Builds anonymized version (just price/quantity, sorted, as a list) for publishing to traders
         self.anonymize_lob()
@@ -99,19 +171,51 @@ class OrderBookHalf:
 
         if self.orders.get(order.tid) != None :
             del(self.orders[order.tid])
-            self.build_lob()
+            self._remove_entry(order.tid, self.locations[order.tid])
+
+    # Take qty units off the resting order of a trader, keeping its place in the queue
+    # The order is deleted once nothing is left of it, with its quantity set to 0 so that its sender
+    # knows it no longer rests; returns the quantity still resting
+    def reduce_order(self, tid, qty):
+        order = self.orders[tid]
+        if qty >= order.qty:
+            self.del_order(order)
+            order.qty = 0
+            return 0
+        price, seq = self.locations[tid]
+        level = self.lob[price]
+        j = bisect.bisect_left(self.level_seqs[price], seq)
+        entry = level[1][j]
+        level[1][j] = (entry[0], entry[1] - qty, tid, entry[3])
+        level[0] -= qty
+        order.qty -= qty
+        i = bisect.bisect_left(self.prices, price)
+        self.lob_anon[self._anon_index(i)][1] = level[0]
+        return order.qty
+
+    # Copy of the book for a forked exchange: the orders and the levels are copied, the queue entries are shared
+    def fork(self):
+        book = copy.copy(self)
+        book.orders = { tid: order.copy() for tid, order in self.orders.items() }
+        book.lob = { price: [level[0], list(level[1])] for price, level in self.lob.items() }
+        book.lob_anon = [list(level) for level in self.lob_anon]
+        book.prices = list(self.prices)
+        book.locations = dict(self.locations)
+        book.level_seqs = { price: list(seqs) for price, seqs in self.level_seqs.items() }
+        return book
 
     def get_best(self):
 
-        if len(self.lob) == 0:
+        if len(self.prices) == 0:
             return None, None
 
         if self.booktype == OType.BID:
-            best_price = max(self.lob.keys())
+            best_price = self.prices[-1]
         else:
-            best_price = min(self.lob.keys())
+            best_price = self.prices[0]
 
-        best_tid = self.lob[best_price][1][0][2] # TODO: This is confusing
+        # Trader ID of the first order in the queue at the best price
+        best_tid = self.lob[best_price][1][0][2]
 
         return best_price, best_tid
 
@@ -0,0 +1,234 @@
+import bisect
+import copy
+from Order import OType, Order
+
+# OrderBookLadder is one side of the book, like OrderBookHalf, but stored as a price ladder:
+# every integer price between minprice and maxprice has a preallocated slot holding its
+# quantity and its queue of orders, and the best price is tracked with a moving pointer
+
+class OrderBookLadder:
+
+    def __init__(self, booktype, minprice = 1, maxprice = 1000):
+        # booktype: bids or asks?
+        self.booktype = booktype
+        # dictionary of orders received, indexed by Trader ID
+        self.orders = {}
+        # LOB rules
+        self.minprice = minprice
+        self.maxprice = maxprice
+        # number of ticks on the ladder, tick i is price minprice + i
+        self.ticks = maxprice - minprice + 1
+        # quantity resting at each tick
+        self.depth = [0] * self.ticks
+        # [qty, orderlist] of each tick, orderlist holding (time, qty, tid, qid) in queue order
+        self.levels = [[0, []] for _ in range(self.ticks)]
+        # sequence numbers of the orders queued at each tick, in the same order as the orderlist
+        self.level_seqs = [[] for _ in range(self.ticks)]
+        # limit order book, dictionary indexed by price, sharing the non-empty levels of the ladder
+        self.lob = {}
+        # (price, sequence number) of each resting order, indexed by Trader ID
+        self.locations = {}
+        self.seq = 0
+        # tick of the best price, None if the book is empty
+        self.best = None
+        # prices of the non-empty ticks, sorted ascending
+        self.prices = []
+        # anonymized LOB, updated level by level as orders are added and removed
+        self.lob_anon = []
+
+
+    # Add order to the dictionary holding the list of orders
+    # Max one order per trader: if an existing one already exists, it is overwritten
+    def add_order(self, order):
+
+        # Validate order: clip its price to the min/max
+        if order.price < self.minprice:
+            order.price = self.minprice
+        elif order.price > self.maxprice:
+            order.price = self.maxprice
+
+        # An overwrite keeps the place in the queue of the order it replaces, a new order goes last
+        location = self.locations.get(order.tid)
+        if location == None:
+            seq = self.seq
+            self.seq += 1
+            result = 'Addition'
+        else:
+            seq = location[1]
+            self._remove_entry(order.tid, location)
+            result = 'Overwrite'
+
+        self.orders[order.tid] = order
+        self._insert_entry(order, seq)
+
+        # As a return, indicate if it has been an addition or an overwrite
+        return result
+
+
+    # Insert an order in the queue of its tick, behind the orders with a lower sequence number
+    def _insert_entry(self, order, seq):
+        price = order.price
+        tick = price - self.minprice
+        level = self.levels[tick]
+        seqs = self.level_seqs[tick]
+        j = bisect.bisect(seqs, seq)
+        seqs.insert(j, seq)
+        level[1].insert(j, (order.time, order.qty, order.tid, order.qid))
+        level[0] += order.qty
+        self.depth[tick] = level[0]
+        i = bisect.bisect_left(self.prices, price)
+        if len(seqs) == 1:
+            # the tick was empty: a new level
+            self.lob[price] = level
+            self.prices.insert(i, price)
+            self.lob_anon.insert(self._anon_index(i), [price, level[0]])
+        else:
+            self.lob_anon[self._anon_index(i)][1] = level[0]
+
+        # Move the best price pointer if the order improves on it
+        if self.best == None:
+            self.best = tick
+        elif self.booktype == OType.BID and tick > self.best:
+            self.best = tick
+        elif self.booktype == OType.ASK and tick < self.best:
+            self.best = tick
+
+        self.locations[order.tid] = (price, seq)
+
+
+    # Remove the entry of a trader from its tick, moving the best price pointer if the tick empties
+    def _remove_entry(self, tid, location):
+        price, seq = location
+        tick = price - self.minprice
+        level = self.levels[tick]
+        seqs = self.level_seqs[tick]
+        j = bisect.bisect_left(seqs, seq)
+        del seqs[j]
+        entry = level[1].pop(j)
+        level[0] -= entry[1]
+        self.depth[tick] = level[0]
+        del self.locations[tid]
+        i = bisect.bisect_left(self.prices, price)
+
+        if len(seqs) > 0:
+            self.lob_anon[self._anon_index(i)][1] = level[0]
+            return
+        del self.lob_anon[self._anon_index(i)]
+        del self.prices[i]
+        del self.lob[price]
+        if tick != self.best:
+            return
+        if len(self.lob) == 0:
+            self.best = None
+        elif self.booktype == OType.BID:
+            while self.depth[tick] == 0:
+                tick -= 1
+            self.best = tick
+        else:
+            while self.depth[tick] == 0:
+                tick += 1
+            self.best = tick
+
+
+    # Position in lob_anon (sorted best-first) of the level at position i in self.prices (sorted ascending)
+    def _anon_index(self, i):
+        if self.booktype == OType.BID:
+            return len(self.prices) - 1 - i
+        return i
+
+
+    # Anonymize the ladder from scratch: lists of [price, qty], sorted best-first
+    def anonymize_lob(self):
+        if self.booktype == OType.BID:
+            self.lob_anon = [[price, self.depth[price - self.minprice]] for price in reversed(self.prices)]
+        elif self.booktype == OType.ASK:
+            self.lob_anon = [[price, self.depth[price - self.minprice]] for price in self.prices]
+        else:
+            raise RuntimeError('Error when anonymizing LOB: wrong booktype')
+
+
+    # Quantity at each of the n ticks starting from the best price and moving away from it
+    def get_depth(self, n):
+        if self.best == None:
+            return []
+        if self.booktype == OType.BID:
+            start = self.best - n
+            return self.depth[self.best:start if start >= 0 else None:-1]
+        return self.depth[self.best:self.best + n]
+
+
+    # Rebuild the ladder from scratch out of the list of orders
+    def build_lob(self):
+        self.depth = [0] * self.ticks
+        self.levels = [[0, []] for _ in range(self.ticks)]
+        self.level_seqs = [[] for _ in range(self.ticks)]
+        self.lob = {}
+        self.locations = {}
+        self.seq = 0
+        self.best = None
+        self.prices = []
+        self.lob_anon = []
+        for tid in self.orders:
+            self._insert_entry(self.orders[tid], self.seq)
+            self.seq += 1
+
+
+    # Delete qty = 1 of the best order (e.g. if the best bid/ask has been hit)
+    # Return the Trader ID of the deleted order
+    def delete_best(self):
+        _best_price, best_tid = self.get_best()
+        order_to_delete = self.orders[best_tid]
+        self.del_order(order_to_delete)
+        return best_tid
+
+    # Delete order from the dictionary holding the orders
+    # assumes max of one order per trader per list
+    # checks that the Trader ID does actually exist in the dict before deletion
+    def del_order(self, order):
+
+        if self.orders.get(order.tid) != None :
+            del(self.orders[order.tid])
+            self._remove_entry(order.tid, self.locations[order.tid])
+
+    # Take qty units off the resting order of a trader, keeping its place in the queue
+    # The order is deleted once nothing is left of it, with its quantity set to 0 so that its sender
+    # knows it no longer rests; returns the quantity still resting
+    def reduce_order(self, tid, qty):
+        order = self.orders[tid]
+        if qty >= order.qty:
+            self.del_order(order)
+            order.qty = 0
+            return 0
+        price, seq = self.locations[tid]
+        tick = price - self.minprice
+        level = self.levels[tick]
+        j = bisect.bisect_left(self.level_seqs[tick], seq)
+        entry = level[1][j]
+        level[1][j] = (entry[0], entry[1] - qty, tid, entry[3])
+        level[0] -= qty
+        self.depth[tick] = level[0]
+        order.qty -= qty
+        self.lob_anon[self._anon_index(bisect.bisect_left(self.prices, price))][1] = level[0]
+        return order.qty
+
+    # Copy of the book for a forked exchange: the orders and the ladder are copied, the queue entries are shared
+    def fork(self):
+        book = copy.copy(self)
+        book.orders = { tid: order.copy() for tid, order in self.orders.items() }
+        book.depth = list(self.depth)
+        book.levels = [[level[0], list(level[1])] if level[1] else [0, []] for level in self.levels]
+        book.level_seqs = [list(seqs) for seqs in self.level_seqs]
+        book.lob = { price: book.levels[price - self.minprice] for price in self.lob }
+        book.locations = dict(self.locations)
+        book.prices = list(self.prices)
+        book.lob_anon = [list(level) for level in self.lob_anon]
+        return book
+
+    def get_best(self):
+
+        if self.best == None:
+            return None, None
+
+        # Trader ID of the first order in the queue at the best price
+        level = self.levels[self.best]
+        return self.minprice + self.best, level[1][0][2]
@@ -0,0 +1,108 @@
+import copy
+import random
+import numpy as np
+from Order import OType
+from Trader import TType
+
+# QuoteBatch quotes for a group of zero-intelligence traders of the same strategy (ZIC, ZIU or Giveaway)
+# at once: the limit price, side and activity of every trader are kept in arrays, and all the prices
+# of a timestep are drawn in one vectorized call instead of one trader.action() per trader.
+# Traders join a batch with add(); from then on Trader.assign_order/notify_transaction keep it in sync.
+
+class QuoteBatch:
+
+    STRATEGIES = (TType.ZIC, TType.ZIU, TType.GVWY)
+
+    # Per-trader state, with the dtype of each array
+    FIELDS = {
+        'limit': np.int64,
+        'is_bid': bool,
+        'active': bool,
+        'prices': np.int64  # prices quoted at the last call to quote()
+    }
+
+    def __init__(self, trader_type, min_price = 1, max_price = 1000, capacity = 64, rng = None):
+        if trader_type not in self.STRATEGIES:
+            raise RuntimeError('Error when creating QuoteBatch: %s traders cannot be batched' % trader_type)
+        self.ttype = trader_type
+        self.minprice = min_price
+        self.maxprice = max_price
+        # The generator is seeded from the random module, so that random.seed() makes runs reproducible
+        self.rng = rng if rng != None else np.random.default_rng(random.getrandbits(64))
+        self.traders = []
+        self.size = 0
+        self.capacity = capacity
+        for name, dtype in self.FIELDS.items():
+            setattr(self, name, np.zeros(capacity, dtype = dtype))
+
+    def _grow(self):
+        self.capacity *= 2
+        for name in self.FIELDS:
+            array = getattr(self, name)
+            grown = np.zeros(self.capacity, dtype = array.dtype)
+            grown[:self.size] = array[:self.size]
+            setattr(self, name, grown)
+
+    # Copy of the batch for a forked environment, attached to the forked traders (by trader id)
+    def fork(self, traders):
+        batch = copy.copy(self)
+        batch.rng = copy.deepcopy(self.rng)
+        for name in self.FIELDS:
+            setattr(batch, name, getattr(self, name).copy())
+        batch.traders = [traders[trader.tid] for trader in self.traders]
+        for trader in batch.traders:
+            trader.quote_batch = batch
+        return batch
+
+    # Add a trader to the batch, taking over its current order
+    def add(self, trader):
+        if trader.ttype != self.ttype:
+            raise RuntimeError('Error when adding trader to QuoteBatch: wrong trader type')
+        if self.size == self.capacity:
+            self._grow()
+        i = self.size
+        self.traders.append(trader)
+        self.size += 1
+        trader.quote_batch = self
+        trader.batch_index = i
+        if trader.order != None:
+            self.assign(i, trader.order)
+        return i
+
+    # Trader i has been assigned a new order
+    def assign(self, i, order):
+        self.limit[i] = order.price
+        self.is_bid[i] = order.otype == OType.BID
+        self.active[i] = True
+
+    # Trader i has no order any more
+    def deactivate(self, i):
+        self.active[i] = False
+
+    # Draw the prices of all the active traders for this timestep, as the strategies' action() do
+    # Returns the indices of the active traders and their prices
+    def quote(self, time):
+        active = np.flatnonzero(self.active[:self.size])
+        if len(active) == 0:
+            return active, self.prices[active]
+        limit = self.limit[active]
+        if self.ttype == TType.GVWY:
+            # Quote the limit price
+            prices = limit
+        elif self.ttype == TType.ZIU:
+            # Quote a random price
+            prices = self.rng.integers(self.minprice, self.maxprice, size = len(active), endpoint = True)
+        else:
+            # Quote a random price, never make a loss
+            is_bid = self.is_bid[active]
+            low = np.where(is_bid, self.minprice, limit)
+            high = np.where(is_bid, limit, self.maxprice)
+            prices = self.rng.integers(low, high, endpoint = True)
+        self.prices[active] = prices
+        return active, prices
+
+    # Order of trader i for this timestep, from the prices drawn by quote(); None if it has no order
+    def order(self, i, time):
+        if not self.active[i]:
+            return None
+        return self.traders[i].make_quote(int(self.prices[i]), time)
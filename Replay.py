@@ -0,0 +1,267 @@
+import mmap
+import os
+import random
+import struct
+from Exchange import book_delta
+from Order import OType, Order
+from Tape import RECORD_STRUCT, TapeView
+from TapeWriter import BinaryTapeWriter
+from Trader import TType, Trader
+
+# Recording of market sessions, to backtest a player against them without running the traders again
+# A recording named fname is made of:
+#   fname          the tape records, as written by BinaryTapeWriter (with the trader ids in fname + '.tids')
+#   fname.book     book events: a changed price level of one side, EVENT_STRUCT (side, price, qty), qty 0 if gone
+#   fname.index    one entry per frame (public LOB seen by the player at one timestep), INDEX_STRUCT:
+#                  (session, time, first book event of the frame, tape records written so far, keyframe)
+# The events of a frame are the levels changed since the previous frame, except every keyframe_interval frames
+# where the whole book is written: the keyframe of a frame is the index of the frame the book can be rebuilt
+# from, so that seeking to any timestep reads at most keyframe_interval frames of events.
+# All three files have fixed-size rows and are memory-mapped by ReplayEnvironment, never loaded whole.
+EVENT_STRUCT = struct.Struct('<bqq')
+INDEX_STRUCT = struct.Struct('<qqqqq')
+
+
+# Records the public LOB of an Environment created with book_recorder = BookRecorder(fname), at every step
+class BookRecorder:
+
+    def __init__(self, fname, keyframe_interval = 64):
+        self.fname = fname
+        self.keyframe_interval = keyframe_interval
+        self.tape_writer = BinaryTapeWriter(fname, 'w', background = False)
+        self.book_file = open(fname + '.book', 'wb')
+        self.index_file = open(fname + '.index', 'wb')
+        self.session = -1
+        self.events = 0
+        self.records = 0
+        self.frames = 0
+
+    # Start a new session, recording its first frame; the tape of a session is made of the records added after it started
+    def start(self, exchange, time):
+        self.session += 1
+        self.books = ({}, {})
+        self.tape_length = len(exchange.tape)
+        self.keyframe = None
+        self.record(exchange, time)
+
+    # Record the frame of a timestep: the tape records added and the levels changed since the last frame
+    def record(self, exchange, time):
+        tape = exchange.tape
+        if tape.first_retained() > self.tape_length:
+            raise RuntimeError('Error when recording book: tape records dropped before they were recorded')
+        if len(tape) > self.tape_length:
+            self.tape_writer.write_chunk([tape.row(i) for i in range(self.tape_length, len(tape))], tape.tids)
+            self.records += len(tape) - self.tape_length
+            self.tape_length = len(tape)
+
+        events = []
+        if self.keyframe == None or self.frames - self.keyframe >= self.keyframe_interval:
+            self.keyframe = self.frames
+            for side, half, book in ((OType.BID, exchange.bids, self.books[0]), (OType.ASK, exchange.asks, self.books[1])):
+                book_delta(book, half.lob_anon)
+                events.extend([EVENT_STRUCT.pack(side, price, qty) for price, qty in book.items()])
+        else:
+            for side, half, book in ((OType.BID, exchange.bids, self.books[0]), (OType.ASK, exchange.asks, self.books[1])):
+                events.extend([EVENT_STRUCT.pack(side, price, qty) for price, qty in book_delta(book, half.lob_anon)])
+        self.book_file.write(b''.join(events))
+        self.index_file.write(INDEX_STRUCT.pack(self.session, time, self.events, self.records, self.keyframe))
+        self.events += len(events)
+        self.frames += 1
+
+    def flush(self):
+        self.tape_writer.flush()
+        self.book_file.flush()
+        self.index_file.flush()
+
+    def close(self):
+        self.tape_writer.close()
+        self.book_file.close()
+        self.index_file.close()
+
+
+# Memory map of a whole file, empty if the file is
+def _map(fname):
+    with open(fname, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+
+
+# The tape records of one recorded session, read from the memory-mapped tape file
+class ReplayTape:
+
+    # A recording is never cleared
+    generation = 0
+
+    def __init__(self, records, tids, start):
+        self.records = records
+        self.tids = tids
+        self.start = start
+
+    def first_retained(self):
+        return 0
+
+    def __getitem__(self, index):
+        rtype, time, price, qty, party1, party2, qid = RECORD_STRUCT.unpack_from(self.records, (self.start + index) * RECORD_STRUCT.size)
+        party1 = self.tids[party1] if party1 >= 0 else None
+        if rtype == 0:
+            return { 'type': 'Trade', 'time': time, 'price': price,
+                     'party1': party1, 'party2': self.tids[party2] if party2 >= 0 else None, 'qty': qty }
+        return { 'type': 'Cancel', 'time': time, 'tid': party1, 'price': price, 'qty': qty, 'qid': qid }
+
+
+# Replays a recorded session for a player: its observations are the public LOB of every recorded frame
+# (bids, asks and tape, as Exchange.get_public_lob) and the player's trader, as in Environment
+# The market does not react to the player: a player order trades at once against the recorded levels of the
+# opposite side it crosses, up to their quantity, and whatever is left of it is dropped
+# The player's order is drawn as in Environment (a random side, a limit price around 50), or given as order
+# (an Order template: side, price and quantity); with replenish_orders it gets it again once it has traded
+# Rewards are those of Environment.step: the player's balance at the steps it trades, 0 at the others
+class ReplayEnvironment:
+
+    def __init__(self, fname, order = None, replenish_orders = False):
+        self.records = _map(fname)
+        self.events = _map(fname + '.book')
+        self.index = _map(fname + '.index')
+        with open(fname + '.tids') as tids_file:
+            self.tids = tids_file.read().splitlines()
+        self.n_frames = len(self.index) // INDEX_STRUCT.size
+        self.n_events = len(self.events) // EVENT_STRUCT.size
+        self.n_sessions = self._entry(self.n_frames - 1)[0] + 1 if self.n_frames > 0 else 0
+        self.template = order
+        self.replenish_orders = replenish_orders
+        self.init = False
+
+    def _entry(self, frame):
+        return INDEX_STRUCT.unpack_from(self.index, frame * INDEX_STRUCT.size)
+
+    # First frame whose field (0: session, 1: time) is at least value, between frames lo and hi; the field
+    # must be sorted over that range (sessions over the file, times within a session)
+    def _bisect(self, field, value, lo, hi):
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._entry(mid)[field] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _generate_order(self, time):
+        if self.template != None:
+            return Order('PLAYER', self.template.otype, self.template.price, self.template.qty, time)
+        otype = OType.BID if random.randint(0,1) == 0 else OType.ASK
+        return Order('PLAYER', otype, 50 + random.randint(-10, 10), 1, time)
+
+    # Start replaying a recorded session from its first frame
+    def reset(self, session = 0):
+        if session < 0 or session >= self.n_sessions:
+            raise RuntimeError('Error when resetting replay: no session %d in the recording' % session)
+        self.session = session
+        self.first_frame = self._bisect(0, session, 0, self.n_frames)
+        self.end_frame = self._bisect(0, session + 1, self.first_frame, self.n_frames)
+        first = self._entry(self.first_frame)
+        # Tape records written before the session
+        self.tape_start = first[3]
+        self.tape = ReplayTape(self.records, self.tids, self.tape_start)
+        self.player = Trader(TType.PLAYER, 'PLAYER')
+        self.player.assign_order(self._generate_order(first[1]))
+        self.init = True
+        self._go_to(self.first_frame)
+        return self._get_observation()
+
+    # Jump to the frame of a timestep of the session (the last frame at or before it), rebuilding the book
+    # from the closest keyframe; the player keeps its order and balance
+    def seek(self, time):
+        if not self.init:
+            raise RuntimeError('Error: seek() function in replay called before reset()')
+        frame = self._bisect(1, time + 1, self.first_frame, self.end_frame) - 1
+        self._go_to(max(frame, self.first_frame))
+        return self._get_observation()
+
+    def _go_to(self, frame):
+        self.books = ({}, {})
+        self.frame = self._entry(frame)[4]
+        self._apply(self.frame)
+        while self.frame < frame:
+            self.frame += 1
+            self._apply(self.frame)
+
+    # Apply the book events of a frame, starting from an empty book on keyframes
+    def _apply(self, frame):
+        entry = self._entry(frame)
+        if entry[4] == frame:
+            self.books = ({}, {})
+        end = self._entry(frame + 1)[2] if frame + 1 < self.n_frames else self.n_events
+        events = self.events
+        for offset in range(entry[2] * EVENT_STRUCT.size, end * EVENT_STRUCT.size, EVENT_STRUCT.size):
+            side, price, qty = EVENT_STRUCT.unpack_from(events, offset)
+            book = self.books[side]
+            if qty == 0:
+                book.pop(price, None)
+            else:
+                book[price] = qty
+        self.time = entry[1]
+        self.tape_length = entry[3] - self.tape_start
+        self.lob = None
+
+    def get_public_lob(self):
+        if self.lob == None:
+            self.lob = {
+                'time': self.time,
+                'version': self.frame,
+                'bids': tuple(sorted(self.books[0].items(), reverse = True)),
+                'asks': tuple(sorted(self.books[1].items())),
+                'tape': TapeView(self.tape, self.tape_length)
+            }
+        return self.lob
+
+    def _get_observation(self):
+        return { 'lob': self.get_public_lob(), 'trader': self.player }
+
+    # Fills of a player order against the recorded levels it crosses, best price first, for at most the units
+    # of the player's assigned order
+    def _match(self, order):
+        fills = []
+        qty = min(order.qty, self.player.order.qty)
+        if order.otype == OType.BID:
+            levels = self.get_public_lob()['asks']
+            crosses = lambda price: price <= order.price
+        else:
+            levels = self.get_public_lob()['bids']
+            crosses = lambda price: price >= order.price
+        for price, level_qty in levels:
+            if qty == 0 or not crosses(price):
+                break
+            traded = min(qty, level_qty)
+            fills.append({ 'type': 'Trade', 'time': self.time, 'price': price, 'party1': None, 'party2': 'PLAYER', 'qty': traded })
+            qty -= traded
+        return fills
+
+    def step(self, player_action):
+        if not self.init:
+            raise RuntimeError('Error: step() function in replay called before reset()')
+        if self.frame + 1 >= self.end_frame:
+            raise RuntimeError('Error: step() function in replay called after the end of the session')
+        # As in Environment.step, the reward is the player's balance at the steps it trades, 0 at the others
+        reward = 0
+        if player_action != None and self.player.order != None:
+            fills = self._match(player_action)
+            for fill in fills:
+                self.player.notify_transaction(fill)
+            if fills:
+                reward = self.player.balance
+        if self.player.order == None and self.replenish_orders:
+            self.player.assign_order(self._generate_order(self.time))
+
+        self.frame += 1
+        self._apply(self.frame)
+        done = self.frame + 1 >= self.end_frame
+        info = ""
+        if done:
+            info = "BALANCES: \nPLAYER:" + str(self.player.balance) + "\n"
+        return self._get_observation(), reward, done, info
+
+    def close(self):
+        for mapped in (self.records, self.events, self.index):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
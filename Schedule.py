@@ -0,0 +1,110 @@
+import bisect
+import random
+import numpy as np
+
+# MarketSchedule holds the supply and demand schedules of a market: the limit prices of the orders given
+# to the buyers and to the sellers, period by period, all generated up front as arrays.
+# A schedule is a list of periods, each a dictionary:
+#   'from'      first timestep of the period (the first period also covers the timesteps before it)
+#   'range'     (low, high) limit prices
+#   'stepmode'  'fixed': prices evenly spaced from high to low (demand) or low to high (supply), one step per trader
+#               'jittered': the fixed prices, each moved by up to half a step at random
+#               'random': prices drawn uniformly in the range
+# A period ends where the next one starts, so a shock is simply a new period with a different range.
+# Demand and supply can change at different times: the market periods are delimited by the changes of either.
+# The theoretical equilibrium of every market period is computed at once, with the highest total surplus
+# the traders can extract, to score sessions as they run.
+
+class MarketSchedule:
+
+    STEPMODES = ('fixed', 'jittered', 'random')
+
+    def __init__(self, demand, supply, n_buyers, n_sellers, rng = None):
+        if n_buyers < 1 or n_sellers < 1:
+            raise RuntimeError('Error when creating MarketSchedule: at least one buyer and one seller are needed')
+        # The generator is seeded from the random module, so that random.seed() makes runs reproducible
+        self.rng = rng if rng != None else np.random.default_rng(random.getrandbits(64))
+        self.n_buyers = n_buyers
+        self.n_sellers = n_sellers
+        self.demand = sorted(demand, key = lambda period: period['from'])
+        self.supply = sorted(supply, key = lambda period: period['from'])
+
+        # Limit prices of each period of each schedule: (periods, traders) arrays
+        demand_limits = np.stack([self._limits(period, n_buyers, True) for period in self.demand])
+        supply_limits = np.stack([self._limits(period, n_sellers, False) for period in self.supply])
+
+        # Market periods, starting at every change of demand or supply, and the schedule period active in each
+        demand_starts = np.array([period['from'] for period in self.demand])
+        supply_starts = np.array([period['from'] for period in self.supply])
+        self.starts = np.union1d(demand_starts, supply_starts)
+        demand_index = np.maximum(np.searchsorted(demand_starts, self.starts, side = 'right') - 1, 0)
+        supply_index = np.maximum(np.searchsorted(supply_starts, self.starts, side = 'right') - 1, 0)
+        self.buyer_limits = demand_limits[demand_index]
+        self.seller_limits = supply_limits[supply_index]
+
+        self._equilibrium()
+
+        # Python lists for the lookups made while the market runs
+        self.start_list = self.starts.tolist()
+        self.buyer_list = self.buyer_limits.tolist()
+        self.seller_list = self.seller_limits.tolist()
+
+    # Limit prices of the n traders of one schedule period
+    def _limits(self, period, n, is_demand):
+        low, high = period['range']
+        if low > high:
+            raise RuntimeError('Error when creating MarketSchedule: empty range %s' % (period['range'],))
+        stepmode = period.get('stepmode', 'fixed')
+        if stepmode == 'random':
+            return self.rng.integers(low, high, size = n, endpoint = True)
+        if stepmode not in self.STEPMODES:
+            raise RuntimeError('Error when creating MarketSchedule: unknown stepmode %s' % stepmode)
+        prices = np.linspace(low, high, n) if n > 1 else np.array([(low + high) / 2])
+        if is_demand:
+            prices = prices[::-1]
+        if stepmode == 'jittered' and n > 1:
+            step = (high - low) / (n - 1)
+            prices = np.clip(prices + self.rng.uniform(-step / 2, step / 2, size = n), low, high)
+        return np.rint(prices).astype(np.int64)
+
+    # Equilibrium quantity and price, and highest total surplus, of every market period at once
+    # With demand sorted descending and supply ascending, the equilibrium quantity q is the number of units
+    # where demand still meets supply; any price between the last units traded and the first ones left out clears
+    # the market, and the equilibrium price is the middle of that interval
+    def _equilibrium(self):
+        demand = -np.sort(-self.buyer_limits, axis = 1)
+        supply = np.sort(self.seller_limits, axis = 1)
+        n = min(self.n_buyers, self.n_sellers)
+        periods = len(self.starts)
+        crossing = demand[:, :n] >= supply[:, :n]
+        q = crossing.sum(axis = 1)
+        self.equilibrium_quantity = q
+        self.max_surplus = np.where(crossing, demand[:, :n] - supply[:, :n], 0).sum(axis = 1)
+
+        rows = np.arange(periods)
+        last = np.maximum(q - 1, 0)
+        # Bounds set by the last units traded (the marginal buyer and seller)
+        high = demand[rows, last].astype(np.float64)
+        low = supply[rows, last].astype(np.float64)
+        # Bounds set by the first units left out, if any
+        next_demand = np.where(q < self.n_buyers, demand[rows, np.minimum(q, self.n_buyers - 1)], -np.inf)
+        next_supply = np.where(q < self.n_sellers, supply[rows, np.minimum(q, self.n_sellers - 1)], np.inf)
+        low = np.maximum(low, next_demand)
+        high = np.minimum(high, next_supply)
+        self.equilibrium_price = np.where(q > 0, (low + high) / 2, np.nan)
+
+    # Index of the market period of a timestep
+    def period(self, time):
+        return max(bisect.bisect_right(self.start_list, time) - 1, 0)
+
+    # Limit price of buyer or seller `index` at a timestep
+    def limit(self, is_buyer, index, time):
+        limits = self.buyer_list if is_buyer else self.seller_list
+        return limits[self.period(time)][index]
+
+    # (equilibrium price, equilibrium quantity, highest total surplus) at a timestep; the price is None if nothing trades
+    def equilibrium(self, time):
+        i = self.period(time)
+        q = int(self.equilibrium_quantity[i])
+        price = float(self.equilibrium_price[i]) if q > 0 else None
+        return price, q, int(self.max_surplus[i])
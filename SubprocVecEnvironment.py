@@ -0,0 +1,219 @@
+import math
+import multiprocessing
+import random
+from multiprocessing import connection, shared_memory
+import numpy as np
+from BristolStockGym import Environment
+from ObservationEncoder import ObservationEncoder
+from Order import Order
+
+# Runs num_envs Environments in worker processes, one market per process, stepped asynchronously
+# Actions, observations, rewards and dones are exchanged through shared memory arrays (one row per market);
+# the pipe to each worker only carries short commands and the end-of-session info.
+# Actions are prices for the player's current order (NaN for no order), as in VecEnvironment.
+# A worker that dies is restarted with a fresh market, reported as done with info['restarted'] = True.
+
+# Shared arrays: name -> (dtype, shape per market)
+def _shared_layout(observation_size):
+    return {
+        'obs': (np.float64, (observation_size,)),
+        'terminal_obs': (np.float64, (observation_size,)),
+        'actions': (np.float64, ()),
+        'rewards': (np.float64, ()),
+        'dones': (np.bool_, ())
+    }
+
+
+def _attach(shm, dtype, shape, num_envs):
+    return np.ndarray((num_envs,) + shape, dtype = dtype, buffer = shm.buf)
+
+
+# Worker process: steps market k on command, reading its action and writing its results in shared memory
+def _worker(k, conn, shm_names, num_envs, depth, trades, env_kwargs, seed):
+    random.seed(seed)
+    encoder_size = ObservationEncoder(depth, trades).size
+    blocks = {}
+    arrays = {}
+    for name, (dtype, shape) in _shared_layout(encoder_size).items():
+        blocks[name] = shared_memory.SharedMemory(name = shm_names[name])
+        arrays[name] = _attach(blocks[name], dtype, shape, num_envs)
+    env = Environment(observation_encoder = ObservationEncoder(depth, trades, arrays['obs'][k]), **env_kwargs)
+    try:
+        while True:
+            command = conn.recv()
+            if command == 'step':
+                price = arrays['actions'][k]
+                player = env.traders['PLAYER']
+                order = None
+                if not math.isnan(price) and player.order != None:
+                    order = Order(player.tid, player.order.otype, int(round(price)), player.order.qty, env.time)
+                _observation, reward, done, info = env.step(order)
+                arrays['rewards'][k] = reward
+                arrays['dones'][k] = done
+                if done:
+                    arrays['terminal_obs'][k] = arrays['obs'][k]
+                    env.reset()
+                    conn.send({ 'balances': info })
+                else:
+                    conn.send(None)
+            elif command == 'reset':
+                env.reset()
+                arrays['rewards'][k] = 0
+                arrays['dones'][k] = False
+                conn.send(None)
+            elif command == 'close':
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        del arrays
+        for block in blocks.values():
+            block.close()
+
+
+class SubprocVecEnvironment:
+
+    def __init__(self, num_envs, depth = 5, trades = 10, seed = 0, start_method = None, **env_kwargs):
+        self.num_envs = num_envs
+        self.depth = depth
+        self.trades = trades
+        self.env_kwargs = env_kwargs
+        self.context = multiprocessing.get_context(start_method)
+        self.seeds = random.Random(seed)
+        self.observation_size = ObservationEncoder(depth, trades).size
+
+        # Shared memory blocks, and the parent's views of them
+        self.blocks = {}
+        self.arrays = {}
+        for name, (dtype, shape) in _shared_layout(self.observation_size).items():
+            nbytes = max(1, num_envs * int(np.prod(shape, dtype = np.int64)) * np.dtype(dtype).itemsize)
+            self.blocks[name] = shared_memory.SharedMemory(create = True, size = nbytes)
+            self.arrays[name] = _attach(self.blocks[name], dtype, shape, num_envs)
+            self.arrays[name].fill(0)
+        self.shm_names = { name: block.name for name, block in self.blocks.items() }
+
+        self.processes = [None] * num_envs
+        self.conns = [None] * num_envs
+        # Markets with a command sent and no reply received yet, and markets restarted since their last reply
+        self.waiting = set()
+        self.restarted = set()
+        for k in range(num_envs):
+            self._start(k)
+        self.closed = False
+
+    def _start(self, k):
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(target = _worker, daemon = True,
+                                       args = (k, child_conn, self.shm_names, self.num_envs, self.depth, self.trades,
+                                               self.env_kwargs, self.seeds.getrandbits(64)))
+        process.start()
+        child_conn.close()
+        self.processes[k] = process
+        self.conns[k] = parent_conn
+
+    # Replace a dead worker by a new one with a fresh market
+    def _restart(self, k):
+        if self.processes[k].is_alive():
+            self.processes[k].kill()
+        self.processes[k].join()
+        self.conns[k].close()
+        self._start(k)
+        self.conns[k].send('reset')
+        self.conns[k].recv()
+        self.arrays['terminal_obs'][k] = 0
+        self.restarted.add(k)
+
+    def _send(self, k, command):
+        try:
+            self.conns[k].send(command)
+        except (BrokenPipeError, EOFError, OSError):
+            self._restart(k)
+            self.conns[k].send(command)
+        self.waiting.add(k)
+
+    def reset(self):
+        self.step_wait()
+        for k in range(self.num_envs):
+            self._send(k, 'reset')
+        self._collect(list(range(self.num_envs)), None)
+        return self.arrays['obs'].copy()
+
+    # Send the actions of the markets in indices (all by default) and return without waiting
+    def step_async(self, actions, indices = None):
+        if indices is None:
+            indices = range(self.num_envs)
+        indices = list(indices)
+        if len(actions) != len(indices):
+            raise RuntimeError('Error when stepping SubprocVecEnvironment: expected %d actions, got %d' % (len(indices), len(actions)))
+        for k in indices:
+            if k in self.waiting:
+                raise RuntimeError('Error when stepping SubprocVecEnvironment: market %d is still stepping' % k)
+        for k, action in zip(indices, actions):
+            self.arrays['actions'][k] = np.nan if action is None else float(action)
+            self._send(k, 'step')
+
+    # Wait for replies from the markets in `ready`, restarting dead workers; returns their infos
+    def _collect(self, ready, infos):
+        for k in ready:
+            try:
+                info = self.conns[k].recv()
+            except (EOFError, OSError):
+                self._restart(k)
+                info = None
+                self.arrays['rewards'][k] = 0
+            self.waiting.discard(k)
+            if k in self.restarted:
+                # The session of a crashed worker is over: report it as done
+                self.restarted.discard(k)
+                info = info or {}
+                info['restarted'] = True
+                self.arrays['dones'][k] = True
+            if infos != None:
+                if info != None and 'balances' in info:
+                    info['terminal_observation'] = self.arrays['terminal_obs'][k].copy()
+                infos[k] = info if info != None else {}
+
+    # Collect the markets that have finished stepping, waiting at most timeout seconds (None: until all are done)
+    # Returns (indices, observations, rewards, dones, infos) for those markets only
+    def step_wait(self, timeout = None):
+        infos = {}
+        pending = list(self.waiting)
+        if timeout == None:
+            self._collect(pending, infos)
+        else:
+            conns = { self.conns[k]: k for k in pending }
+            ready = connection.wait(list(conns), timeout)
+            self._collect([conns[conn] for conn in ready], infos)
+        indices = np.array(sorted(infos), dtype = np.int64)
+        return (indices, self.arrays['obs'][indices], self.arrays['rewards'][indices].copy(),
+                self.arrays['dones'][indices].copy(), [infos[k] for k in indices])
+
+    # Synchronous step of every market
+    def step(self, actions):
+        self.step_async(actions)
+        _indices, observations, rewards, dones, infos = self.step_wait()
+        return observations, rewards, dones, infos
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for k in range(self.num_envs):
+            try:
+                self.conns[k].send('close')
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout = 5)
+            if process.is_alive():
+                process.kill()
+        for conn in self.conns:
+            conn.close()
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+
+    def __del__(self):
+        if not getattr(self, 'closed', True):
+            self.close()
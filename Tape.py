@@ -0,0 +1,337 @@
+import copy
+import os
+import struct
+from collections import deque
+import tempfile
+from array import array
+
+# Record types stored on the tape, by type code
+RECORD_TYPES = ('Trade', 'Cancel')
+TRADE = 0
+CANCEL = 1
+
+# Columns of a tape record and their array typecodes
+# party1/party2 are integer trader ids, see Tape.tids; -1 stands for no party
+COLUMNS = ('type', 'time', 'price', 'qty', 'party1', 'party2', 'qid')
+COLUMN_CODES = ('b', 'q', 'q', 'q', 'q', 'q', 'q')
+
+# Binary layout of one record, used when records leave memory
+RECORD_STRUCT = struct.Struct('<bqqqqqq')
+
+# Number of recent trade records whose position the tape remembers, so that they are found without
+# reading back through the cancellations recorded since
+RECENT_TRADES = 64
+
+
+# Read-only view of the first length records of a tape, as published in a LOB snapshot
+# last_trade_index is the index of the last trade record of the view, -1 if it has none, None if unknown
+# Records the tape no longer retains (see Tape.first_retained) cannot be read from a view, and a view is
+# invalidated when its tape is cleared: reading them raises an IndexError
+class TapeView:
+
+    def __init__(self, tape, length, last_trade_index = None):
+        self.tape = tape
+        self.length = length
+        self.last_trade_index = last_trade_index
+        self.generation = tape.generation
+
+    def __len__(self):
+        return self.length
+
+    # Check that the view is still valid and, if start is given, that record start can still be read
+    def _check(self, start = None):
+        if self.generation != self.tape.generation:
+            raise IndexError('Error when reading tape view: the tape has been cleared since the view was taken')
+        if start != None and start < self.tape.first_retained():
+            raise IndexError('Error when reading tape view: record %d is no longer retained, the first one is %d'
+                             % (start, self.tape.first_retained()))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            indices = range(*index.indices(self.length))
+            self._check(min(indices[0], indices[-1]) if len(indices) > 0 else None)
+            return [self.tape[i] for i in indices]
+        if index < 0:
+            index += self.length
+        if index < 0 or index >= self.length:
+            raise IndexError('tape index out of range')
+        self._check(index)
+        return self.tape[index]
+
+    def __iter__(self):
+        self._check(0 if self.length > 0 else None)
+        for i in range(self.length):
+            yield self.tape[i]
+
+    # Most recent trade record of the view, None if there is none (or it is no longer retained)
+    def last_trade(self):
+        self._check()
+        tape = self.tape
+        first = tape.first_retained()
+        i = self.last_trade_index
+        if i == None:
+            i = self.length - 1
+            while i >= first and tape[i]['type'] != 'Trade':
+                i -= 1
+        if i < first:
+            return None
+        return tape[i]
+
+    # Only the most recent records are shown, printing a long tape would read it all back from disk
+    def __repr__(self):
+        start = max(self.length - 20, self.tape.first_retained())
+        records = repr(self[start:])
+        if start > 0:
+            return '[<%d earlier records>, %s' % (start, records[1:])
+        return records
+
+
+# The tape of an exchange: trades and cancellations, stored in columns of fixed-size segments
+# Only the last `window` records are kept in memory, older segments are written to a spill file
+# (a temporary file unless spill_path is given), or dropped if spill is False
+# Records can also be streamed to TapeWriters as they are added, in chunks of chunk_size records
+class Tape:
+
+    def __init__(self, window = 65536, segment_size = 4096, spill = True, spill_path = None, chunk_size = 4096):
+        self.segment_size = segment_size
+        self.max_segments = max(1, window // segment_size)
+        self.spill = spill
+        self.spill_path = spill_path
+        self.spill_file = None
+        # Whether forks of this tape read records from its spill file
+        self.spill_shared = False
+        # Number of times the tape has been cleared, which invalidates its views
+        self.generation = 0
+        # Spill files of the tapes this one was forked from, as (file, end): records before end are read from file
+        self.shared_spills = []
+        # Sealed (full) segments held in memory, oldest first, followed by the segment being filled
+        self.segments = []
+        self.tail = self._new_segment()
+        # Index of the first record held in memory, and total number of records
+        self.base = 0
+        self.length = 0
+        # Dictionary form of the last record, kept so that reading it is O(1)
+        self.last_record = None
+        # Indices of the last RECENT_TRADES trade records, oldest first
+        self.recent_trades = deque(maxlen = RECENT_TRADES)
+        # Trader ids seen on the tape, and their integer ids
+        self.tids = []
+        self.tid_index = {}
+        # Writers the records are streamed to, and the records not handed to them yet
+        self.writers = []
+        self.pending = []
+        self.chunk_size = chunk_size
+
+    def _new_segment(self):
+        return tuple(array(code) for code in COLUMN_CODES)
+
+    # Integer id of a trader id, assigning a new one if the trader has not been seen before
+    def tid_code(self, tid):
+        if tid == None:
+            return -1
+        code = self.tid_index.get(tid)
+        if code == None:
+            code = len(self.tids)
+            self.tids.append(tid)
+            self.tid_index[tid] = code
+        return code
+
+    def tid_name(self, code):
+        if code < 0:
+            return None
+        return self.tids[code]
+
+    # Add a record given as its column values
+    def append_row(self, row):
+        tail = self.tail
+        for column, value in zip(tail, row):
+            column.append(value)
+        self.length += 1
+        if len(tail[0]) == self.segment_size:
+            self._seal()
+        if self.writers:
+            self.pending.append(row)
+            if len(self.pending) >= self.chunk_size:
+                self._send_pending()
+
+    # Stream every record added from now on to a TapeWriter
+    def add_writer(self, writer):
+        self._send_pending()
+        self.writers.append(writer)
+
+    # Hand the remaining records to a writer and stop streaming to it
+    def remove_writer(self, writer):
+        self._send_pending()
+        self.writers.remove(writer)
+        writer.flush()
+
+    def _send_pending(self):
+        if self.pending:
+            for writer in self.writers:
+                writer.write_rows(self.pending, self.tids)
+            self.pending = []
+
+    # Hand the buffered records to the writers and wait until they are written
+    def flush(self):
+        self._send_pending()
+        for writer in self.writers:
+            writer.flush()
+
+    # Write every record that can still be read to a TapeWriter, one chunk at a time
+    def dump(self, writer):
+        rows = []
+        for i in range(self.first_retained(), self.length):
+            rows.append(self.row(i))
+            if len(rows) == self.chunk_size:
+                writer.write_rows(rows, self.tids)
+                rows = []
+        if rows:
+            writer.write_rows(rows, self.tids)
+
+    # Move the full tail segment to the sealed segments, spilling the oldest one if the window is exceeded
+    def _seal(self):
+        self.segments.append(self.tail)
+        self.tail = self._new_segment()
+        if len(self.segments) >= self.max_segments:
+            oldest = self.segments.pop(0)
+            if self.spill:
+                self._spill(oldest)
+            self.base += self.segment_size
+
+    def _spill(self, segment):
+        if self.spill_file == None:
+            if self.spill_path == None:
+                self.spill_file = tempfile.TemporaryFile()
+            else:
+                # Forks may still read the previous file at this path: it is unlinked rather than truncated,
+                # and lives on until they are gone
+                if self.spill_shared and os.path.exists(self.spill_path):
+                    os.remove(self.spill_path)
+                self.spill_file = open(self.spill_path, 'w+b')
+            self.spill_shared = False
+        self.spill_file.seek(self.base * RECORD_STRUCT.size)
+        self.spill_file.write(b''.join([RECORD_STRUCT.pack(*row) for row in zip(*segment)]))
+
+    def append_trade(self, time, price, qty, party1, party2):
+        self.recent_trades.append(self.length)
+        self.append_row((TRADE, time, price, qty, self.tid_code(party1), self.tid_code(party2), -1))
+        self.last_record = { 'type': 'Trade', 'time': time, 'price': price, 'party1': party1, 'party2': party2, 'qty': qty }
+        return self.last_record
+
+    def append_cancel(self, time, tid, price, qty, qid):
+        self.append_row((CANCEL, time, price, qty, self.tid_code(tid), -1, qid))
+        self.last_record = { 'type': 'Cancel', 'time': time, 'tid': tid, 'price': price, 'qty': qty, 'qid': qid }
+        return self.last_record
+
+    # Add a record given as a dictionary, as returned by append_trade/append_cancel
+    def append(self, record):
+        if record['type'] == 'Trade':
+            self.append_trade(record['time'], record['price'], record['qty'], record['party1'], record['party2'])
+        elif record['type'] == 'Cancel':
+            self.append_cancel(record['time'], record['tid'], record['price'], record['qty'], record['qid'])
+        else:
+            raise RuntimeError('Error when adding record to tape: unknown record type')
+
+    # Column values of record i (non-negative), read from memory or from the spill file
+    def row(self, i):
+        if i >= self.base:
+            offset = i - self.base
+            k = offset // self.segment_size
+            segment = self.segments[k] if k < len(self.segments) else self.tail
+            offset -= k * self.segment_size
+            return tuple(column[offset] for column in segment)
+        spill_file = self.spill_file
+        for shared_file, end in self.shared_spills:
+            if i < end:
+                spill_file = shared_file
+                break
+        if spill_file == None:
+            raise IndexError('tape record %d is no longer retained' % i)
+        spill_file.seek(i * RECORD_STRUCT.size)
+        return RECORD_STRUCT.unpack(spill_file.read(RECORD_STRUCT.size))
+
+    # Index of the oldest record that can still be read
+    def first_retained(self):
+        if self.spill_file == None and len(self.shared_spills) == 0:
+            return self.base
+        return 0
+
+    # Copy of the tape that shares its history: sealed segments are never modified, so only the list of them
+    # and the segment being filled are copied. Records already spilled are read from this tape's spill file,
+    # which clear() and close() leave open for the fork. The fork streams to no writer.
+    def fork(self):
+        tape = copy.copy(self)
+        tape.segments = list(self.segments)
+        tape.tail = tuple(array(column.typecode, column) for column in self.tail)
+        tape.tids = list(self.tids)
+        tape.tid_index = dict(self.tid_index)
+        tape.recent_trades = deque(self.recent_trades, RECENT_TRADES)
+        tape.writers = []
+        tape.pending = []
+        tape.spill_file = None
+        tape.spill_path = None
+        tape.spill_shared = False
+        tape.shared_spills = list(self.shared_spills)
+        if self.spill_file != None:
+            tape.shared_spills.append((self.spill_file, self.base))
+            self.spill_shared = True
+        return tape
+
+    # Dictionary form of a record, as published to the traders
+    def record(self, row):
+        rtype, time, price, qty, party1, party2, qid = row
+        if rtype == TRADE:
+            return { 'type': 'Trade', 'time': time, 'price': price,
+                     'party1': self.tid_name(party1), 'party2': self.tid_name(party2), 'qty': qty }
+        return { 'type': 'Cancel', 'time': time, 'tid': self.tid_name(party1), 'price': price, 'qty': qty, 'qid': qid }
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if index < 0 or index >= self.length:
+            raise IndexError('tape index out of range')
+        if index == self.length - 1:
+            return self.last_record
+        return self.record(self.row(index))
+
+    def __iter__(self):
+        for i in range(self.length):
+            yield self[i]
+
+    def __repr__(self):
+        return repr(self.view())
+
+    # Read-only view of the records currently on the tape
+    def view(self):
+        return TapeView(self, self.length, self.recent_trades[-1] if self.recent_trades else -1)
+
+    # Last record on the tape, None if it is empty
+    def last(self):
+        if self.length == 0:
+            return None
+        return self[-1]
+
+    # Remove every record, keeping the trader ids
+    def clear(self):
+        self._send_pending()
+        self.segments = []
+        self.tail = self._new_segment()
+        self.base = 0
+        self.length = 0
+        self.last_record = None
+        self.recent_trades.clear()
+        self.shared_spills = []
+        self.generation += 1
+        self.close()
+
+    # Close the spill file, unless forks read from it: it is then only dropped, and closed once they are gone
+    def close(self):
+        if self.spill_file != None:
+            if not self.spill_shared:
+                self.spill_file.close()
+            self.spill_file = None
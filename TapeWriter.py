@@ -0,0 +1,132 @@
+import queue
+import threading
+from Tape import COLUMNS, RECORD_STRUCT, RECORD_TYPES
+
+# A TapeWriter streams tape records to a file while a session runs
+# The tape hands it chunks of records (see Tape.add_writer); with background = True the chunks
+# are written by a separate thread, so the simulation does not wait on the I/O
+class TapeWriter:
+
+    def __init__(self, fname, fmode = 'w', background = True, max_pending_chunks = 64):
+        self.fname = fname
+        self.file = open(fname, fmode + self.file_mode_suffix)
+        self.error = None
+        self.thread = None
+        if background:
+            self.queue = queue.Queue(max_pending_chunks)
+            self.thread = threading.Thread(target = self._run, daemon = True)
+            self.thread.start()
+
+    file_mode_suffix = ''
+
+    # Called by the tape with a chunk of record rows, party ids being indices in tids
+    def write_rows(self, rows, tids):
+        if self.error != None:
+            raise RuntimeError('Error when writing tape to %s: %s' % (self.fname, self.error))
+        if self.thread == None:
+            self.write_chunk(rows, tids)
+        else:
+            self.queue.put((rows, tids))
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item == None:
+                    return
+                if self.error == None:
+                    self.write_chunk(*item)
+            except Exception as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+    # Wait until every chunk handed to the writer is on disk
+    def flush(self):
+        if self.thread != None:
+            self.queue.join()
+        if self.error != None:
+            raise RuntimeError('Error when writing tape to %s: %s' % (self.fname, self.error))
+        self.file.flush()
+
+    def close(self):
+        if self.thread != None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        self.file.close()
+        if self.error != None:
+            raise RuntimeError('Error when writing tape to %s: %s' % (self.fname, self.error))
+
+    def write_chunk(self, rows, tids):
+        raise NotImplementedError
+
+
+# Writes records as CSV lines: type,time,price,qty,party1,party2,qid
+# party2 is empty for cancellations, which carry the trader id in party1
+class CSVTapeWriter(TapeWriter):
+
+    def __init__(self, fname, fmode = 'w', background = True, max_pending_chunks = 64):
+        super().__init__(fname, fmode, background, max_pending_chunks)
+        if self.file.tell() == 0:
+            self.file.write(','.join(COLUMNS) + '\n')
+
+    def write_chunk(self, rows, tids):
+        lines = []
+        for rtype, time, price, qty, party1, party2, qid in rows:
+            lines.append('%s,%s,%s,%s,%s,%s,%s\n' % (RECORD_TYPES[rtype], time, price, qty,
+                                                     tids[party1] if party1 >= 0 else '',
+                                                     tids[party2] if party2 >= 0 else '',
+                                                     qid if qid >= 0 else ''))
+        self.file.write(''.join(lines))
+
+
+# Writes records as fixed-size binary rows (Tape.RECORD_STRUCT), the layout of the tape spill file
+# Trader ids are written to the side file fname + '.tids', one per line: line i holds trader id i
+class BinaryTapeWriter(TapeWriter):
+
+    file_mode_suffix = 'b'
+
+    def __init__(self, fname, fmode = 'w', background = True, max_pending_chunks = 64):
+        super().__init__(fname, fmode, background, max_pending_chunks)
+        self.tids_file = open(fname + '.tids', fmode)
+        self.tid_index = {}
+        if fmode == 'a':
+            with open(fname + '.tids') as tids_file:
+                for code, tid in enumerate(tids_file.read().splitlines()):
+                    self.tid_index[tid] = code
+        # Translation of the party ids of the tape being written into the ids of this file
+        self.source_tids = None
+        self.translation = []
+
+    def _translate(self, code, tids):
+        if code < 0:
+            return code
+        while len(self.translation) <= code:
+            tid = tids[len(self.translation)]
+            file_code = self.tid_index.get(tid)
+            if file_code == None:
+                file_code = len(self.tid_index)
+                self.tid_index[tid] = file_code
+                self.tids_file.write('%s\n' % tid)
+            self.translation.append(file_code)
+        return self.translation[code]
+
+    def write_chunk(self, rows, tids):
+        if tids is not self.source_tids:
+            self.source_tids = tids
+            self.translation = []
+        pack = RECORD_STRUCT.pack
+        translate = self._translate
+        self.file.write(b''.join([pack(rtype, time, price, qty, translate(party1, tids), translate(party2, tids), qid)
+                                  for rtype, time, price, qty, party1, party2, qid in rows]))
+
+    def flush(self):
+        super().flush()
+        self.tids_file.flush()
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.tids_file.close()
@@ -1,3 +1,4 @@
+import copy
 import random
 
 from enum import Enum
@@ -11,25 +12,64 @@ class TType(Enum):
     ZIC = 'ZIC' # After Gode & Sunder 1993
     ZIP = 'ZIP' # After Cliff 1997
 
+# Traders are slotted, like orders, so that a population of many thousands carries no per-trader __dict__
+# Strategies subclassing Trader declare their own attributes in __slots__ (an empty tuple if they add none)
 class Trader:
 
-    def __init__(self, trader_type, trader_id, min_price = 1, max_price = 1000):
+    __slots__ = ('ttype', 'tid', 'order', 'quote', 'otype', 'balance', 'quote_batch', 'batch_index', 'exchange_rules')
+
+    # exchange_rules, if given, is the dictionary of rules of the market (see Environment.exchange_rules),
+    # shared by all its traders and never modified; otherwise the trader gets its own, from min_price and max_price
+    def __init__(self, trader_type, trader_id, min_price = 1, max_price = 1000, exchange_rules = None):
         # Trader attributes:
         self.ttype = trader_type
         self.tid = trader_id
         self.order = None
+        self.quote = None # Order object last sent to the exchange, reused by make_quote()
         self.otype = None # Type of the order last assigned to the trader. Used if we want to keep a trader exclusively bidding or asking
         self.balance = 0
+        # QuoteBatch quoting for this trader, if any, and the trader's index in it
+        self.quote_batch = None
+        self.batch_index = None
         # Exchange rules: # TODO: maybe change it to storing a local copy of the exchange if necessary?
-        self.exchange_rules = {
-            'minprice' : min_price,
-            'maxprice' : max_price
-        }
+        if exchange_rules == None:
+            exchange_rules = {
+                'minprice' : min_price,
+                'maxprice' : max_price
+            }
+        self.exchange_rules = exchange_rules
 
     # Assigns a new order to the trader, replacing a previous one if there was one
     def assign_order(self, order):
         self.order = order
         self.otype = order.otype
+        if self.quote_batch != None:
+            self.quote_batch.assign(self.batch_index, order)
+
+    # Copy of the trader for a forked environment
+    # Its order is copied, as partial fills reduce it; its quote is not kept, as both copies would reuse it once filled
+    def fork(self):
+        trader = copy.copy(self)
+        if self.order != None:
+            trader.order = self.order.copy()
+        trader.quote = None
+        return trader
+
+    # Quote for the current order at the given price
+    # The Order object last sent is reused once it has been filled (the book sets its quantity to 0 when it
+    # leaves), instead of allocating one at every action; while it may still rest on the book, or in the
+    # exchange's quote index, it is left untouched and a new one is sent
+    def make_quote(self, price, time):
+        quote = self.quote
+        order = self.order
+        if quote == None or quote.qty != 0 or quote.otype != order.otype or quote.symbol != order.symbol:
+            quote = Order(self.tid, order.otype, price, order.qty, time, symbol = order.symbol)
+            self.quote = quote
+        else:
+            quote.price = price
+            quote.qty = order.qty
+            quote.time = time
+        return quote
 
     # Regress to a price and place an order in the exchange
     # player_action input is for the player action
@@ -56,10 +96,18 @@ class Trader:
                 raise RuntimeError('Error: Wrong order type stored in trader')
             return benefit
 
-        if transaction_record['type'] == 'Trade':
-            benefit = calculate_benefit(self.order, transaction_record['price'])
+        # Units traded beyond the order (a player quoting more than it was assigned) carry no benefit
+        if transaction_record['type'] == 'Trade' and self.order != None:
+            filled = min(transaction_record['qty'], self.order.qty)
+            benefit = calculate_benefit(self.order, transaction_record['price']) * filled
             self.balance += benefit
+            if filled < self.order.qty:
+                # Partial fill: the rest of the order is still to be traded
+                self.order.qty -= filled
+                return
             self.order = None
+            if self.quote_batch != None:
+                self.quote_batch.deactivate(self.batch_index)
 
     # Called to update the trader with the latest LOB information after each timestep
     def update(self, public_lob):
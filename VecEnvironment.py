@@ -0,0 +1,69 @@
+import math
+import numpy as np
+from BristolStockGym import Environment
+from ObservationEncoder import ObservationEncoder
+from Order import Order
+
+# Holds num_envs independent markets and steps them together
+# Actions, observations, rewards and dones are batched as NumPy arrays, one row per market,
+# and a market that finishes is reset straight away
+# Each market writes its observation (see ObservationEncoder) directly into its row of one preallocated
+# batch buffer; with copy = False that buffer itself is returned, and is overwritten by the next step
+class VecEnvironment:
+
+    def __init__(self, num_envs, depth = 5, trades = 10, copy = True, **env_kwargs):
+        self.num_envs = num_envs
+        self.copy = copy
+        self.observation_size = ObservationEncoder(depth, trades).size
+        self.obs_buf = np.zeros((num_envs, self.observation_size), dtype = np.float64)
+        self.rew_buf = np.zeros(num_envs, dtype = np.float64)
+        self.done_buf = np.zeros(num_envs, dtype = bool)
+        self.envs = [Environment(observation_encoder = ObservationEncoder(depth, trades, self.obs_buf[k]), **env_kwargs)
+                     for k in range(num_envs)]
+        self.init = False
+
+    def _output(self, array):
+        return array.copy() if self.copy else array
+
+    def reset(self):
+        for env in self.envs:
+            env.reset()
+        self.init = True
+        return self._output(self.obs_buf)
+
+    # Turn the action for market k into the player's order
+    # An action is an Order, None (no order) or a price for the player's current order (NaN for no order)
+    def _player_order(self, k, action):
+        if action is None or isinstance(action, Order):
+            return action
+        price = float(action)
+        if math.isnan(price):
+            return None
+        env = self.envs[k]
+        player = env.traders['PLAYER']
+        if player.order == None:
+            return None
+        return Order(player.tid, player.order.otype, int(round(price)), player.order.qty, env.time)
+
+    # actions: sequence of num_envs actions, see _player_order
+    # Returns observations (num_envs x observation_size), rewards, dones and a list of infos
+    # For a market that finished, the observation is the first one of its next session and its info
+    # holds the final 'balances' string and the 'terminal_observation'
+    def step(self, actions):
+        if not self.init:
+            raise RuntimeError('Error: step() function in VecEnvironment called before reset()')
+        if len(actions) != self.num_envs:
+            raise RuntimeError('Error when stepping VecEnvironment: expected %d actions, got %d' % (self.num_envs, len(actions)))
+
+        infos = []
+        for k, env in enumerate(self.envs):
+            _observation, reward, done, info = env.step(self._player_order(k, actions[k]))
+            self.rew_buf[k] = reward
+            self.done_buf[k] = done
+            if done:
+                infos.append({ 'balances': info, 'terminal_observation': self.obs_buf[k].copy() })
+                env.reset()
+            else:
+                infos.append({})
+
+        return self._output(self.obs_buf), self._output(self.rew_buf), self._output(self.done_buf), infos
@@ -1,9 +1,11 @@
 import random
-from Order import OType, Order
+from Order import OType
 from Trader import Trader
 
 class ZIC(Trader):
 
+    __slots__ = ()
+
     def action(self, player_action, time):
         # If the trader has no pending trade orders, do nothing
         if self.order == None:
@@ -13,5 +15,4 @@ class ZIC(Trader):
             price = random.randint(self.exchange_rules['minprice'], self.order.price)
         elif self.order.otype == OType.ASK:
             price = random.randint(self.order.price, self.exchange_rules['maxprice'])
-        order = Order(self.tid, self.order.otype, price, self.order.qty, time)
-        return order
+        return self.make_quote(price, time)
@@ -1,11 +1,14 @@
 import random
-from Order import OType, Order
+from Order import OType
 from Trader import Trader
 
 class ZIP(Trader):
 
-    def __init__(self, trader_type, trader_id, min_price = 1, max_price = 1000):
-        super().__init__(trader_type, trader_id, min_price, max_price)
+    __slots__ = ('previous_change', 'beta', 'momentum', 'ca', 'cr', 'margin', 'margin_buy', 'margin_sell', 'price',
+                 'prev_best_bid_p', 'prev_best_bid_q', 'prev_best_ask_p', 'prev_best_ask_q', 'lob_version')
+
+    def __init__(self, trader_type, trader_id, min_price = 1, max_price = 1000, exchange_rules = None):
+        super().__init__(trader_type, trader_id, min_price, max_price, exchange_rules)
 
         # Initialise ZIP arguments
         # self.job = None  # this gets switched to 'Bid' or 'Ask' depending on order-type       # self.otype
@@ -33,6 +36,9 @@ class ZIP(Trader):
         self.prev_best_ask_p = max_price
         self.prev_best_ask_q = 0
 
+        # Version of the last public LOB snapshot seen by update()
+        self.lob_version = None
+
     # Assigns a new order to the trader, replacing a previous one if there was one
     def assign_order(self, order):
         self.order = order
@@ -55,8 +61,7 @@ class ZIP(Trader):
             price = self.price
         else:
             price = self.price
-        order = Order(self.tid, self.order.otype, price, self.order.qty, time)
-        return order
+        return self.make_quote(price, time)
 
 
     def update(self, public_lob):
@@ -101,6 +106,17 @@ class ZIP(Trader):
 
         ## Main function code:
 
+        # If the exchange has not changed since the last update there is nothing new to react to:
+        # no improvement, and no deal stamped with the previous timestep
+        if public_lob['version'] == self.lob_version:
+            return
+        self.lob_version = public_lob['version']
+
+        # Last trade, and whether it happened at the previous timestep; cancellations (including the quotes
+        # replaced by newer ones) are not deals, so the tape is read at its last trade rather than its last record
+        last_trade = public_lob['tape'].last_trade()
+        recent_trade = last_trade != None and last_trade['time'] == public_lob['time'] - 1
+
         # What, if anything, has happened on the bid LOB?
 
         # To check:
@@ -118,17 +134,12 @@ class ZIP(Trader):
         if best_bid_p != self.exchange_rules['minprice'] :
             if self.prev_best_bid_p < best_bid_p:
                 bid_improved = True
-            elif len(public_lob['tape']) > 0: # Get previous trade, if it exists
-                last_trade_timestep = public_lob['tape'][-1]['time']
-                last_timestep = public_lob['time'] - 1
-                if last_trade_timestep == last_timestep:
-                    bid_hit = True
+            elif recent_trade:
+                bid_hit = True
         elif self.prev_best_bid_p != self.exchange_rules['minprice'] :
             # The LOB has been emptied: was it cancelled or hit?
-            if len(public_lob['tape']) > 0:
-                last_tape_item = public_lob['tape'][-1]
-                if last_tape_item['type'] != 'Cancel' :
-                    bid_hit = True
+            if recent_trade:
+                bid_hit = True
 
 
         # What, if anything, has happened on the ask LOB?
@@ -148,26 +159,22 @@ class ZIP(Trader):
         if best_ask_p != self.exchange_rules['maxprice'] :
             if self.prev_best_ask_p < best_ask_p:
                 ask_improved = True
-            elif len(public_lob['tape']) > 0: # Get previous trade, if it exists
-                last_trade_timestep = public_lob['tape'][-1]['time']
-                last_timestep = public_lob['time'] - 1
-                if last_trade_timestep == last_timestep:
-                    ask_lifted = True
+            elif recent_trade:
+                ask_lifted = True
         elif self.prev_best_ask_p != self.exchange_rules['maxprice'] :
             # The LOB has been emptied: was it cancelled or lifted?
-            if len(public_lob['tape']) > 0:
-                last_tape_item = public_lob['tape'][-1]
-                if last_tape_item['type'] != 'Cancel' :
-                    ask_lifted = True
+            if recent_trade:
+                ask_lifted = True
 
         # Did a deal happen?
         deal_happened = bid_hit or ask_lifted
         deal = None
         if deal_happened:
-            deal = public_lob['tape'][-1]
+            deal = last_trade
 
+        # A trader without an order has no target price to update, it only remembers the LOB
         # Update target price if asking:
-        if self.order.otype == OType.ASK:
+        if self.order != None and self.order.otype == OType.ASK:
             if deal_happened :
                 tradeprice = deal['price']
                 if self.price <= tradeprice: # Raise Margin
@@ -186,7 +193,7 @@ class ZIP(Trader):
                     alter_profit(new_target_price)
 
         # Update target price if bidding:
-        if self.order.otype == OType.BID:
+        if self.order != None and self.order.otype == OType.BID:
             if deal_happened :
                 tradeprice = deal['price']
                 if self.price >= tradeprice: # Raise Margin
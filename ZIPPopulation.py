@@ -0,0 +1,237 @@
+import copy
+import random
+import numpy as np
+from Order import OType, Order
+from ZIP import ZIP
+
+# ZIPPopulation holds the state of a whole population of ZIP traders in NumPy arrays (one entry per
+# trader) and runs the ZIP update of all of them in one vectorized pass per timestep.
+# The traders themselves are PooledZIP objects: ZIP traders whose state lives in the population.
+# The update follows ZIP.update step by step; the only difference is that the random perturbations
+# of the target prices are drawn in one batch from the population's generator.
+
+class ZIPPopulation:
+
+    # Per-trader state, with the dtype of each array
+    FIELDS = {
+        'beta': np.float64,
+        'momentum': np.float64,
+        'ca': np.float64,
+        'cr': np.float64,
+        'previous_change': np.float64,
+        'margin': np.float64,
+        'margin_buy': np.float64,
+        'margin_sell': np.float64,
+        'price': np.int64,
+        'limit': np.int64,
+        'is_bid': bool,
+        'active': bool,
+        'prev_best_bid_p': np.int64,
+        'prev_best_bid_q': np.int64,
+        'prev_best_ask_p': np.int64,
+        'prev_best_ask_q': np.int64,
+        'lob_version': np.int64
+    }
+
+    def __init__(self, min_price = 1, max_price = 1000, capacity = 64, rng = None):
+        self.minprice = min_price
+        self.maxprice = max_price
+        # The generator is seeded from the random module, so that random.seed() makes runs reproducible
+        self.rng = rng if rng != None else np.random.default_rng(random.getrandbits(64))
+        self.size = 0
+        self.capacity = capacity
+        for name, dtype in self.FIELDS.items():
+            setattr(self, name, np.zeros(capacity, dtype = dtype))
+        self.traders = []
+
+    def _grow(self):
+        self.capacity *= 2
+        for name in self.FIELDS:
+            array = getattr(self, name)
+            grown = np.zeros(self.capacity, dtype = array.dtype)
+            grown[:self.size] = array[:self.size]
+            setattr(self, name, grown)
+
+    # Copy of the population for a forked environment, attached to the forked traders (by trader id)
+    # The generator is copied with its state, so the fork draws what the original would have drawn
+    def fork(self, traders):
+        population = copy.copy(self)
+        population.rng = copy.deepcopy(self.rng)
+        for name in self.FIELDS:
+            setattr(population, name, getattr(self, name).copy())
+        population.traders = [traders[trader.tid] for trader in self.traders]
+        for trader in population.traders:
+            trader.population = population
+        return population
+
+    # Register a trader, drawing its ZIP parameters as ZIP.__init__ does; return its index
+    def add(self, trader):
+        if self.size == self.capacity:
+            self._grow()
+        i = self.size
+        u = self.rng.random(4)
+        self.beta[i] = 0.1 + 0.4 * u[0]
+        self.momentum[i] = 0.1 * u[1]
+        self.ca[i] = 0.05
+        self.cr[i] = 0.05
+        self.previous_change[i] = 0
+        self.margin_buy[i] = -1.0 * (0.05 + 0.3 * u[2])
+        self.margin_sell[i] = 0.05 + 0.3 * u[3]
+        self.prev_best_bid_p[i] = self.minprice
+        self.prev_best_ask_p[i] = self.maxprice
+        self.lob_version[i] = -1
+        self.traders.append(trader)
+        self.size += 1
+        return i
+
+    # A new order has been assigned to trader i (see ZIP.assign_order)
+    def assign(self, i, limit_price, is_bid):
+        self.limit[i] = limit_price
+        self.is_bid[i] = is_bid
+        self.active[i] = True
+        self.margin[i] = self.margin_buy[i] if is_bid else self.margin_sell[i]
+        self.price[i] = int(limit_price * (1 + self.margin[i]))
+
+    # Update every trader of the population with the latest public LOB (see ZIP.update)
+    def update(self, public_lob):
+        n = self.size
+        if n == 0:
+            return
+        minprice = self.minprice
+        maxprice = self.maxprice
+
+        # Traders that have already seen this version of the exchange have nothing to react to
+        version = public_lob['version']
+        run = self.lob_version[:n] != version
+        self.lob_version[:n] = version
+
+        # Best prices and last trade, common to all traders (see ZIP.update)
+        bids = public_lob['bids']
+        asks = public_lob['asks']
+        best_bid_p = bids[0][0] if len(bids) > 0 else minprice
+        best_bid_q = bids[0][1] if len(bids) > 0 else 0
+        best_ask_p = asks[0][0] if len(asks) > 0 else maxprice
+        best_ask_q = asks[0][1] if len(asks) > 0 else 0
+        last = public_lob['tape'].last_trade()
+        recent_trade = last != None and last['time'] == public_lob['time'] - 1
+
+        prev_bid = self.prev_best_bid_p[:n]
+        prev_ask = self.prev_best_ask_p[:n]
+
+        # What, if anything, has happened on the bid LOB?
+        if best_bid_p != minprice:
+            bid_improved = prev_bid < best_bid_p
+            bid_hit = ~bid_improved & recent_trade
+        else:
+            bid_improved = np.zeros(n, dtype = bool)
+            bid_hit = (prev_bid != minprice) & recent_trade
+
+        # What, if anything, has happened on the ask LOB?
+        if best_ask_p != maxprice:
+            ask_improved = prev_ask < best_ask_p
+            ask_lifted = ~ask_improved & recent_trade
+        else:
+            ask_improved = np.zeros(n, dtype = bool)
+            ask_lifted = (prev_ask != maxprice) & recent_trade
+
+        active = self.active[:n] & run
+        is_bid = self.is_bid[:n]
+        price = self.price[:n]
+        deal = bid_hit | ask_lifted
+        trade_price = last['price'] if deal.any() else 0
+        asking = active & ~is_bid
+        bidding = active & is_bid
+
+        # Which traders alter their profit, and towards which target
+        ask_no_deal = asking & ~deal & ask_improved & (price > best_ask_p)
+        bid_no_deal = bidding & ~deal & bid_improved & (price < best_bid_p)
+        up = (asking & deal & (price <= trade_price)) | (bidding & deal & (price < trade_price) & bid_hit)
+        down = (asking & deal & (price > trade_price) & ask_lifted) | (bidding & deal & (price >= trade_price))
+        if best_bid_p > minprice:
+            up |= ask_no_deal
+            fixed_ask = np.zeros(n, dtype = bool)
+        else:
+            fixed_ask = ask_no_deal
+        if best_bid_p < maxprice:
+            down |= bid_no_deal
+            fixed_bid = np.zeros(n, dtype = bool)
+        else:
+            fixed_bid = bid_no_deal
+
+        alter = up | down | fixed_ask | fixed_bid
+        if alter.any():
+            target = np.zeros(n, dtype = np.float64)
+            if fixed_ask.any():
+                target[fixed_ask] = asks[-1][0]
+            if fixed_bid.any():
+                target[fixed_bid] = bids[-1][0]
+
+            # Perturb the reference prices upwards or downwards, drawing all the random numbers at once
+            shifted = np.flatnonzero(up | down)
+            if len(shifted) > 0:
+                reference = np.where(deal, trade_price, np.where(ask_no_deal, best_bid_p, best_ask_p))[shifted]
+                u = self.rng.random((2, len(shifted)))
+                absolute_shift = self.ca[shifted] * u[0]
+                relative_shift = reference * (1.0 + (self.cr[shifted] * u[1]))
+                target[shifted] = np.round(np.where(up[shifted], absolute_shift + relative_shift, absolute_shift - relative_shift))
+
+            # Alter the profit of the traders (see alter_profit in ZIP.update)
+            i = np.flatnonzero(alter)
+            momentum = self.momentum[i]
+            change = ((1.0 - momentum) * (self.beta[i] * (target[i] - self.price[i]))) + (momentum * self.previous_change[i])
+            self.previous_change[i] = change
+            limit = self.limit[i]
+            new_margin = ((self.price[i] + change) / limit) - 1.0
+            buying = self.is_bid[i]
+            lower = buying & (new_margin < 0.0)
+            self.margin_buy[i[lower]] = new_margin[lower]
+            higher = ~buying & (new_margin > 0.0)
+            self.margin_sell[i[higher]] = new_margin[higher]
+            self.price[i] = np.round(limit * (1.0 + self.margin[i]))
+
+        # Remember the best LOB data for the next time-step update
+        self.prev_best_bid_p[:n][run] = best_bid_p
+        self.prev_best_bid_q[:n][run] = best_bid_q
+        self.prev_best_ask_p[:n][run] = best_ask_p
+        self.prev_best_ask_q[:n][run] = best_ask_q
+
+
+# A ZIP trader whose state is stored in a ZIPPopulation and updated by ZIPPopulation.update
+class PooledZIP(ZIP):
+
+    __slots__ = ('population', 'index')
+
+    def __init__(self, trader_type, trader_id, min_price = 1, max_price = 1000, population = None, exchange_rules = None):
+        if population == None:
+            raise RuntimeError('Error when creating PooledZIP: no population given')
+        # The ZIP parameters are drawn by the population, not by ZIP.__init__
+        super(ZIP, self).__init__(trader_type, trader_id, min_price, max_price, exchange_rules)
+        self.population = population
+        self.index = population.add(self)
+
+    def assign_order(self, order):
+        self.order = order
+        self.otype = order.otype
+        self.population.assign(self.index, order.price, order.otype == OType.BID)
+
+    def notify_transaction(self, transaction_record):
+        super().notify_transaction(transaction_record)
+        if self.order == None:
+            self.population.active[self.index] = False
+
+    # The population updates all its traders at once
+    def update(self, public_lob):
+        None
+
+
+# The ZIP attributes of a PooledZIP read and write its entry in the population arrays
+def _population_field(name):
+    def get(self):
+        return getattr(self.population, name)[self.index].item()
+    def set(self, value):
+        getattr(self.population, name)[self.index] = value
+    return property(get, set)
+
+for _name in ('beta', 'momentum', 'ca', 'cr', 'previous_change', 'margin', 'margin_buy', 'margin_sell', 'price',
+              'prev_best_bid_p', 'prev_best_bid_q', 'prev_best_ask_p', 'prev_best_ask_q', 'lob_version'):
+    setattr(PooledZIP, _name, _population_field(_name))
@@ -1,14 +1,15 @@
 import random
-from Order import OType, Order
+from Order import OType
 from Trader import Trader
 
 class ZIU(Trader):
 
+    __slots__ = ()
+
     def action(self, player_action, time):
         # If the trader has no pending trade orders, do nothing
         if self.order == None:
             return None
         # Return an order with a random price
         price = random.randint(self.exchange_rules['minprice'], self.exchange_rules['maxprice'])
-        order = Order(self.tid, self.order.otype, price, self.order.qty, time)
-        return order
+        return self.make_quote(price, time)
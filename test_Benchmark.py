@@ -0,0 +1,34 @@
+import pytest
+from Benchmark import BenchmarkEnvironment, bench_book, bench_env_step, bench_process_order, compare
+from Order import OType
+
+
+def test_compare_reports_regressions_beyond_tolerance():
+    baseline = { 'results': { 'book': { 'add_order_ops_per_sec': 1000, 'add_order_peak_kib': 100, 'bytes_per_order': 0 },
+                              'step': { 'process_order_us': 10 } } }
+    results = { 'book': { 'add_order_ops_per_sec': 700, 'add_order_peak_kib': 110, 'bytes_per_order': 50 },
+                'step': { 'process_order_us': 14 },
+                'new': { 'steps_per_sec': 5 } }
+    # Throughput lower than the baseline and latency higher are regressions; a zero baseline is skipped
+    assert compare(results, baseline, 0.25) == [('book', 'add_order_ops_per_sec', 1000, 700), ('step', 'process_order_us', 10, 14)]
+    assert compare(results, baseline, 0.5) == []
+
+
+@pytest.mark.parametrize('engine', ['OrderBookHalf', 'OrderBookLadder'])
+def test_benchmarks_report_every_metric(engine):
+    report = bench_book(engine, 10, 50)
+    assert set(report) == { 'add_order_ops_per_sec', 'add_order_peak_kib', 'del_order_ops_per_sec', 'del_order_peak_kib',
+                            'get_best_ops_per_sec', 'get_best_peak_kib', 'bytes_per_order' }
+    assert all(value > 0 for value in report.values())
+    report = bench_process_order(engine, 10, 50)
+    assert report['process_order_us'] > 0 and report['peak_kib'] > 0
+
+
+@pytest.mark.parametrize('vectorized_zip', [False, True])
+def test_benchmark_environment(vectorized_zip):
+    environment = BenchmarkEnvironment(6, max_time = 5, vectorized_zip = vectorized_zip)
+    environment.reset()
+    assert len(environment.traders) == 7
+    otypes = [trader.order.otype for tid, trader in environment.traders.items() if tid != 'PLAYER']
+    assert otypes == [OType.BID] * 3 + [OType.ASK] * 3
+    assert bench_env_step(6, 100, 5, vectorized_zip = vectorized_zip)['steps_per_sec'] > 0
@@ -0,0 +1,107 @@
+import random
+import pytest
+from BristolStockGym import Environment
+from Trader import TType, Trader
+
+
+def test_traders_share_the_rules_of_their_environment():
+    random.seed(0)
+    environment = Environment(min_price = 1, max_price = 100, vectorized_zip = True)
+    environment.reset()
+    other = Environment(min_price = 1, max_price = 100)
+    other.reset()
+    rules = environment.exchange_rules
+    assert rules == { 'minprice': 1, 'maxprice': 100 }
+    assert all(trader.exchange_rules is rules for trader in environment.traders.values())
+    assert all(trader.exchange_rules is other.exchange_rules for trader in other.traders.values())
+    assert other.exchange_rules is not rules
+    # A trader created on its own has rules of its own
+    assert Trader(TType.PLAYER, 'PLAYER', 1, 100).exchange_rules == rules
+
+
+# The active set of the 'active' and 'arrival' schedulers is the set of traders holding an order
+def check_active_set(environment):
+    assert set(environment.active_keys) == { tid for tid, trader in environment.traders.items() if trader.order != None }
+    assert len(environment.active_keys) == len(environment.active_index)
+    assert all(environment.active_keys[i] == tid for tid, i in environment.active_index.items())
+
+
+@pytest.mark.parametrize('scheduler', ['active', 'arrival'])
+@pytest.mark.parametrize('replenish_orders', [False, True])
+def test_schedulers_track_the_traders_holding_an_order(scheduler, replenish_orders):
+    random.seed(1)
+    environment = Environment(max_time = 80, min_price = 1, max_price = 100, replenish_orders = replenish_orders,
+                              scheduler = scheduler, arrival_rate = 0.5)
+    environment.reset()
+    check_active_set(environment)
+    traded = False
+    done = False
+    while not done:
+        _observation, _reward, done, _info = environment.step(None)
+        check_active_set(environment)
+        traded = traded or len(environment.exchange.tape) > 0
+    assert traded
+    if not replenish_orders:
+        assert len(environment.active_keys) < len(environment.traders)
+
+
+def test_arrival_wakes_traders_at_the_arrival_rate():
+    random.seed(2)
+    environment = Environment(min_price = 1, max_price = 100, scheduler = 'arrival', arrival_rate = 0.2)
+    environment.reset()
+    others = [tid for tid in environment.active_keys if tid != 'PLAYER']
+    counts = dict.fromkeys(others, 0)
+    for n in range(2000):
+        woken = environment._wake_traders()
+        # The player acts at every step, every other trader at most once
+        assert 'PLAYER' in woken
+        assert len(set(woken)) == len(woken)
+        for tid in woken:
+            if tid != 'PLAYER':
+                counts[tid] += 1
+    assert all(abs(count / 2000 - 0.2) < 0.05 for count in counts.values())
+
+
+@pytest.mark.parametrize('kwargs', [{ 'scheduler': 'sometimes' }, { 'scheduler': 'arrival', 'arrival_rate': 0 },
+                                    { 'scheduler': 'arrival', 'arrival_rate': 1.5 }])
+def test_scheduler_arguments_are_checked(kwargs):
+    with pytest.raises(RuntimeError):
+        Environment(**kwargs)
+
+
+def run_steps(environment, n_steps):
+    for t in range(n_steps):
+        environment.step(None)
+    return [dict(record) for record in environment.exchange.tape], \
+        { tid: (trader.balance, trader.order and (trader.order.price, trader.order.qty)) for tid, trader in environment.traders.items() }
+
+
+@pytest.mark.parametrize('kwargs', [{}, { 'vectorized_zip': True }, { 'batch_quotes': True }, { 'scheduler': 'active' },
+                                    { 'clearing': 'call' }])
+def test_restore_replays_the_session(kwargs):
+    random.seed(6)
+    environment = Environment(max_time = 200, min_price = 1, max_price = 100, replenish_orders = True, **kwargs)
+    environment.reset()
+    run_steps(environment, 20)
+    snapshot = environment.snapshot()
+    first = run_steps(environment, 60)
+    assert len(first[0]) > len(snapshot['environment'].exchange.tape)
+    for replay in range(2):
+        environment.restore(snapshot)
+        assert run_steps(environment, 60) == first
+
+
+def test_fork_leaves_the_environment_unchanged():
+    random.seed(7)
+    environment = Environment(max_time = 200, min_price = 1, max_price = 100, replenish_orders = True, vectorized_zip = True)
+    environment.reset()
+    run_steps(environment, 20)
+    fork = environment.fork()
+    tape_length = len(environment.exchange.tape)
+    state = run_steps(environment, 0)
+    run_steps(fork, 60)
+    assert len(fork.exchange.tape) > tape_length
+    assert run_steps(environment, 0) == state
+    assert fork.time == environment.time + 60
+    with pytest.raises(RuntimeError):
+        Environment().fork()
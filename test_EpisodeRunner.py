@@ -0,0 +1,37 @@
+import pytest
+from EpisodeRunner import EpisodeStats, episode_seeds, run_episode, run_episodes
+
+ENV_KWARGS = { 'max_time': 30, 'min_price': 1, 'max_price': 100, 'replenish_orders': True }
+
+
+def test_episodes_are_reproducible():
+    seeds = episode_seeds(3, seed = 5)
+    assert seeds == episode_seeds(3, seed = 5)
+    assert len(set(seeds)) == 3
+    assert run_episode(seeds[0], ENV_KWARGS) == run_episode(seeds[0], ENV_KWARGS)
+
+
+def test_pool_gives_the_results_of_a_single_process():
+    serial = []
+    parallel = []
+    result = run_episodes(4, seed = 1, workers = 1, env_kwargs = ENV_KWARGS, on_episode = serial.append)
+    pooled = run_episodes(4, seed = 1, workers = 2, env_kwargs = ENV_KWARGS, on_episode = parallel.append)
+    # Summaries arrive as the workers finish them
+    assert sorted(serial, key = lambda summary: summary['seed']) == sorted(parallel, key = lambda summary: summary['seed'])
+    # Only the mean price, a float, depends on the order the summaries arrived in
+    assert pooled.pop('mean_price') == pytest.approx(result.pop('mean_price'))
+    assert pooled == result
+    assert result['episodes'] == 4
+    assert result['mean_trades'] > 0
+
+
+def test_stats_aggregate_the_summaries():
+    stats = EpisodeStats()
+    stats.add({ 'reward': 10, 'balances': { 'PLAYER': 10, 'ZIP0': 4 }, 'trades': 2, 'cancels': 6,
+                'mean_price': 50, 'min_price': 45, 'max_price': 55 })
+    stats.add({ 'reward': 0, 'balances': { 'PLAYER': 0, 'ZIP0': 2 }, 'trades': 0, 'cancels': 3,
+                'mean_price': None, 'min_price': None, 'max_price': None })
+    stats.add({ 'reward': 2, 'balances': { 'PLAYER': 2, 'ZIP0': 0 }, 'trades': 1, 'cancels': 0,
+                'mean_price': 62, 'min_price': 62, 'max_price': 62 })
+    assert stats.result() == { 'episodes': 3, 'mean_reward': 4, 'mean_balances': { 'PLAYER': 4, 'ZIP0': 2 },
+                               'mean_trades': 1, 'mean_cancels': 3, 'mean_price': 54, 'min_price': 45, 'max_price': 62 }
@@ -0,0 +1,286 @@
+import random
+import pytest
+from BristolStockGym import Environment
+from Exchange import Exchange, MultiExchange
+from Order import OType, Order
+from OrderBookHalf import OrderBookHalf
+from OrderBookLadder import OrderBookLadder
+
+ENGINES = [OrderBookHalf, OrderBookLadder]
+
+
+@pytest.mark.parametrize('book_class', ENGINES)
+def test_cancel_removes_the_order_and_records_it(book_class):
+    exchange = Exchange(1, 100, book_class)
+    qid = exchange.add_order(Order('B1', OType.BID, 40, 3, 0))
+    exchange.add_order(Order('B2', OType.BID, 40, 1, 0))
+    record = exchange.cancel(qid, 1)
+    assert record == { 'type': 'Cancel', 'time': 1, 'tid': 'B1', 'price': 40, 'qty': 3, 'qid': qid }
+    assert exchange.tape[-1] == record
+    assert qid not in exchange.quotes
+    assert exchange.bids.lob_anon == [[40, 1]]
+    # A quote i.d. that is not resting is ignored
+    assert exchange.cancel(qid, 2) == None
+    assert len(exchange.tape) == 1
+
+
+@pytest.mark.parametrize('book_class', ENGINES)
+def test_cancel_replace_moves_the_order(book_class):
+    exchange = Exchange(1, 100, book_class)
+    qid = exchange.add_order(Order('B1', OType.BID, 40, 3, 0))
+    exchange.add_order(Order('B2', OType.BID, 45, 1, 0))
+    assert exchange.cancel_replace(qid, 45, 1) == []
+    assert qid not in exchange.quotes
+    assert exchange.tape[-1]['qid'] == qid
+    # The replacement keeps the quantity and goes behind the order already at its price
+    new_order = exchange.bids.orders['B1']
+    assert (new_order.price, new_order.qty) == (45, 3)
+    assert exchange.quotes[new_order.qid] is new_order
+    assert exchange.bids.lob_anon == [[45, 4]]
+    fills = exchange.process_order(Order('S1', OType.ASK, 45, 2, 2), 2)
+    assert [(fill['party1'], fill['qty']) for fill in fills] == [('B2', 1), ('B1', 1)]
+
+
+def test_cancel_replace_can_trade():
+    exchange = Exchange(1, 100)
+    exchange.add_order(Order('S1', OType.ASK, 50, 1, 0))
+    qid = exchange.add_order(Order('B1', OType.BID, 40, 2, 0))
+    fills = exchange.cancel_replace(qid, 55, 1, qty = 1)
+    assert [(fill['price'], fill['qty']) for fill in fills] == [(50, 1)]
+    assert 'B1' not in exchange.bids.orders
+    assert exchange.cancel_replace(qid, 55, 2) == None
+
+
+@pytest.mark.parametrize('price, qty', [(0, None), (101, None), (50, 0), (50, -1)])
+def test_cancel_replace_validates_before_cancelling(price, qty):
+    exchange = Exchange(1, 100)
+    qid = exchange.add_order(Order('B1', OType.BID, 40, 3, 0))
+    with pytest.raises(RuntimeError):
+        exchange.cancel_replace(qid, price, 1, qty)
+    # The original order is still resting, and nothing was recorded
+    assert exchange.quotes[qid].price == 40
+    assert exchange.bids.lob_anon == [[40, 3]]
+    assert len(exchange.tape) == 0
+
+
+@pytest.mark.parametrize('book_class', ENGINES)
+def test_requote_records_the_replaced_order(book_class):
+    exchange = Exchange(1, 100, book_class)
+    first = exchange.add_order(Order('B1', OType.BID, 40, 1, 0))
+    exchange.process_order(Order('B1', OType.BID, 42, 1, 1), 1)
+    assert exchange.tape[-1] == { 'type': 'Cancel', 'time': 1, 'tid': 'B1', 'price': 40, 'qty': 1, 'qid': first }
+    assert len(exchange.quotes) == 1
+    assert exchange.bids.lob_anon == [[42, 1]]
+
+
+@pytest.mark.parametrize('book_class', ENGINES)
+def test_sweep_fills_levels_best_first_and_rests_the_remainder(book_class):
+    exchange = Exchange(1, 100, book_class)
+    exchange.process_order(Order('S1', OType.ASK, 20, 1, 0), 0)
+    exchange.process_order(Order('S2', OType.ASK, 15, 1, 0), 0)
+    exchange.process_order(Order('S3', OType.ASK, 20, 2, 0), 0)
+    exchange.process_order(Order('S4', OType.ASK, 30, 1, 0), 0)
+    fills = exchange.process_order(Order('B1', OType.BID, 21, 6, 1), 1)
+    assert [(fill['party1'], fill['party2'], fill['price'], fill['qty']) for fill in fills] == \
+        [('S2', 'B1', 15, 1), ('S1', 'B1', 20, 1), ('S3', 'B1', 20, 2)]
+    # The bid does not cross 30: what is left of it rests, and the filled asks left the quote index
+    assert exchange.bids.lob_anon == [[21, 2]]
+    assert exchange.asks.lob_anon == [[30, 1]]
+    assert sorted(order.tid for order in exchange.quotes.values()) == ['B1', 'S4']
+    assert len(exchange.tape) == 3
+
+
+@pytest.mark.parametrize('book_class', ENGINES)
+def test_partial_fill_of_a_resting_order_keeps_its_place(book_class):
+    exchange = Exchange(1, 100, book_class)
+    exchange.process_order(Order('S1', OType.ASK, 20, 3, 0), 0)
+    exchange.process_order(Order('S2', OType.ASK, 20, 1, 0), 0)
+    exchange.process_order(Order('B1', OType.BID, 20, 2, 1), 1)
+    assert exchange.asks.orders['S1'].qty == 1
+    fills = exchange.process_order(Order('B2', OType.BID, 20, 2, 2), 2)
+    assert [(fill['party1'], fill['qty']) for fill in fills] == [('S1', 1), ('S2', 1)]
+    assert exchange.asks.lob_anon == []
+    assert exchange.quotes == {}
+
+
+def test_last_trade_skips_the_cancellations_after_it():
+    exchange = Exchange(1, 100)
+    assert exchange.tape.view().last_trade() == None
+    exchange.process_order(Order('S1', OType.ASK, 50, 1, 0), 0)
+    trade = exchange.process_order(Order('B1', OType.BID, 50, 1, 1), 1)[0]
+    exchange.process_order(Order('B2', OType.BID, 40, 1, 2), 2)
+    exchange.process_order(Order('B2', OType.BID, 41, 1, 3), 3)
+    view = exchange.tape.view()
+    assert view[-1]['type'] == 'Cancel'
+    assert view.last_trade() == trade
+
+
+def test_public_lob_is_shared_until_the_exchange_changes():
+    exchange = Exchange(1, 100)
+    exchange.process_order(Order('B1', OType.BID, 40, 1, 0), 0)
+    lob = exchange.get_public_lob(1)
+    assert lob['bids'] == ((40, 1),) and lob['asks'] == ()
+    assert exchange.get_public_lob(1) is lob
+    # A new timestep, or any change to the books or the tape, publishes a new snapshot
+    assert exchange.get_public_lob(2) is not lob
+    lob = exchange.get_public_lob(2)
+    exchange.process_order(Order('S1', OType.ASK, 40, 1, 2), 2)
+    changed = exchange.get_public_lob(2)
+    assert changed is not lob and changed['version'] > lob['version']
+    assert changed['bids'] == () and len(changed['tape']) == 1
+    # The old snapshot is left as it was published
+    assert lob['bids'] == ((40, 1),) and len(lob['tape']) == 0
+    qid = exchange.add_order(Order('B2', OType.BID, 30, 1, 3))
+    lob = exchange.get_public_lob(3)
+    exchange.cancel(qid, 3)
+    assert exchange.get_public_lob(3)['bids'] == ()
+
+
+@pytest.mark.parametrize('qty', [0, -2])
+def test_orders_without_a_positive_quantity_are_rejected(qty):
+    exchange = Exchange(1, 100)
+    exchange.add_order(Order('S1', OType.ASK, 50, 1, 0))
+    with pytest.raises(RuntimeError):
+        exchange.process_order(Order('B1', OType.BID, 60, qty, 1), 1)
+    assert exchange.asks.lob_anon == [[50, 1]] and exchange.bids.lob_anon == []
+    assert len(exchange.tape) == 0
+
+
+def test_multi_unit_session_fills_each_order_at_most_once():
+    random.seed(10)
+    environment = Environment(max_time = 100, min_price = 1, max_price = 100)
+    environment.reset()
+    assigned = {}
+    for i, (tid, trader) in enumerate(environment.traders.items()):
+        trader.assign_order(environment._generate_order(tid, trader.otype, 0, qty = 1 + i % 3))
+        assigned[tid] = (trader.order.price, trader.order.qty)
+    done = False
+    while not done:
+        _observation, _reward, done, _info = environment.step(None)
+    traded = dict.fromkeys(assigned, 0)
+    benefit = dict.fromkeys(assigned, 0)
+    for record in environment.exchange.tape:
+        if record['type'] == 'Trade':
+            for tid in (record['party1'], record['party2']):
+                traded[tid] += record['qty']
+                sign = 1 if environment.traders[tid].otype == OType.BID else -1
+                benefit[tid] += sign * (assigned[tid][0] - record['price']) * record['qty']
+    # Some orders were filled in part, others completely
+    assert any(0 < traded[tid] < qty for tid, (price, qty) in assigned.items())
+    assert any(traded[tid] == qty > 1 for tid, (price, qty) in assigned.items())
+    for tid, trader in environment.traders.items():
+        if tid == 'PLAYER':
+            continue
+        # ZIP traders quote what is left of their order, so they never trade more than it
+        qty = assigned[tid][1]
+        assert traded[tid] <= qty
+        assert (trader.order == None) == (traded[tid] == qty)
+        if trader.order != None:
+            assert trader.order.qty == qty - traded[tid]
+        assert trader.balance == benefit[tid]
+
+
+def test_multi_exchange_routes_orders_to_their_instrument():
+    market = MultiExchange(['AAA'], 1, 100)
+    market.add_symbol('BBB', max_price = 50)
+    with pytest.raises(RuntimeError):
+        market.add_symbol('AAA')
+    with pytest.raises(RuntimeError):
+        market.process_order(Order('B1', OType.BID, 40, 1, 0, symbol = 'CCC'), 0)
+    market.process_order(Order('S1', OType.ASK, 40, 1, 0, symbol = 'AAA'), 0)
+    # Same trader, other instrument: a separate order, clipped to the range of its instrument
+    assert market.process_order(Order('S1', OType.ASK, 60, 1, 0, symbol = 'BBB'), 0) == []
+    assert market.exchanges['BBB'].asks.lob_anon == [[50, 1]]
+    fills = market.process_order(Order('B1', OType.BID, 45, 1, 1, symbol = 'AAA'), 1)
+    assert [(fill['price'], fill['party1'], fill['party2']) for fill in fills] == [(40, 'S1', 'B1')]
+    assert market.exchanges['BBB'].asks.lob_anon == [[50, 1]]
+    assert len(market.exchanges['BBB'].tape) == 0
+
+
+def test_multi_exchange_publishes_the_changed_instruments():
+    market = MultiExchange(['AAA', 'BBB'], 1, 100)
+    assert set(market.publish(0)) == { 'AAA', 'BBB' }
+    assert market.publish(1) == {}
+    qid = market.add_order(Order('B1', OType.BID, 30, 1, 1, symbol = 'BBB'))
+    updates = market.publish(1)
+    assert list(updates) == ['BBB'] and updates['BBB']['bids'] == ((30, 1),)
+    assert market.public_lobs['BBB'] is updates['BBB']
+    market.cancel('BBB', qid, 2)
+    assert market.publish(2)['BBB']['bids'] == ()
+    assert market.public_lobs['AAA']['time'] == 0
+
+
+def test_multi_exchange_call_auction_clears_each_instrument():
+    market = MultiExchange(['AAA', 'BBB'], 1, 100)
+    batch = [Order('B1', OType.BID, 50, 1, 0, symbol = 'AAA'), Order('S1', OType.ASK, 40, 1, 0, symbol = 'AAA'),
+             Order('B2', OType.BID, 20, 1, 0, symbol = 'BBB'), Order('S2', OType.ASK, 10, 1, 0, symbol = 'BBB')]
+    fills = market.process_orders(batch, 0, 'call')
+    assert [(fill['price'], fill['party1'], fill['party2']) for fill in fills] == [(45, 'B1', 'S1'), (15, 'B2', 'S2')]
+    with pytest.raises(RuntimeError):
+        market.process_orders(batch, 1, 'auction')
+
+
+@pytest.mark.parametrize('book_class', ENGINES)
+def test_clearing_price_and_volume(book_class):
+    exchange = Exchange(1, 100, book_class)
+    assert exchange.clearing_price() == (None, 0)
+    for tid, price, qty in (('B1', 60, 2), ('B2', 55, 1), ('B3', 40, 3)):
+        exchange.add_order(Order(tid, OType.BID, price, qty, 0))
+    exchange.add_order(Order('S1', OType.ASK, 61, 1, 0))
+    # The books do not cross
+    assert exchange.clearing_price() == (None, 0)
+    for tid, price, qty in (('S2', 50, 1), ('S3', 52, 1), ('S4', 58, 2)):
+        exchange.add_order(Order(tid, OType.ASK, price, qty, 0))
+    # 60x2 meets 50 and 52; 55 does not cross 58: the marginal bid is 60, the marginal ask 52
+    assert exchange.clearing_price() == (56, 2)
+
+
+@pytest.mark.parametrize('book_class', ENGINES)
+def test_call_auction_trades_at_one_price_in_price_time_priority(book_class):
+    exchange = Exchange(1, 100, book_class)
+    batch = [Order('B1', OType.BID, 60, 1, 0), Order('S1', OType.ASK, 45, 2, 0), Order('B2', OType.BID, 60, 2, 0),
+             Order('B3', OType.BID, 70, 1, 0), Order('S2', OType.ASK, 65, 1, 0), Order('S3', OType.ASK, 50, 1, 0)]
+    fills = exchange.process_orders(batch, 3, 'call')
+    assert [(fill['party1'], fill['party2'], fill['qty']) for fill in fills] == \
+        [('B3', 'S1', 1), ('B1', 'S1', 1), ('B2', 'S3', 1)]
+    assert { fill['price'] for fill in fills } == { 55 }
+    assert all(fill['time'] == 3 for fill in fills)
+    # What did not trade rests on the book
+    assert exchange.bids.lob_anon == [[60, 1]]
+    assert exchange.asks.lob_anon == [[65, 1]]
+    assert sorted(order.tid for order in exchange.quotes.values()) == ['B2', 'S2']
+    assert exchange.clear(4) == []
+
+
+def test_continuous_batch_matches_orders_processed_one_by_one():
+    batch = [Order('S1', OType.ASK, 45, 2, 0), Order('B1', OType.BID, 60, 1, 0), Order('S2', OType.ASK, 50, 1, 0),
+             Order('B2', OType.BID, 55, 3, 0)]
+    exchange = Exchange(1, 100)
+    fills = exchange.process_orders([order.copy() for order in batch], 0)
+    one_by_one = Exchange(1, 100)
+    expected = []
+    for order in batch:
+        expected.extend(one_by_one.process_order(order.copy(), 0))
+    assert fills == expected and len(fills) == 3
+    assert exchange.bids.lob_anon == one_by_one.bids.lob_anon == [[55, 1]]
+    with pytest.raises(RuntimeError):
+        exchange.process_orders(batch, 1, 'auction')
+
+
+def test_call_clearing_session():
+    random.seed(4)
+    environment = Environment(max_time = 100, min_price = 1, max_price = 100, replenish_orders = True, clearing = 'call')
+    environment.reset()
+    done = False
+    while not done:
+        _observation, _reward, done, _info = environment.step(None)
+    prices = {}
+    for record in environment.exchange.tape:
+        if record['type'] == 'Trade':
+            prices.setdefault(record['time'], set()).add(record['price'])
+    assert len(prices) > 0
+    # Every step's auction clears at a single price, and leaves a book that does not cross
+    assert all(len(step_prices) == 1 for step_prices in prices.values())
+    assert environment.exchange.clearing_price() == (None, 0)
+    with pytest.raises(RuntimeError):
+        Environment(clearing = 'sometimes')
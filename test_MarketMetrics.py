@@ -0,0 +1,82 @@
+import math
+import random
+from BristolStockGym import Environment
+from MarketMetrics import MarketMetrics
+from Order import OType, Order
+from Schedule import MarketSchedule
+from Trader import TType, Trader
+
+
+def make_trader(tid, ttype, otype, price, qty = 1):
+    trader = Trader(ttype, tid, 1, 100)
+    trader.assign_order(Order(tid, otype, price, qty, 0))
+    return trader
+
+
+def trade(metrics, price, qty, buyer, seller):
+    record = { 'type': 'Trade', 'time': 1, 'price': price, 'party1': buyer.tid, 'party2': seller.tid, 'qty': qty }
+    metrics.trade(record, buyer, seller)
+    buyer.notify_transaction(record)
+    seller.notify_transaction(record)
+
+
+def test_metrics_match_offline_computation():
+    metrics = MarketMetrics(equilibrium_price = 50)
+    buyers = [make_trader('B%d' % i, TType.ZIC, OType.BID, price) for i, price in enumerate((70, 60, 45))]
+    sellers = [make_trader('S%d' % i, TType.ZIP, OType.ASK, price) for i, price in enumerate((30, 40, 55))]
+    for trader in buyers + sellers:
+        metrics.assign(trader, trader.order)
+    trade(metrics, 52, 1, buyers[0], sellers[0])
+    trade(metrics, 47, 1, buyers[1], sellers[1])
+
+    report = metrics.report()
+    assert report['trades'] == 2
+    assert report['volume'] == 2
+    assert report['mean_price'] == 49.5
+    assert math.isclose(report['smiths_alpha'], 100 * math.sqrt((2 ** 2 + 3 ** 2) / 2) / 50)
+    # Equilibrium surplus: buyers 20 + 10, sellers 20 + 10
+    assert report['equilibrium_surplus'] == 60
+    assert report['surplus'] == 18 + 22 + 13 + 7
+    assert math.isclose(report['allocative_efficiency'], 1.0)
+    assert report['surplus_by_strategy'] == { 'ZIC': 31, 'ZIP': 29 }
+    profits = { t.tid: t.balance for t in buyers + sellers }
+    equilibrium = { 'B0': 20, 'B1': 10, 'B2': 0, 'S0': 20, 'S1': 10, 'S2': 0 }
+    dispersion = math.sqrt(sum((profits[tid] - equilibrium[tid]) ** 2 for tid in profits) / 6)
+    assert math.isclose(report['profit_dispersion'], dispersion)
+
+
+def test_units_beyond_the_order_carry_no_profit():
+    metrics = MarketMetrics(equilibrium_price = 50)
+    buyer = make_trader('B', TType.PLAYER, OType.BID, 100, 1)
+    seller = make_trader('S', TType.ZIC, OType.ASK, 40, 5)
+    trade(metrics, 48, 2, buyer, seller)
+    assert metrics.profits['B'] == 52 == buyer.balance
+    assert metrics.profits['S'] == 16 == seller.balance
+    assert metrics.surplus == 68
+
+
+def run(environment, n_steps):
+    for t in range(n_steps):
+        environment.step(None)
+    return environment.market_metrics.report()
+
+
+def test_environment_metrics_match_the_balances_and_replay():
+    random.seed(8)
+    schedule = MarketSchedule([{ 'from': 0, 'range': (60, 150) }], [{ 'from': 0, 'range': (50, 140) }], 10, 10)
+    metrics = MarketMetrics()
+    environment = Environment(max_time = 200, min_price = 1, max_price = 200, replenish_orders = True,
+                              schedule = schedule, market_metrics = metrics)
+    environment.reset()
+    before = run(environment, 5)
+    snapshot = environment.snapshot()
+    report = run(environment, 60)
+    assert report['trades'] == sum(record['type'] == 'Trade' for record in environment.exchange.tape) > 0
+    assert report['surplus'] == sum(trader.balance for trader in environment.traders.values())
+    assert report['allocative_efficiency'] != None and report['smiths_alpha'] != None
+    # Restoring the snapshot brings the metrics back with the market
+    environment.restore(snapshot)
+    assert metrics.report() == before and before['trades'] < report['trades']
+    assert run(environment, 60) == report
+    environment.reset()
+    assert metrics.trades == 0 and metrics.surplus == 0
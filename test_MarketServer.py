@@ -0,0 +1,53 @@
+import asyncio
+import random
+from MarketServer import MarketClient, MarketServer
+
+
+# ZIU-like agent, quoting anywhere in the price range; returns the ticks it received
+async def agent(server, address):
+    client = MarketClient()
+    await client.connect(host = address[0], port = address[1])
+    ticks = []
+    while True:
+        message = await client.receive()
+        if message == None:
+            break
+        ticks.append(message)
+        # The agent's book is the public book of the exchange
+        lob = server.environment.exchange.get_public_lob(message['time'])
+        assert client.bids == dict(lob['bids']) and client.asks == dict(lob['asks'])
+        if message['done']:
+            break
+        order = message['trader']['order']
+        if order == None:
+            await client.act(message['time'])
+        else:
+            await client.act(message['time'], random.randint(1, 100), order['qty'])
+    await client.close()
+    return client.tid, ticks
+
+
+def run_market(n_agents):
+    async def main():
+        server = MarketServer(n_agents, tick_timeout = 1.0, max_time = 40, min_price = 1, max_price = 100, replenish_orders = True)
+        address = await server.start()
+        results = await asyncio.gather(server.run(), *[agent(server, address) for i in range(n_agents)])
+        await server.close()
+        return server, results[0], results[1:]
+    return asyncio.run(main())
+
+
+def test_rewards_follow_environment_step():
+    random.seed(4)
+    server, balances, agents = run_market(2)
+    assert sorted(tid for tid, _ticks in agents) == ['PLAYER', 'PLAYER1']
+    trades = 0
+    for tid, ticks in agents:
+        assert ticks[-1]['done'] and ticks[-1]['trader']['balance'] == balances[tid]
+        for tick in ticks:
+            traded = any(record['type'] == 'Trade' and tid in (record['party1'], record['party2']) for record in tick['tape'])
+            # The balance at the ticks following a trade of the agent, 0 at the others
+            assert tick['reward'] == (tick['trader']['balance'] if traded else 0)
+            trades += traded
+    assert trades > 0
+    assert server.missed == { 'PLAYER': 0, 'PLAYER1': 0 }
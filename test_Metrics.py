@@ -0,0 +1,58 @@
+import json
+import random
+from BristolStockGym import Environment
+from Metrics import StepMetrics
+
+
+def run(metrics, steps, **kwargs):
+    random.seed(3)
+    environment = Environment(max_time = steps, min_price = 1, max_price = 100, replenish_orders = True,
+                              metrics = metrics, **kwargs)
+    environment.reset()
+    done = False
+    while not done:
+        _observation, _reward, done, _info = environment.step(None)
+    return environment
+
+
+def test_counts_match_the_tape():
+    metrics = StepMetrics()
+    environment = run(metrics, 60)
+    report = metrics.report()
+    tape = [record['type'] for record in environment.exchange.tape]
+    assert report['steps'] == 60 == len(metrics.history)
+    assert report['trades'] == tape.count('Trade') > 0
+    assert report['cancels'] == tape.count('Cancel') > 0
+    assert report['trades'] == sum(step['trades'] for step in metrics.history)
+    assert report['cancels'] == sum(step['cancels'] for step in metrics.history)
+    assert report['orders'] == sum(step['orders'] for step in metrics.history) == report['match_calls'] > 0
+    assert set(report['phase_time']) == set(StepMetrics.PHASES)
+    assert report['total_time'] == sum(report['phase_time'].values()) > 0
+    assert report['phase_time']['match'] > 0 and report['phase_time']['update'] > 0
+
+
+def test_history_is_bounded():
+    metrics = StepMetrics(history = 5)
+    run(metrics, 20)
+    assert metrics.steps == 20
+    assert [step['time'] for step in metrics.history] == list(range(16, 21))
+    metrics.reset()
+    assert metrics.report()['steps'] == 0 and len(metrics.history) == 0
+
+
+def test_call_auction_counts_the_batch():
+    metrics = StepMetrics()
+    run(metrics, 20, clearing = 'call')
+    # One process_orders call per step, for all the orders of the step
+    assert metrics.match_calls == 20
+    assert metrics.orders >= 20
+
+
+def test_export(tmp_path):
+    metrics = StepMetrics()
+    run(metrics, 10)
+    fname = str(tmp_path / 'metrics.json')
+    metrics.export(fname, include_history = True)
+    with open(fname) as report_file:
+        report = json.load(report_file)
+    assert report['steps'] == 10 and len(report['history']) == 10
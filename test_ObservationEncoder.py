@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from Exchange import Exchange
+from ObservationEncoder import ObservationEncoder
+from Order import OType, Order
+from Tape import RECENT_TRADES
+from Trader import TType, Trader
+
+
+def test_encoding_matches_the_book_and_the_tape():
+    exchange = Exchange(1, 100)
+    for i, price in enumerate((40, 42, 38, 42)):
+        exchange.add_order(Order('B%d' % i, OType.BID, price, 1 + i, 0))
+    exchange.add_order(Order('S0', OType.ASK, 60, 2, 0))
+    # Two trades, with a cancellation recorded after them
+    exchange.process_order(Order('S1', OType.ASK, 30, 1, 1), 1)
+    exchange.process_order(Order('B9', OType.BID, 70, 1, 2), 2)
+    exchange.cancel(exchange.bids.orders['B2'].qid, 3)
+    trader = Trader(TType.PLAYER, 'PLAYER', 1, 100)
+    trader.assign_order(Order('PLAYER', OType.ASK, 55, 3, 0))
+    trader.balance = 7
+
+    encoder = ObservationEncoder(depth = 3, trades = 3)
+    observation = encoder.encode(exchange, trader, 4)
+    assert observation.tolist() == [4, -1, 55, 3, 7,
+                                    42, 40, 0, 5, 1, 0,
+                                    60, 0, 0, 1, 0, 0,
+                                    60, 42, 0]
+    assert observation is encoder.buffer
+    assert encoder.ask_prices.tolist() == [60, 0, 0]
+
+    # Without an order the side, limit and quantity are 0
+    trader.order = None
+    assert encoder.encode(exchange, trader, 5)[:5].tolist() == [5, 0, 0, 0, 7]
+
+
+def test_only_recent_trades_are_encoded():
+    exchange = Exchange(1, 100)
+    for t in range(RECENT_TRADES + 10):
+        exchange.add_order(Order('S', OType.ASK, 1 + t % 90, 1, t))
+        exchange.process_order(Order('B', OType.BID, 100, 1, t), t)
+    encoder = ObservationEncoder(depth = 1, trades = RECENT_TRADES)
+    prices = encoder.encode(exchange, Trader(TType.PLAYER, 'PLAYER', 1, 100), 0)[9:]
+    assert prices.tolist() == [1 + t % 90 for t in reversed(range(10, RECENT_TRADES + 10))]
+
+
+def test_writes_into_a_given_buffer():
+    out = np.zeros((2, 5 + 4 * 2 + 3))
+    encoder = ObservationEncoder(depth = 2, trades = 3, out = out[1])
+    exchange = Exchange(1, 100)
+    exchange.add_order(Order('B0', OType.BID, 30, 1, 0))
+    encoder.encode(exchange, Trader(TType.PLAYER, 'PLAYER', 1, 100), 2)
+    assert out[1][0] == 2 and out[1][5] == 30
+    assert not out[0].any()
+
+
+@pytest.mark.parametrize('kwargs', [{ 'trades': RECENT_TRADES + 1 }, { 'out': np.zeros(3) },
+                                    { 'out': np.zeros(5 + 4 * 5 + 10, dtype = np.float32) }])
+def test_rejects_bad_arguments(kwargs):
+    with pytest.raises(RuntimeError):
+        ObservationEncoder(**kwargs)
@@ -0,0 +1,53 @@
+import random
+import pytest
+from Order import OType, Order
+from OrderBookHalf import OrderBookHalf
+
+
+# State of the book as build_lob rebuilds it from its orders
+def rebuilt(book):
+    copy = book.fork()
+    copy.build_lob()
+    return copy
+
+
+@pytest.mark.parametrize('side', [OType.BID, OType.ASK])
+def test_incremental_levels_match_a_rebuild(side):
+    rng = random.Random(side)
+    book = OrderBookHalf(side, 1, 60)
+    for step in range(2000):
+        tid = 'T%d' % rng.randint(0, 25)
+        r = rng.random()
+        if r < 0.6:
+            book.add_order(Order(tid, side, rng.randint(1, 60), rng.randint(1, 3), step))
+        elif r < 0.8 and tid in book.orders:
+            book.del_order(book.orders[tid])
+        elif book.orders:
+            book.delete_best()
+        reference = rebuilt(book)
+        assert book.prices == reference.prices
+        assert book.lob_anon == reference.lob_anon
+        assert { price: (level[0], [entry[2] for entry in level[1]]) for price, level in book.lob.items() } == \
+            { price: (level[0], [entry[2] for entry in level[1]]) for price, level in reference.lob.items() }
+
+
+def test_levels_keep_time_priority():
+    book = OrderBookHalf(OType.ASK, 1, 100)
+    assert book.add_order(Order('S1', OType.ASK, 20, 1, 0)) == 'Addition'
+    book.add_order(Order('S2', OType.ASK, 20, 2, 1))
+    book.add_order(Order('S3', OType.ASK, 15, 1, 2))
+    assert book.lob_anon == [[15, 1], [20, 3]]
+    assert book.get_best() == (15, 'S3')
+    # An overwrite keeps the place of the order it replaces
+    assert book.add_order(Order('S1', OType.ASK, 20, 4, 3)) == 'Overwrite'
+    assert [entry[2] for entry in book.lob[20][1]] == ['S1', 'S2']
+    assert book.lob_anon == [[15, 1], [20, 6]]
+    assert book.delete_best() == 'S3'
+    assert book.get_best() == (20, 'S1')
+
+
+def test_prices_are_clipped_to_the_range():
+    book = OrderBookHalf(OType.BID, 10, 20)
+    book.add_order(Order('B1', OType.BID, 5, 1, 0))
+    book.add_order(Order('B2', OType.BID, 25, 1, 0))
+    assert book.lob_anon == [[20, 1], [10, 1]]
@@ -0,0 +1,64 @@
+import random
+import pytest
+from Order import OType, Order
+from OrderBookHalf import OrderBookHalf
+from OrderBookLadder import OrderBookLadder
+
+
+# Random additions, overwrites, deletions and partial fills, applied to both engines
+@pytest.mark.parametrize('side', [OType.BID, OType.ASK])
+def test_ladder_matches_half_book(side):
+    rng = random.Random(side)
+    half = OrderBookHalf(side, 1, 50)
+    ladder = OrderBookLadder(side, 1, 50)
+    for step in range(3000):
+        r = rng.random()
+        tid = 'T%d' % rng.randint(0, 30)
+        if r < 0.5:
+            # Prices out of range are clipped by both books
+            order = Order(tid, side, rng.randint(-5, 55), rng.randint(1, 4), step)
+            assert half.add_order(order.copy()) == ladder.add_order(order.copy())
+        elif r < 0.7 and tid in half.orders:
+            half.del_order(half.orders[tid])
+            ladder.del_order(ladder.orders[tid])
+        elif r < 0.9 and tid in half.orders:
+            qty = rng.randint(1, 3)
+            assert half.reduce_order(tid, qty) == ladder.reduce_order(tid, qty)
+        elif half.orders:
+            assert half.delete_best() == ladder.delete_best()
+        assert ladder.lob_anon == half.lob_anon
+        assert ladder.get_best() == half.get_best()
+
+    lob_anon = [list(level) for level in ladder.lob_anon]
+    ladder.build_lob()
+    assert ladder.lob_anon == lob_anon
+    ladder.anonymize_lob()
+    assert ladder.lob_anon == lob_anon
+
+
+def test_levels_are_updated_in_place():
+    ladder = OrderBookLadder(OType.BID, 1, 100000)
+    ladder.add_order(Order('B1', OType.BID, 10, 2, 0))
+    ladder.add_order(Order('B2', OType.BID, 99990, 1, 0))
+    ladder.add_order(Order('B3', OType.BID, 10, 1, 0))
+    assert ladder.lob_anon == [[99990, 1], [10, 3]]
+    ladder.reduce_order('B1', 1)
+    assert ladder.lob_anon == [[99990, 1], [10, 2]]
+    ladder.del_order(ladder.orders['B2'])
+    assert ladder.lob_anon == [[10, 2]]
+    assert ladder.get_best() == (10, 'B1')
+    ladder.reduce_order('B1', 1)
+    ladder.del_order(ladder.orders['B3'])
+    assert ladder.lob_anon == []
+    assert ladder.get_best() == (None, None)
+
+
+def test_fork_is_independent():
+    ladder = OrderBookLadder(OType.ASK, 1, 100)
+    ladder.add_order(Order('S1', OType.ASK, 20, 2, 0))
+    fork = ladder.fork()
+    fork.reduce_order('S1', 1)
+    fork.add_order(Order('S2', OType.ASK, 15, 1, 1))
+    assert ladder.lob_anon == [[20, 2]]
+    assert ladder.orders['S1'].qty == 2
+    assert fork.lob_anon == [[15, 1], [20, 1]]
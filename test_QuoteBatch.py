@@ -0,0 +1,75 @@
+import random
+import numpy as np
+import pytest
+from Giveaway import Giveaway
+from Order import OType, Order
+from QuoteBatch import QuoteBatch
+from Trader import TType
+from ZIC import ZIC
+from ZIU import ZIU
+
+STRATEGIES = { TType.ZIC: ZIC, TType.ZIU: ZIU, TType.GVWY: Giveaway }
+
+
+# Generator with the interface QuoteBatch draws from, taking its numbers from random.Random(seed) one trader
+# at a time, so that a batch draws what the traders' action() draw from the random module with the same seed
+class RandomIntegers:
+
+    def __init__(self, seed):
+        self.random = random.Random(seed)
+
+    def integers(self, low, high, size = None, endpoint = True):
+        if size != None:
+            low = np.full(size, low)
+            high = np.full(size, high)
+        return np.array([self.random.randint(a, b) for a, b in zip(low, high)], dtype = np.int64)
+
+
+def make_traders(ttype, rng):
+    traders = []
+    for i in range(40):
+        trader = STRATEGIES[ttype](ttype, '%s%d' % (ttype.name, i), 1, 100)
+        # Every fifth trader has no order
+        if i % 5 != 4:
+            otype = OType.BID if i % 2 == 0 else OType.ASK
+            trader.assign_order(Order(trader.tid, otype, rng.randint(1, 100), 1, 0))
+        traders.append(trader)
+    return traders
+
+
+@pytest.mark.parametrize('ttype', list(STRATEGIES))
+def test_batched_quotes_equal_unbatched(ttype):
+    unbatched = make_traders(ttype, random.Random(1))
+    batched = make_traders(ttype, random.Random(1))
+    batch = QuoteBatch(ttype, 1, 100, capacity = 4, rng = RandomIntegers(7))
+    for trader in batched:
+        batch.add(trader)
+
+    random.seed(7)
+    for time in range(1, 30):
+        batch.quote(time)
+        for trader, batched_trader in zip(unbatched, batched):
+            order = trader.action(None, time)
+            batched_order = batch.order(batched_trader.batch_index, time)
+            if order == None:
+                assert batched_order == None
+            else:
+                assert (batched_order.tid, batched_order.otype, batched_order.price, batched_order.qty, batched_order.time) == \
+                    (order.tid, order.otype, order.price, order.qty, order.time)
+        # Fills and new orders reach the batch through the traders
+        k = time % len(batched)
+        if batched[k].order != None:
+            fill = { 'type': 'Trade', 'time': time, 'price': batched[k].order.price, 'party1': 'X', 'party2': batched[k].tid, 'qty': 1 }
+            unbatched[k].notify_transaction(fill)
+            batched[k].notify_transaction(fill)
+        elif time % 3 == 0:
+            unbatched[k].assign_order(Order(unbatched[k].tid, OType.ASK, 50, 1, time))
+            batched[k].assign_order(Order(batched[k].tid, OType.ASK, 50, 1, time))
+
+
+def test_only_zero_intelligence_traders_are_batched():
+    with pytest.raises(RuntimeError):
+        QuoteBatch(TType.ZIP)
+    batch = QuoteBatch(TType.ZIC)
+    with pytest.raises(RuntimeError):
+        batch.add(ZIU(TType.ZIU, 'ZIU0'))
@@ -0,0 +1,73 @@
+import random
+import BristolStockGym
+from BristolStockGym import Environment
+from Order import OType, Order
+from OrderBookLadder import OrderBookLadder
+from Replay import BookRecorder, ReplayEnvironment
+
+
+def frame(lob):
+    return (lob['time'], tuple(lob['bids']), tuple(lob['asks']), list(lob['tape']))
+
+
+# Run recorded sessions with a ZIC player; returns the public LOB of every step of each session
+def record(fname, sessions = 2, max_time = 60, keyframe_interval = 7, **kwargs):
+    random.seed(5)
+    recorder = BookRecorder(fname, keyframe_interval)
+    environment = Environment(max_time = max_time, min_price = 1, max_price = 100, replenish_orders = True,
+                              book_recorder = recorder, **kwargs)
+    live = []
+    for session in range(sessions):
+        observation = environment.reset()
+        frames = [frame(observation['lob'])]
+        done = False
+        while not done:
+            observation, _reward, done, _info = environment.step(BristolStockGym.zic_strategy(observation))
+            frames.append(frame(observation['lob']))
+        live.append(frames)
+    recorder.close()
+    return live
+
+
+def test_replayed_frames_match_live_lob(tmp_path):
+    for kwargs in ({}, { 'book_class': OrderBookLadder, 'clearing': 'call' }):
+        fname = str(tmp_path / 'session.bin')
+        live = record(fname, **kwargs)
+        replay = ReplayEnvironment(fname)
+        assert replay.n_sessions == len(live)
+        for session, frames in enumerate(live):
+            observation = replay.reset(session)
+            replayed = [frame(observation['lob'])]
+            done = False
+            while not done:
+                observation, _reward, done, _info = replay.step(None)
+                replayed.append(frame(observation['lob']))
+            assert replayed == frames
+        replay.close()
+
+
+def test_seek_lands_on_the_frame_of_a_timestep(tmp_path):
+    fname = str(tmp_path / 'session.bin')
+    live = record(fname, sessions = 1, max_time = 80)
+    replay = ReplayEnvironment(fname)
+    replay.reset()
+    for time in [0, 1, 2, 13, 14, 40, 7, 80, 81, 200, 3]:
+        expected = [f for f in live[0] if f[0] <= time] or [live[0][0]]
+        assert frame(replay.seek(time)['lob']) == expected[-1]
+    replay.close()
+
+
+def test_player_fills_are_capped_at_its_order(tmp_path):
+    fname = str(tmp_path / 'session.bin')
+    record(fname, sessions = 1)
+    replay = ReplayEnvironment(fname, order = Order('PLAYER', OType.BID, 100, 1, 0))
+    observation = replay.reset()
+    while not observation['lob']['asks']:
+        observation, _reward, _done, _info = replay.step(None)
+    best_ask = observation['lob']['asks'][0][0]
+    observation, reward, _done, _info = replay.step(Order('PLAYER', OType.BID, 100, 50, observation['lob']['time']))
+    assert observation['trader'].balance == 100 - best_ask
+    # Rewards follow Environment.step: the balance at a step the player trades
+    assert reward == observation['trader'].balance
+    assert observation['trader'].order == None
+    replay.close()
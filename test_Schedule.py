@@ -0,0 +1,84 @@
+import random
+import numpy as np
+import pytest
+from BristolStockGym import Environment
+from Order import OType
+from Schedule import MarketSchedule
+
+
+# Equilibrium of one period, unit by unit
+def brute_force_equilibrium(buyer_limits, seller_limits):
+    demand = sorted(buyer_limits, reverse = True)
+    supply = sorted(seller_limits)
+    q = 0
+    surplus = 0
+    while q < min(len(demand), len(supply)) and demand[q] >= supply[q]:
+        surplus += demand[q] - supply[q]
+        q += 1
+    return q, surplus, demand, supply
+
+
+def test_fixed_steps():
+    schedule = MarketSchedule([{ 'from': 0, 'range': (60, 140) }], [{ 'from': 0, 'range': (60, 140) }], 5, 3)
+    assert schedule.buyer_list == [[140, 120, 100, 80, 60]]
+    assert schedule.seller_list == [[60, 100, 140]]
+    # Two units trade, at any price between the second seller (100) and the second buyer (120)
+    assert schedule.equilibrium(0) == (110.0, 2, 100)
+
+
+@pytest.mark.parametrize('stepmode', ['jittered', 'random'])
+def test_equilibrium_matches_a_unit_by_unit_count(stepmode):
+    rng = np.random.default_rng(3)
+    for n in range(50):
+        n_buyers, n_sellers = rng.integers(1, 12, size = 2)
+        demand = [{ 'from': 0, 'range': tuple(sorted(rng.integers(1, 200, size = 2))), 'stepmode': stepmode }]
+        supply = [{ 'from': 0, 'range': tuple(sorted(rng.integers(1, 200, size = 2))), 'stepmode': stepmode }]
+        schedule = MarketSchedule(demand, supply, n_buyers, n_sellers, rng = rng)
+        price, q, surplus = schedule.equilibrium(0)
+        expected_q, expected_surplus, sorted_demand, sorted_supply = brute_force_equilibrium(schedule.buyer_list[0], schedule.seller_list[0])
+        assert (q, surplus) == (expected_q, expected_surplus)
+        if q == 0:
+            assert price == None
+        else:
+            # The price lets the q units trade
+            assert sorted_supply[q - 1] <= price <= sorted_demand[q - 1]
+        assert all(demand[0]['range'][0] <= limit <= demand[0]['range'][1] for limit in schedule.buyer_list[0])
+
+
+def test_periods_start_at_every_change_of_either_schedule():
+    demand = [{ 'from': 50, 'range': (100, 100) }, { 'from': 0, 'range': (80, 80) }]
+    supply = [{ 'from': 0, 'range': (40, 40) }, { 'from': 20, 'range': (60, 60) }]
+    schedule = MarketSchedule(demand, supply, 2, 2)
+    assert schedule.start_list == [0, 20, 50]
+    assert [schedule.period(time) for time in (-5, 0, 19, 20, 49, 50, 1000)] == [0, 0, 0, 1, 1, 2, 2]
+    assert [schedule.limit(True, 1, time) for time in (0, 20, 50)] == [80, 80, 100]
+    assert [schedule.limit(False, 0, time) for time in (0, 20, 50)] == [40, 60, 60]
+    assert [schedule.equilibrium(time) for time in (0, 20, 50)] == [(60.0, 2, 80), (70.0, 2, 40), (80.0, 2, 80)]
+
+
+@pytest.mark.parametrize('demand, n_buyers', [([{ 'from': 0, 'range': (10, 5) }], 2),
+                                              ([{ 'from': 0, 'range': (5, 10), 'stepmode': 'stairs' }], 2),
+                                              ([{ 'from': 0, 'range': (5, 10) }], 0)])
+def test_bad_schedules_are_rejected(demand, n_buyers):
+    with pytest.raises(RuntimeError):
+        MarketSchedule(demand, [{ 'from': 0, 'range': (5, 10) }], n_buyers, 2)
+
+
+def test_environment_takes_its_limit_prices_from_the_schedule():
+    random.seed(0)
+    demand = [{ 'from': 0, 'range': (60, 150) }, { 'from': 10, 'range': (110, 200) }]
+    supply = [{ 'from': 0, 'range': (50, 140) }]
+    schedule = MarketSchedule(demand, supply, 10, 10)
+    environment = Environment(max_time = 30, min_price = 1, max_price = 300, replenish_orders = True, schedule = schedule)
+    environment.reset()
+    assert environment.equilibrium() == schedule.equilibrium(0)
+    for tid, trader in environment.traders.items():
+        slot = environment.schedule_slots[tid]
+        assert trader.order.price == schedule.limit(trader.otype == OType.BID, slot, 0)
+    done = False
+    while not done:
+        _observation, _reward, done, _info = environment.step(None)
+    # Orders given after the shock have the limit prices of the new period
+    for tid, trader in environment.traders.items():
+        if trader.order != None and trader.order.time >= 10:
+            assert trader.order.price == schedule.limit(trader.otype == OType.BID, environment.schedule_slots[tid], trader.order.time)
@@ -0,0 +1,72 @@
+import random
+import numpy as np
+import pytest
+from BristolStockGym import Environment
+from ObservationEncoder import ObservationEncoder
+from SubprocVecEnvironment import SubprocVecEnvironment
+
+KWARGS = { 'max_time': 15, 'min_price': 1, 'max_price': 100, 'replenish_orders': True }
+
+
+@pytest.fixture
+def vec():
+    vec = SubprocVecEnvironment(2, seed = 4, **KWARGS)
+    yield vec
+    vec.close()
+
+
+# Market k stepped in this process, seeded as SubprocVecEnvironment seeds its worker
+def local_steps(seed, n_steps):
+    random.seed(seed)
+    env = Environment(observation_encoder = ObservationEncoder(), **KWARGS)
+    observations = [env.reset().copy()]
+    steps = []
+    for t in range(n_steps):
+        observation, reward, done, info = env.step(None)
+        steps.append((reward, done, info if done else None))
+        if done:
+            observation = env.reset()
+        observations.append(observation.copy())
+    return observations, steps
+
+
+def test_workers_step_the_markets_they_are_seeded_with(vec):
+    observations = [vec.reset()]
+    steps = []
+    for t in range(20):
+        next_observations, rewards, dones, infos = vec.step([None, None])
+        observations.append(next_observations)
+        steps.append((rewards.tolist(), dones.tolist(), [info.get('balances') for info in infos]))
+
+    seeds = random.Random(4)
+    for k in range(2):
+        local_observations, local = local_steps(seeds.getrandbits(64), 20)
+        assert np.array_equal(np.array([observation[k] for observation in observations]), np.array(local_observations))
+        assert [(rewards[k], dones[k], balances[k]) for rewards, dones, balances in steps] == local
+    # Each market finished once and was reset
+    assert sum(done for _rewards, dones, _balances in steps for done in dones) == 2
+
+
+def test_step_wait_returns_the_markets_that_finished(vec):
+    vec.reset()
+    vec.step_async([None], indices = [1])
+    with pytest.raises(RuntimeError):
+        vec.step_async([None], indices = [1])
+    indices, observations, rewards, dones, infos = vec.step_wait()
+    assert indices.tolist() == [1]
+    assert observations.shape == (1, vec.observation_size)
+    with pytest.raises(RuntimeError):
+        vec.step_async([None])
+
+
+def test_a_dead_worker_is_restarted(vec):
+    vec.reset()
+    vec.processes[0].kill()
+    vec.processes[0].join()
+    _observations, rewards, dones, infos = vec.step([None, None])
+    assert dones[0] and infos[0]['restarted']
+    assert rewards[0] == 0
+    assert not infos[1].get('restarted')
+    # The new worker steps a fresh market
+    _observations, _rewards, dones, infos = vec.step([None, None])
+    assert not dones[0] and infos[0] == {}
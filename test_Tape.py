@@ -0,0 +1,83 @@
+import pytest
+from Tape import Tape
+
+
+def fill(tape, n, price = 0):
+    for i in range(n):
+        tape.append_trade(i, price + i, 1, 'B%d' % i, 'S%d' % i)
+
+
+@pytest.mark.parametrize('end', ['clear', 'close'])
+def test_fork_reads_spilled_records_after_the_parent_ends(end):
+    tape = Tape(window = 8, segment_size = 4)
+    fill(tape, 40)
+    assert tape.base > 0
+    fork = tape.fork()
+    getattr(tape, end)()
+    assert [record['price'] for record in fork] == list(range(40))
+    fork.close()
+
+
+def test_fork_keeps_its_records_when_the_parent_reuses_its_spill_path(tmp_path):
+    path = str(tmp_path / 'spill')
+    tape = Tape(window = 8, segment_size = 4, spill_path = path)
+    fill(tape, 40)
+    fork = tape.fork()
+    tape.clear()
+    fill(tape, 40, price = 1000)
+    assert [record['price'] for record in fork] == list(range(40))
+    assert [record['price'] for record in tape] == list(range(1000, 1040))
+    fork.close()
+    tape.close()
+
+
+def test_fork_of_a_fork_reads_both_spill_files():
+    tape = Tape(window = 8, segment_size = 4)
+    fill(tape, 20)
+    fork = tape.fork()
+    fill(fork, 20, price = 20)
+    second = fork.fork()
+    tape.close()
+    fork.close()
+    assert [record['price'] for record in second] == list(range(40))
+
+
+def test_view_reads_only_retained_records():
+    tape = Tape(window = 8, segment_size = 4, spill = False)
+    fill(tape, 20)
+    view = tape.view()
+    assert tape.first_retained() == 16
+    assert [record['price'] for record in view[16:]] == list(range(16, 20))
+    assert view[-1]['price'] == 19
+    with pytest.raises(IndexError, match = 'record 15 is no longer retained'):
+        view[15]
+    with pytest.raises(IndexError, match = 'no longer retained'):
+        view[:]
+    with pytest.raises(IndexError, match = 'no longer retained'):
+        list(view)
+    with pytest.raises(IndexError, match = 'out of range'):
+        view[20]
+
+
+def test_view_is_invalidated_by_clear():
+    tape = Tape()
+    fill(tape, 5)
+    view = tape.view()
+    tape.clear()
+    fill(tape, 6, price = 100)
+    with pytest.raises(IndexError, match = 'cleared'):
+        view[0]
+    with pytest.raises(IndexError, match = 'cleared'):
+        view.last_trade()
+    assert tape.view()[0]['price'] == 100
+
+
+def test_view_is_a_snapshot_of_its_length():
+    tape = Tape()
+    fill(tape, 3)
+    view = tape.view()
+    tape.append_cancel(3, 'B0', 10, 1, 7)
+    assert len(view) == 3
+    assert [record['type'] for record in view] == ['Trade'] * 3
+    assert view.last_trade()['price'] == 2
+    assert tape.view().last_trade()['price'] == 2
@@ -0,0 +1,89 @@
+import csv
+import pytest
+from Tape import RECORD_STRUCT, Tape
+from TapeWriter import BinaryTapeWriter, CSVTapeWriter
+
+
+def fill(tape, n, start = 0):
+    for i in range(start, start + n):
+        if i % 3 == 2:
+            tape.append_cancel(i, 'B%d' % (i % 4), 10 + i, 1, i)
+        else:
+            tape.append_trade(i, 10 + i, 1 + i % 2, 'B%d' % (i % 4), 'S%d' % (i % 5))
+
+
+def read_binary(fname):
+    with open(fname + '.tids') as tids_file:
+        tids = tids_file.read().splitlines()
+    with open(fname, 'rb') as file:
+        data = file.read()
+    records = []
+    for rtype, time, price, qty, party1, party2, qid in RECORD_STRUCT.iter_unpack(data):
+        records.append((rtype, time, price, qty, tids[party1] if party1 >= 0 else None,
+                        tids[party2] if party2 >= 0 else None, qid))
+    return records
+
+
+def as_rows(tape):
+    return [(row[0], row[1], row[2], row[3], tape.tid_name(row[4]), tape.tid_name(row[5]), row[6])
+            for row in (tape.row(i) for i in range(len(tape)))]
+
+
+@pytest.mark.parametrize('background', [False, True])
+def test_binary_writer_streams_every_record(tmp_path, background):
+    fname = str(tmp_path / 'tape.bin')
+    tape = Tape(chunk_size = 7)
+    writer = BinaryTapeWriter(fname, background = background)
+    tape.add_writer(writer)
+    fill(tape, 50)
+    tape.flush()
+    writer.close()
+    assert read_binary(fname) == as_rows(tape)
+
+
+def test_binary_writer_appends_with_the_same_trader_ids(tmp_path):
+    fname = str(tmp_path / 'tape.bin')
+    first = Tape()
+    writer = BinaryTapeWriter(fname, background = False)
+    fill(first, 10)
+    first.dump(writer)
+    writer.close()
+    # A second session, whose tape numbers the traders differently
+    second = Tape()
+    second.tid_code('S4')
+    fill(second, 10, start = 10)
+    writer = BinaryTapeWriter(fname, 'a', background = False)
+    second.dump(writer)
+    writer.close()
+    assert read_binary(fname) == as_rows(first) + as_rows(second)
+
+
+def test_csv_writer(tmp_path):
+    fname = str(tmp_path / 'tape.csv')
+    tape = Tape(chunk_size = 4)
+    writer = CSVTapeWriter(fname)
+    tape.add_writer(writer)
+    fill(tape, 9)
+    tape.remove_writer(writer)
+    writer.close()
+    with open(fname) as file:
+        rows = list(csv.DictReader(file))
+    assert len(rows) == 9
+    assert rows[0] == { 'type': 'Trade', 'time': '0', 'price': '10', 'qty': '1', 'party1': 'B0', 'party2': 'S0', 'qid': '' }
+    assert rows[2] == { 'type': 'Cancel', 'time': '2', 'price': '12', 'qty': '1', 'party1': 'B2', 'party2': '', 'qid': '2' }
+    # Appending does not repeat the header
+    writer = CSVTapeWriter(fname, 'a', background = False)
+    tape.dump(writer)
+    writer.close()
+    with open(fname) as file:
+        assert len(list(csv.DictReader(file))) == 18
+
+
+def test_writer_errors_are_raised(tmp_path):
+    writer = BinaryTapeWriter(str(tmp_path / 'tape.bin'))
+    # A party id the writer is not given the name of
+    writer.write_rows([(0, 0, 10, 1, 5, -1, -1)], [])
+    with pytest.raises(RuntimeError):
+        writer.flush()
+    with pytest.raises(RuntimeError):
+        writer.close()
@@ -0,0 +1,75 @@
+from Exchange import Exchange
+from Order import OType, Order
+from Trader import TType, Trader
+
+
+def make_trader(otype, price, qty):
+    trader = Trader(TType.PLAYER, 'PLAYER', 1, 100)
+    trader.assign_order(Order('PLAYER', otype, price, qty, 0))
+    return trader
+
+
+def trade(price, qty):
+    return { 'type': 'Trade', 'time': 1, 'price': price, 'party1': 'X', 'party2': 'PLAYER', 'qty': qty }
+
+
+def test_partial_fill_keeps_the_rest_of_the_order():
+    trader = make_trader(OType.BID, 60, 3)
+    trader.notify_transaction(trade(50, 2))
+    assert trader.balance == 20
+    assert trader.order.qty == 1
+    trader.notify_transaction(trade(55, 1))
+    assert trader.balance == 25
+    assert trader.order == None
+
+
+def test_units_beyond_the_order_carry_no_benefit():
+    trader = make_trader(OType.BID, 100, 1)
+    trader.notify_transaction(trade(48, 2))
+    assert trader.balance == 52
+    assert trader.order == None
+    # Later fills, with no order left, are ignored
+    trader.notify_transaction(trade(48, 5))
+    assert trader.balance == 52
+
+
+def test_ask_benefit():
+    trader = make_trader(OType.ASK, 40, 2)
+    trader.notify_transaction(trade(45, 5))
+    assert trader.balance == 10
+    assert trader.order == None
+
+
+def test_resting_quote_is_not_modified_by_the_next_one():
+    exchange = Exchange(1, 100)
+    trader = make_trader(OType.BID, 60, 1)
+    first = trader.make_quote(40, 1)
+    exchange.process_order(first, 1)
+    second = trader.make_quote(45, 2)
+    assert second is not first
+    assert (first.price, first.time) == (40, 1)
+    # The new quote replaces the resting one, which leaves the quote index
+    exchange.process_order(second, 2)
+    assert list(exchange.quotes.values()) == [second]
+
+
+def test_filled_quote_is_reused():
+    exchange = Exchange(1, 100)
+    trader = make_trader(OType.BID, 60, 1)
+    quote = trader.make_quote(50, 1)
+    exchange.process_order(quote, 1)
+    fills = exchange.process_order(Order('S', OType.ASK, 50, 1, 2), 2)
+    assert len(fills) == 1
+    assert quote.qty == 0
+    trader.assign_order(Order('PLAYER', OType.BID, 70, 2, 3))
+    again = trader.make_quote(55, 3)
+    assert again is quote
+    assert (again.price, again.qty, again.time) == (55, 2, 3)
+
+
+def test_partial_fill_of_a_fork_leaves_the_original():
+    trader = make_trader(OType.BID, 60, 3)
+    fork = trader.fork()
+    fork.notify_transaction(trade(50, 1))
+    assert (fork.order.qty, fork.balance) == (2, 10)
+    assert (trader.order.qty, trader.balance) == (3, 0)
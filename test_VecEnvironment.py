@@ -0,0 +1,83 @@
+import math
+import random
+import numpy as np
+import pytest
+from BristolStockGym import Environment
+from ObservationEncoder import ObservationEncoder
+from Order import OType, Order
+from VecEnvironment import VecEnvironment
+
+KWARGS = { 'max_time': 20, 'min_price': 1, 'max_price': 100, 'replenish_orders': True }
+
+
+# Price action of the player of a market: its limit price, or NaN without an order
+def price_action(env):
+    order = env.traders['PLAYER'].order
+    return math.nan if order == None else float(order.price)
+
+
+def test_batched_steps_match_the_markets_stepped_one_by_one():
+    random.seed(2)
+    vec = VecEnvironment(3, **KWARGS)
+    vec_observations = [vec.reset()]
+    vec_steps = []
+    for t in range(45):
+        actions = [price_action(env) for env in vec.envs]
+        observations, rewards, dones, infos = vec.step(actions)
+        vec_observations.append(observations)
+        vec_steps.append((rewards, dones, [info.get('balances') for info in infos]))
+
+    # The same markets, stepped one after the other in the order VecEnvironment steps them
+    random.seed(2)
+    envs = [Environment(observation_encoder = ObservationEncoder(), **KWARGS) for k in range(3)]
+    observations = [env.reset().copy() for env in envs]
+    assert np.array_equal(vec_observations[0], np.array(observations))
+    for t in range(45):
+        actions = [price_action(env) for env in envs]
+        rewards, dones, balances = [], [], []
+        for k, env in enumerate(envs):
+            order = None
+            if not math.isnan(actions[k]):
+                player = env.traders['PLAYER']
+                order = Order(player.tid, player.order.otype, int(round(actions[k])), player.order.qty, env.time)
+            observation, reward, done, info = env.step(order)
+            if done:
+                observation = env.reset()
+            observations[k] = observation.copy()
+            rewards.append(reward)
+            dones.append(done)
+            balances.append(info if done else None)
+        assert np.array_equal(vec_observations[t + 1], np.array(observations))
+        assert list(vec_steps[t][0]) == rewards
+        assert list(vec_steps[t][1]) == dones
+        assert vec_steps[t][2] == balances
+    # Every market finished twice and was reset
+    assert sum(sum(dones) for _rewards, dones, _balances in vec_steps) == 6
+
+
+def test_observation_layout():
+    random.seed(0)
+    vec = VecEnvironment(2, depth = 3, trades = 4, **KWARGS)
+    observations = vec.reset()
+    assert observations.shape == (2, 5 + 4 * 3 + 4)
+    for k, env in enumerate(vec.envs):
+        player = env.traders['PLAYER']
+        assert observations[k][1:4].tolist() == [1 if player.order.otype == OType.BID else -1, player.order.price, player.order.qty]
+
+
+def test_copy_false_returns_the_shared_buffers():
+    random.seed(0)
+    vec = VecEnvironment(2, copy = False, **KWARGS)
+    observations = vec.reset()
+    assert observations is vec.obs_buf
+    next_observations, _rewards, _dones, _infos = vec.step([None, None])
+    assert next_observations is observations
+
+
+def test_step_checks_its_actions():
+    vec = VecEnvironment(2, **KWARGS)
+    with pytest.raises(RuntimeError):
+        vec.step([None, None])
+    vec.reset()
+    with pytest.raises(RuntimeError):
+        vec.step([None])
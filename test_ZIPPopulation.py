@@ -0,0 +1,94 @@
+import random
+import numpy as np
+import pytest
+from Exchange import Exchange
+from Order import OType, Order
+from ZIP import ZIP
+from ZIPPopulation import PooledZIP, ZIPPopulation
+
+FIELDS = ('price', 'margin', 'margin_buy', 'margin_sell', 'previous_change',
+          'prev_best_bid_p', 'prev_best_bid_q', 'prev_best_ask_p', 'prev_best_ask_q')
+
+
+# Generator whose draws are all the same number, so that ZIP and the population perturb alike
+class ConstantGenerator:
+
+    def __init__(self, value):
+        self.value = value
+
+    def random(self, shape):
+        return np.full(shape, self.value)
+
+
+# Pairs of ZIP and PooledZIP traders with the same parameters
+def make_traders(monkeypatch, n, rng):
+    monkeypatch.setattr(random, 'random', lambda: 0.5)
+    population = ZIPPopulation(1, 100, capacity = 2, rng = ConstantGenerator(0.5))
+    pairs = []
+    for k in range(n):
+        trader = ZIP('ZIP', 'Z%d' % k, 1, 100)
+        pooled = PooledZIP('ZIP', 'Z%d' % k, 1, 100, population = population)
+        trader.beta = pooled.beta = 0.1 + 0.4 * rng.random()
+        trader.momentum = pooled.momentum = 0.1 * rng.random()
+        pairs.append((trader, pooled))
+    return population, pairs
+
+
+def assign(pairs, k, otype, price, time):
+    for trader in pairs[k]:
+        trader.assign_order(Order(trader.tid, otype, price, 1, time))
+
+
+def test_population_update_matches_zip(monkeypatch):
+    rng = random.Random(3)
+    population, pairs = make_traders(monkeypatch, 10, rng)
+    for k in range(10):
+        assign(pairs, k, OType.BID if k % 2 == 0 else OType.ASK, rng.randint(20, 80), 0)
+    exchange = Exchange(1, 100)
+    for time in range(300):
+        otype = OType.BID if rng.random() < 0.5 else OType.ASK
+        exchange.process_order(Order('M%d' % time, otype, rng.randint(30, 70), 1, time), time)
+        # Now and then a trader is given a new order
+        k = rng.randrange(10)
+        if rng.random() < 0.2:
+            assign(pairs, k, otype, rng.randint(20, 80), time)
+        public_lob = exchange.get_public_lob(time + 1)
+        for trader, pooled in pairs:
+            trader.update(public_lob)
+        population.update(public_lob)
+        for trader, pooled in pairs:
+            for name in FIELDS:
+                assert getattr(pooled, name) == pytest.approx(getattr(trader, name)), (time, trader.tid, name)
+    # The market did trade, and the traders moved their prices
+    assert any(record['type'] == 'Trade' for record in exchange.tape)
+    assert any(trader.previous_change != 0 for trader, pooled in pairs)
+
+
+def test_population_skips_a_snapshot_it_has_seen(monkeypatch):
+    population, pairs = make_traders(monkeypatch, 2, random.Random(0))
+    assign(pairs, 0, OType.BID, 60, 0)
+    assign(pairs, 1, OType.ASK, 40, 0)
+    exchange = Exchange(1, 100)
+    exchange.add_order(Order('S1', OType.ASK, 70, 1, 0))
+    exchange.add_order(Order('B1', OType.BID, 30, 1, 0))
+    public_lob = exchange.get_public_lob(1)
+    population.update(public_lob)
+    state = [[getattr(pooled, name) for name in FIELDS] for trader, pooled in pairs]
+    population.update(exchange.get_public_lob(2))
+    assert [[getattr(pooled, name) for name in FIELDS] for trader, pooled in pairs] == state
+
+
+def test_fork_is_independent():
+    random.seed(1)
+    population = ZIPPopulation(1, 100, capacity = 1)
+    traders = { tid: PooledZIP('ZIP', tid, 1, 100, population = population) for tid in ('Z0', 'Z1', 'Z2') }
+    for trader in traders.values():
+        trader.assign_order(Order(trader.tid, OType.BID, 50, 1, 0))
+    forked_traders = { tid: trader.fork() for tid, trader in traders.items() }
+    fork = population.fork(forked_traders)
+    assert all(trader.population is fork for trader in forked_traders.values())
+    assert [trader.price for trader in forked_traders.values()] == [trader.price for trader in traders.values()]
+    forked_traders['Z1'].price = 1
+    assert traders['Z1'].price != 1
+    # The fork draws what the original draws
+    assert np.array_equal(fork.rng.random(3), population.rng.random(3))